@@ -0,0 +1,4 @@
+"""
+Benchmarks for the simulation hot paths.
+Run from the backend directory: python -m benchmarks.run --help
+"""
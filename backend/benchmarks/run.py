@@ -0,0 +1,400 @@
+"""
+Benchmark harness for the simulation hot paths.
+Runs every case against the real code for each pattern in PATTERN_CONFIGS and
+each session count, reports throughput, latency percentiles and peak memory,
+saves the results as JSON and compares them against a stored baseline.
+
+Usage (from the backend directory):
+    python -m benchmarks.run                              # full suite
+    python -m benchmarks.run --sizes 1000 --cases step_simulation/numpy
+    python -m benchmarks.run --output results.json --save-baseline
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+from src.broadcast import UpdateCoalescer, json_payload
+from src.patterns import PATTERN_CONFIGS
+from src.rng import FlipStream
+from src.simulation import CoinFlipSession, CoinFlipSimulator
+from src.vectorized import VectorizedEngine
+
+# Session counts benchmarked by default
+DEFAULT_SIZES = (1000, 100000, 1000000)
+
+# Workload settings shared by every case
+SEED = 12345
+MAX_FLIPS = 10000
+BATCH_SESSIONS = 1000  # sessions per timed batch in the per-session cases
+STATISTICS_CALLS = 1000
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# Largest tolerated change against the baseline, as a fraction of the baseline
+# value (throughput may drop, latency and memory may grow by this much)
+REGRESSION_THRESHOLDS = {
+    "flips_per_second": 0.15,
+    "latency_p50_ms": 0.25,
+    "latency_p95_ms": 0.25,
+    "latency_p99_ms": 0.50,
+    "peak_memory_bytes": 0.10,
+}
+
+# Latency percentiles of fewer timed iterations are too noisy to compare
+MIN_LATENCY_ITERATIONS = 5
+
+# Suite fields that must match the baseline for a regression to fail the run
+ENVIRONMENT_FIELDS = ("machine", "processor", "python", "numpy")
+
+# A case prepares its workload (untimed) and returns a callable that performs
+# it, returning the duration of every timed iteration and the flips processed
+Workload = Callable[[], Tuple[List[float], int]]
+
+
+def _session_flips(pattern_name: str, size: int) -> np.ndarray:
+    """Flip count at which every session completes (run on the vectorized engine)."""
+    engine = VectorizedEngine(PATTERN_CONFIGS[pattern_name], size, MAX_FLIPS, seed=SEED)
+    engine.run_until_completion()
+    return engine.flips_count
+
+
+def _histories(flips_count: np.ndarray, start: int) -> List[List[int]]:
+    """Replay the flips of sessions start .. start + BATCH_SESSIONS - 1."""
+    counts = flips_count[start:start + BATCH_SESSIONS].tolist()
+    return [list(FlipStream(SEED, start + offset).history(count))
+            for offset, count in enumerate(counts)]
+
+
+def case_check_pattern(pattern_name: str, size: int) -> Workload:
+    """Pattern.check_pattern over the full flip history of every session."""
+    pattern = PATTERN_CONFIGS[pattern_name]
+    flips_count = _session_flips(pattern_name, size)
+
+    def run():
+        durations = []
+        for start in range(0, size, BATCH_SESSIONS):
+            histories = _histories(flips_count, start)
+            began = time.perf_counter()
+            for flips in histories:
+                pattern.check_pattern(flips)
+            durations.append(time.perf_counter() - began)
+        return durations, int(flips_count.sum())
+
+    return run
+
+
+def case_add_flip(pattern_name: str, size: int) -> Workload:
+    """CoinFlipSession.add_flip fed every session's flips until it completes."""
+    pattern = PATTERN_CONFIGS[pattern_name]
+    flips_count = _session_flips(pattern_name, size)
+
+    def run():
+        durations = []
+        for start in range(0, size, BATCH_SESSIONS):
+            histories = _histories(flips_count, start)
+            sessions = [CoinFlipSession(start + offset, pattern, MAX_FLIPS, seed=SEED)
+                        for offset in range(len(histories))]
+            began = time.perf_counter()
+            for session, flips in zip(sessions, histories):
+                add_flip = session.add_flip
+                for flip in flips:
+                    add_flip(flip)
+            durations.append(time.perf_counter() - began)
+        return durations, int(flips_count.sum())
+
+    return run
+
+
+def _simulator(pattern_name: str, size: int, engine: str) -> CoinFlipSimulator:
+    simulator = CoinFlipSimulator()
+    simulator.configure_simulation(pattern_name, size, MAX_FLIPS, engine=engine,
+                                   ticks_per_second=None, seed=SEED)
+    return simulator
+
+
+def _step_case(engine: str) -> Callable[[str, int], Workload]:
+    def case(pattern_name: str, size: int) -> Workload:
+        simulator = _simulator(pattern_name, size, engine)
+
+        def run():
+            simulator.start_simulation()
+            durations = []
+            while simulator.is_running:
+                began = time.perf_counter()
+                simulator.step_simulation()
+                durations.append(time.perf_counter() - began)
+            return durations, simulator.aggregate.completed_flips_sum
+
+        return run
+
+    case.__doc__ = f"CoinFlipSimulator.step_simulation per tick on the {engine} engine."
+    return case
+
+
+def case_simulation_update(pattern_name: str, size: int) -> Workload:
+    """Per-tick simulation_update payload: coalescing, JSON and binary frame encoding."""
+    simulator = _simulator(pattern_name, size, "numpy")
+
+    def run():
+        simulator.start_simulation()
+        coalescer = UpdateCoalescer()
+        durations = []
+        flips = 0
+        while simulator.is_running:
+            step_result = simulator.step_simulation()
+            began = time.perf_counter()
+            coalescer.add(step_result)
+            payload = coalescer.take()
+            json.dumps(json_payload(payload))
+            simulator.encode_step_frame(payload)
+            durations.append(time.perf_counter() - began)
+            flips += len(payload["updates"])
+        return durations, flips
+
+    return run
+
+
+def _finished_simulator(pattern_name: str, size: int) -> CoinFlipSimulator:
+    simulator = _simulator(pattern_name, size, "numpy")
+    simulator.start_simulation()
+    while simulator.is_running:
+        simulator.step_simulation()
+    return simulator
+
+
+def case_get_statistics(pattern_name: str, size: int) -> Workload:
+    """CoinFlipSimulator.get_statistics on a finished run (flips = flips summarized)."""
+    simulator = _finished_simulator(pattern_name, size)
+
+    def run():
+        durations = []
+        for _ in range(STATISTICS_CALLS):
+            began = time.perf_counter()
+            simulator.get_statistics()
+            durations.append(time.perf_counter() - began)
+        return durations, simulator.aggregate.completed_flips_sum * STATISTICS_CALLS
+
+    return run
+
+
+def case_get_all_sessions(pattern_name: str, size: int) -> Workload:
+    """CoinFlipSimulator.get_all_sessions plus JSON serialization of the result."""
+    simulator = _finished_simulator(pattern_name, size)
+
+    def run():
+        began = time.perf_counter()
+        json.dumps(simulator.get_all_sessions())
+        return [time.perf_counter() - began], simulator.aggregate.completed_flips_sum
+
+    return run
+
+
+CASES: Dict[str, Callable[[str, int], Workload]] = {
+    "check_pattern": case_check_pattern,
+    "add_flip": case_add_flip,
+    "step_simulation/python": _step_case("python"),
+    "step_simulation/numpy": _step_case("numpy"),
+    "simulation_update": case_simulation_update,
+    "get_statistics": case_get_statistics,
+    "get_all_sessions": case_get_all_sessions,
+}
+
+
+def measure(case_name: str, pattern_name: str, size: int,
+            track_memory: bool = True) -> Dict[str, Any]:
+    """
+    Run one benchmark case.
+
+    Timing and memory are measured in separate passes, because tracemalloc
+    slows allocation-heavy code down considerably.
+
+    Args:
+        case_name: Key of CASES
+        pattern_name: Key of PATTERN_CONFIGS
+        size: Number of sessions
+        track_memory: Also measure the peak traced memory of the workload
+
+    Returns:
+        Result with throughput, iteration latency percentiles and peak memory
+    """
+    case = CASES[case_name]
+    gc.collect()
+    durations, flips = case(pattern_name, size)()
+    seconds = float(sum(durations))
+    latencies = np.asarray(durations) * 1000.0
+
+    peak_memory = None
+    if track_memory:
+        workload = case(pattern_name, size)
+        gc.collect()
+        tracemalloc.start()
+        try:
+            workload()
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return {
+        "case": case_name,
+        "pattern": pattern_name,
+        "sessions": size,
+        "iterations": len(durations),
+        "seconds": seconds,
+        "flips": flips,
+        "flips_per_second": flips / seconds if seconds > 0 else None,
+        "latency_p50_ms": float(np.percentile(latencies, 50)),
+        "latency_p95_ms": float(np.percentile(latencies, 95)),
+        "latency_p99_ms": float(np.percentile(latencies, 99)),
+        "peak_memory_bytes": peak_memory,
+    }
+
+
+def run_suite(case_names: List[str], pattern_names: List[str], sizes: List[int],
+              track_memory: bool = True, log: Optional[Callable[[str], None]] = None
+              ) -> Dict[str, Any]:
+    """
+    Run every (case, pattern, size) combination.
+
+    Returns:
+        Suite document with environment details and a list of results
+    """
+    results = []
+    for size in sizes:
+        for case_name in case_names:
+            for pattern_name in pattern_names:
+                result = measure(case_name, pattern_name, size, track_memory)
+                results.append(result)
+                if log is not None:
+                    log(format_result(result))
+    return {
+        "created_at": time.time(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "seed": SEED,
+        "max_flips": MAX_FLIPS,
+        "results": results,
+    }
+
+
+def format_result(result: Dict[str, Any]) -> str:
+    """One-line summary of a result."""
+    throughput = result["flips_per_second"]
+    memory = result["peak_memory_bytes"]
+    return (f"{result['case']:<24} {result['pattern']:<22} {result['sessions']:>8} sessions  "
+            f"{(throughput or 0) / 1e6:9.3f} Mflips/s  "
+            f"p50 {result['latency_p50_ms']:9.3f} ms  p95 {result['latency_p95_ms']:9.3f} ms  "
+            f"p99 {result['latency_p99_ms']:9.3f} ms  "
+            f"peak {'-' if memory is None else f'{memory / 2 ** 20:.1f} MiB'}")
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any],
+            tolerance: float = 1.0) -> List[str]:
+    """
+    Compare results against a baseline.
+
+    Args:
+        results: Suite document from run_suite
+        baseline: Earlier suite document
+        tolerance: Multiplier applied to REGRESSION_THRESHOLDS
+
+    Latency percentiles are only compared when both runs timed at least
+    MIN_LATENCY_ITERATIONS iterations.
+
+    Returns:
+        One message per metric that regressed beyond its threshold
+    """
+    reference = {(entry["case"], entry["pattern"], entry["sessions"]): entry
+                 for entry in baseline["results"]}
+    regressions = []
+    for entry in results["results"]:
+        key = (entry["case"], entry["pattern"], entry["sessions"])
+        previous = reference.get(key)
+        if previous is None:
+            continue
+        iterations = min(previous.get("iterations", 0), entry.get("iterations", 0))
+        for metric, threshold in REGRESSION_THRESHOLDS.items():
+            if metric.startswith("latency_") and iterations < MIN_LATENCY_ITERATIONS:
+                continue
+            old, new = previous.get(metric), entry.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            # Throughput regresses downwards, everything else upwards
+            regressed = (change < -threshold * tolerance if metric == "flips_per_second"
+                         else change > threshold * tolerance)
+            if regressed:
+                regressions.append(f"{key[0]} {key[1]} {key[2]} sessions: {metric} "
+                                   f"{old:.4g} -> {new:.4g} ({change:+.1%})")
+    return regressions
+
+
+def environment_differences(results: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """One message per ENVIRONMENT_FIELDS entry that differs from the baseline."""
+    return [f"{field}: baseline {baseline.get(field)!r}, current {results.get(field)!r}"
+            for field in ENVIRONMENT_FIELDS if baseline.get(field) != results.get(field)]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), default=list(CASES))
+    parser.add_argument("--patterns", nargs="+", choices=sorted(PATTERN_CONFIGS),
+                        default=list(PATTERN_CONFIGS))
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(DEFAULT_SIZES))
+    parser.add_argument("--no-memory", action="store_true",
+                        help="skip the tracemalloc pass (halves the run time)")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE,
+                        help="baseline JSON to compare against (default: %(default)s)")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store the results as the new baseline instead of comparing")
+    parser.add_argument("--tolerance", type=float, default=1.0,
+                        help="scale every regression threshold by this factor")
+    parser.add_argument("--ignore-environment", action="store_true",
+                        help="fail on regressions even if the baseline was recorded "
+                             "on another machine, Python or NumPy")
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.cases, args.patterns, args.sizes,
+                        track_memory=not args.no_memory, log=print)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return 0
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    differences = environment_differences(results, baseline)
+    for message in differences:
+        print(f"WARNING environment differs from the baseline: {message}")
+    regressions = compare(results, baseline, args.tolerance)
+    for message in regressions:
+        print(f"REGRESSION {message}")
+    if not regressions:
+        print("No regressions against the baseline")
+    if regressions and differences and not args.ignore_environment:
+        print("Not failing: the baseline comes from another environment "
+              "(use --ignore-environment to fail anyway)")
+        return 0
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
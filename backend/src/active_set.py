@@ -0,0 +1,69 @@
+"""
+Active session index.
+Tracks the IDs of sessions that are still running.
+"""
+
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class ActiveSet:
+    """Set of integer IDs with O(1) add/remove backed by a swap-remove array."""
+    
+    __slots__ = ("_ids", "_positions", "_frozen")
+    
+    def __init__(self, ids: Iterable[int] = ()):
+        """
+        Initialize set.
+        
+        Args:
+            ids: Initial IDs
+        """
+        self._ids: List[int] = []
+        self._positions: Dict[int, int] = {}
+        self._frozen: Optional[Tuple[int, ...]] = None
+        for item in ids:
+            self.add(item)
+    
+    def add(self, item: int):
+        """Add an ID if not already present."""
+        if item in self._positions:
+            return
+        self._positions[item] = len(self._ids)
+        self._ids.append(item)
+        self._frozen = None
+    
+    def discard(self, item: int):
+        """Remove an ID if present by moving the last ID into its slot."""
+        position = self._positions.pop(item, None)
+        if position is None:
+            return
+        self._frozen = None
+        last = self._ids.pop()
+        if last != item:
+            self._ids[position] = last
+            self._positions[last] = position
+    
+    def clear(self):
+        """Remove every ID."""
+        self._ids.clear()
+        self._positions.clear()
+        self._frozen = None
+    
+    def __contains__(self, item: int) -> bool:
+        return item in self._positions
+    
+    def __len__(self) -> int:
+        return len(self._ids)
+    
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._ids)
+    
+    def to_list(self, sort: bool = False) -> List[int]:
+        """Copy the IDs into a list, optionally sorted."""
+        return sorted(self._ids) if sort else list(self._ids)
+    
+    def freeze(self) -> Tuple[int, ...]:
+        """Immutable copy of the IDs (unordered), reused until the set changes."""
+        if self._frozen is None:
+            self._frozen = tuple(self._ids)
+        return self._frozen
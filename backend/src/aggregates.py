@@ -0,0 +1,405 @@
+"""
+Aggregate statistics for simulation runs.
+Compact, mergeable summaries of session outcomes.
+"""
+
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
+import math
+import numpy as np
+from src.analytics import WaitingTimeAnalysis, analyze
+from src.patterns import Pattern, PatternSet
+
+
+# Two-sided 95% normal quantile used for confidence intervals
+Z_95 = 1.959963984540054
+
+
+class RaceAggregate:
+    """
+    Mergeable outcome counts of the targets of a PatternSet.
+    
+    Sessions report the flip count at which each target first matched (0 if
+    it never did); the target with the smallest count wins the race.
+    """
+    
+    def __init__(self, num_targets: int):
+        """
+        Initialize an empty race aggregate.
+        
+        Args:
+            num_targets: Number of targets in the pattern set
+        """
+        self.num_targets = num_targets
+        self.sessions = 0
+        self.wins = [0] * num_targets
+        self.ties = 0
+        # Sessions in which each target matched, and the sum of their first-hit flips
+        self.hit_counts = [0] * num_targets
+        self.hit_flips_sums = [0] * num_targets
+    
+    def record(self, first_hits: Sequence[int]):
+        """Record the first-hit flip counts of one completed session."""
+        self.record_arrays(np.asarray([first_hits], dtype=np.int64))
+    
+    def record_arrays(self, first_hits: np.ndarray):
+        """Record many completed sessions (first_hits has one row per session)."""
+        if first_hits.shape[0] == 0:
+            return
+        
+        hit = first_hits > 0
+        earliest = np.where(hit, first_hits, np.iinfo(np.int64).max).min(axis=1)
+        winners = hit & (first_hits == earliest[:, None])
+        winner_counts = winners.sum(axis=1)
+        
+        self.sessions += int(first_hits.shape[0])
+        self.ties += int((winner_counts > 1).sum())
+        sole_wins = winners[winner_counts == 1].sum(axis=0)
+        hit_counts = hit.sum(axis=0)
+        hit_flips_sums = np.where(hit, first_hits, 0).sum(axis=0)
+        for target in range(self.num_targets):
+            self.wins[target] += int(sole_wins[target])
+            self.hit_counts[target] += int(hit_counts[target])
+            self.hit_flips_sums[target] += int(hit_flips_sums[target])
+    
+    def merge(self, other: "RaceAggregate"):
+        """Fold another race aggregate into this one."""
+        self.sessions += other.sessions
+        self.ties += other.ties
+        for target in range(self.num_targets):
+            self.wins[target] += other.wins[target]
+            self.hit_counts[target] += other.hit_counts[target]
+            self.hit_flips_sums[target] += other.hit_flips_sums[target]
+    
+    def get_state(self) -> Dict[str, Any]:
+        """JSON-serializable state (see from_state)."""
+        return {
+            "num_targets": self.num_targets,
+            "sessions": self.sessions,
+            "wins": list(self.wins),
+            "ties": self.ties,
+            "hit_counts": list(self.hit_counts),
+            "hit_flips_sums": list(self.hit_flips_sums)
+        }
+    
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "RaceAggregate":
+        """Rebuild an aggregate from get_state output."""
+        aggregate = cls(state["num_targets"])
+        aggregate.sessions = state["sessions"]
+        aggregate.wins = list(state["wins"])
+        aggregate.ties = state["ties"]
+        aggregate.hit_counts = list(state["hit_counts"])
+        aggregate.hit_flips_sums = list(state["hit_flips_sums"])
+        return aggregate
+    
+    def to_statistics(self, pattern: PatternSet) -> Dict[str, Any]:
+        """
+        Build the "race" section of the statistics.
+        
+        Args:
+            pattern: Simulated pattern set (provides target names and exact
+                win probabilities)
+        """
+        sessions = self.sessions
+        names = pattern.target_names
+        return {
+            "mode": pattern.mode,
+            "patterns": {name: pattern.patterns[name].get_description() for name in names},
+            "sessions": sessions,
+            "win_probabilities": {name: wins / sessions if sessions else 0
+                                  for name, wins in zip(names, self.wins)},
+            "tie_probability": self.ties / sessions if sessions else 0,
+            "hit_rates": {name: hits / sessions if sessions else 0
+                          for name, hits in zip(names, self.hit_counts)},
+            "mean_first_hit": {name: flips / hits if hits else 0
+                               for name, hits, flips in zip(names, self.hit_counts,
+                                                            self.hit_flips_sums)},
+            "theoretical_win_probabilities": pattern.get_theoretical_win_probabilities()
+        }
+
+
+class RunAggregate:
+    """
+    Mergeable running statistics over a set of sessions.
+    
+    Completions are recorded as they happen, so reading the statistics is O(1).
+    Flips-to-pattern are tracked with Welford's mean / sum of squared deviations,
+    and the waiting-time histogram only stores the flip counts that occurred.
+    """
+    
+    def __init__(self):
+        """Initialize an empty aggregate."""
+        self.total_sessions = 0
+        self.completed_sessions = 0
+        self.pattern_found_sessions = 0
+        self.completed_flips_sum = 0
+        self.pattern_flips_sum = 0
+        # Welford state over flips of pattern-found sessions
+        self.pattern_flips_mean = 0.0
+        self.pattern_flips_m2 = 0.0
+        self.pattern_flips_min: Optional[int] = None
+        self.pattern_flips_max: Optional[int] = None
+        # waiting_time_counts[n] = sessions that found the pattern after n flips
+        # (sparse: only flip counts that occurred)
+        self.waiting_time_counts: Dict[int, int] = {}
+        # Per-target outcomes when the pattern is a PatternSet
+        self.race: Optional[RaceAggregate] = None
+    
+    def add_sessions(self, count: int):
+        """Register sessions that have not completed yet."""
+        self.total_sessions += count
+    
+    def record_completion(self, pattern_found: bool, flips_count: int,
+                          first_hits: Optional[Sequence[int]] = None):
+        """
+        Record that one registered session completed.
+        
+        Args:
+            pattern_found: Whether the session found the pattern
+            flips_count: Flips the session made
+            first_hits: For pattern sets, the flip count at which each target
+                first matched (0 if it never did)
+        """
+        if first_hits is not None:
+            self._race(len(first_hits)).record(first_hits)
+        self.completed_sessions += 1
+        self.completed_flips_sum += flips_count
+        if not pattern_found:
+            return
+        
+        self.pattern_found_sessions += 1
+        self.pattern_flips_sum += flips_count
+        delta = flips_count - self.pattern_flips_mean
+        self.pattern_flips_mean += delta / self.pattern_found_sessions
+        self.pattern_flips_m2 += delta * (flips_count - self.pattern_flips_mean)
+        if self.pattern_flips_min is None or flips_count < self.pattern_flips_min:
+            self.pattern_flips_min = flips_count
+        if self.pattern_flips_max is None or flips_count > self.pattern_flips_max:
+            self.pattern_flips_max = flips_count
+        
+        self.waiting_time_counts[flips_count] = self.waiting_time_counts.get(flips_count, 0) + 1
+    
+    def record_completions(self, pattern_found: np.ndarray, flips_count: np.ndarray,
+                           first_hits: Optional[np.ndarray] = None):
+        """
+        Record that many registered sessions completed (parallel arrays, see record_completion).
+        
+        Costs O(sessions + distinct flip counts), independent of the flip limit.
+        """
+        if flips_count.size == 0:
+            return
+        
+        if first_hits is not None:
+            self._race(first_hits.shape[1]).record_arrays(first_hits)
+        self.completed_sessions += int(flips_count.size)
+        self.completed_flips_sum += int(flips_count.sum())
+        
+        found_flips = flips_count[pattern_found]
+        if not found_flips.size:
+            return
+        total = int(found_flips.sum())
+        mean = total / found_flips.size
+        self._add_moments(int(found_flips.size), total, mean,
+                          float(np.square(found_flips - mean).sum()),
+                          int(found_flips.min()), int(found_flips.max()))
+        # Sessions stepped together complete on the same flip, so there are few distinct values
+        flips, counts = np.unique(found_flips, return_counts=True)
+        self._add_waiting_times(zip(flips.tolist(), counts.tolist()))
+    
+    def add_session(self, completed: bool, pattern_found: bool, flips_count: int):
+        """Add the outcome of one session."""
+        self.add_sessions(1)
+        if completed:
+            self.record_completion(pattern_found, flips_count)
+    
+    def add_arrays(self, completed: np.ndarray, pattern_found: np.ndarray,
+                   flips_count: np.ndarray, first_hits: Optional[np.ndarray] = None):
+        """Add the outcomes of many sessions stored as parallel arrays."""
+        self.add_sessions(int(completed.size))
+        self.record_completions(pattern_found[completed], flips_count[completed],
+                                first_hits[completed] if first_hits is not None else None)
+    
+    def _race(self, num_targets: int) -> RaceAggregate:
+        """Get the race aggregate, creating it on first use."""
+        if self.race is None:
+            self.race = RaceAggregate(num_targets)
+        return self.race
+    
+    def _add_waiting_times(self, counts: Iterable[Tuple[int, int]]):
+        """Add (flips, count) waiting-time counts."""
+        waiting_time_counts = self.waiting_time_counts
+        for flips, count in counts:
+            waiting_time_counts[flips] = waiting_time_counts.get(flips, 0) + count
+    
+    def _add_moments(self, count: int, flips_sum: int, mean: float, m2: float,
+                     minimum: int, maximum: int):
+        """Fold in the flip statistics of more pattern-found sessions (Chan et al. update)."""
+        combined = self.pattern_found_sessions + count
+        delta = mean - self.pattern_flips_mean
+        self.pattern_flips_m2 += m2 + delta * delta * self.pattern_found_sessions * count / combined
+        self.pattern_flips_mean += delta * count / combined
+        self.pattern_flips_min = (minimum if self.pattern_flips_min is None
+                                  else min(self.pattern_flips_min, minimum))
+        self.pattern_flips_max = (maximum if self.pattern_flips_max is None
+                                  else max(self.pattern_flips_max, maximum))
+        self.pattern_found_sessions = combined
+        self.pattern_flips_sum += flips_sum
+    
+    def merge(self, other: "RunAggregate"):
+        """Fold another aggregate into this one."""
+        if other.pattern_found_sessions:
+            self._add_moments(other.pattern_found_sessions, other.pattern_flips_sum,
+                              other.pattern_flips_mean, other.pattern_flips_m2,
+                              other.pattern_flips_min, other.pattern_flips_max)
+        
+        self.total_sessions += other.total_sessions
+        self.completed_sessions += other.completed_sessions
+        self.completed_flips_sum += other.completed_flips_sum
+        self._add_waiting_times(other.waiting_time_counts.items())
+        if other.race is not None:
+            self._race(other.race.num_targets).merge(other.race)
+    
+    def get_state(self) -> Dict[str, Any]:
+        """JSON-serializable state, e.g. for checkpoints (see from_state)."""
+        return {
+            "total_sessions": self.total_sessions,
+            "completed_sessions": self.completed_sessions,
+            "pattern_found_sessions": self.pattern_found_sessions,
+            "completed_flips_sum": self.completed_flips_sum,
+            "pattern_flips_sum": self.pattern_flips_sum,
+            "pattern_flips_mean": self.pattern_flips_mean,
+            "pattern_flips_m2": self.pattern_flips_m2,
+            "pattern_flips_min": self.pattern_flips_min,
+            "pattern_flips_max": self.pattern_flips_max,
+            "waiting_time_counts": sorted(self.waiting_time_counts.items()),
+            "race": self.race.get_state() if self.race is not None else None
+        }
+    
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "RunAggregate":
+        """Rebuild an aggregate from get_state output."""
+        aggregate = cls()
+        for name in ("total_sessions", "completed_sessions", "pattern_found_sessions",
+                     "completed_flips_sum", "pattern_flips_sum", "pattern_flips_mean",
+                     "pattern_flips_m2", "pattern_flips_min", "pattern_flips_max"):
+            setattr(aggregate, name, state[name])
+        counts = state["waiting_time_counts"]
+        if counts and not isinstance(counts[0], (list, tuple)):
+            # Dense list written before the histogram became sparse
+            counts = enumerate(counts)
+        aggregate.waiting_time_counts = {int(flips): int(count) for flips, count in counts if count}
+        if state.get("race") is not None:
+            aggregate.race = RaceAggregate.from_state(state["race"])
+        return aggregate
+    
+    def get_variance(self) -> float:
+        """Sample variance of flips needed by pattern-found sessions."""
+        if self.pattern_found_sessions < 2:
+            return 0.0
+        return self.pattern_flips_m2 / (self.pattern_found_sessions - 1)
+    
+    def get_standard_error(self) -> float:
+        """Standard error of the mean flips needed (actual_ev)."""
+        if self.pattern_found_sessions < 2:
+            return 0.0
+        return math.sqrt(self.get_variance() / self.pattern_found_sessions)
+    
+    def get_confidence_half_width(self) -> float:
+        """Half-width of the 95% confidence interval for actual_ev."""
+        return Z_95 * self.get_standard_error()
+    
+    def get_survival_curve(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Empirical survival function of the waiting time.
+        
+        Returns:
+            Tuple of (flips, survival) arrays where survival[i] is the fraction
+            of all registered sessions that had not found the pattern within
+            flips[i] flips (sessions still running count as not found yet);
+            flips holds 0 and every flip count a session found the pattern at
+        """
+        flips, counts = self._sorted_waiting_times()
+        flips = np.concatenate(([0], flips))
+        counts = np.concatenate(([0], counts))
+        if not self.total_sessions:
+            return flips, np.ones(len(counts))
+        return flips, 1.0 - np.cumsum(counts) / self.total_sessions
+    
+    def get_histogram(self, bins: int = 50) -> Dict[str, Any]:
+        """
+        Bucket the waiting times of pattern-found sessions.
+        
+        Args:
+            bins: Maximum number of equal-width buckets
+            
+        Returns:
+            Dictionary with bin_edges (len(counts) + 1 integer edges, each bucket
+            is [edge, next_edge)) and counts
+        """
+        flips, counts = self._sorted_waiting_times()
+        longest = int(flips[-1]) if flips.size else 0
+        if longest < 1:
+            return {"bin_edges": [], "counts": []}
+        
+        width = max(1, math.ceil(longest / bins))
+        edges = list(range(1, longest + 1, width)) + [longest + 1]
+        buckets = np.bincount((flips - 1) // width, weights=counts, minlength=len(edges) - 1)
+        return {"bin_edges": edges, "counts": buckets.astype(np.int64).tolist()}
+    
+    def _sorted_waiting_times(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Waiting-time (flips, counts) arrays in ascending flips order."""
+        if not self.waiting_time_counts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        flips, counts = zip(*sorted(self.waiting_time_counts.items()))
+        return np.asarray(flips, dtype=np.int64), np.asarray(counts, dtype=np.int64)
+    
+    def to_statistics(self, pattern: Optional[Pattern], is_running: bool,
+                      max_flips: Optional[int] = None,
+                      analysis: Optional[WaitingTimeAnalysis] = None) -> Dict[str, Any]:
+        """
+        Build the payload returned by CoinFlipSimulator.get_statistics.
+        
+        Args:
+            pattern: Simulated pattern
+            is_running: Whether the simulation is still running
+            max_flips: Flip limit per session; adds the exact theoretical
+                statistics for that limit (see src.analytics)
+            analysis: Precomputed analyze(pattern, max_flips), so that no
+                analysis is solved here
+        """
+        total_sessions = self.total_sessions
+        completed_sessions = self.completed_sessions
+        pattern_found_sessions = self.pattern_found_sessions
+        avg_flips = self.completed_flips_sum / completed_sessions if completed_sessions else 0
+        avg_pattern_flips = self.pattern_flips_sum / pattern_found_sessions if pattern_found_sessions else 0
+        standard_error = self.get_standard_error()
+        half_width = Z_95 * standard_error
+        
+        # Theoretical expected value
+        theoretical_ev = pattern.get_theoretical_ev() if pattern else 0
+        
+        stats = {
+            "total_sessions": total_sessions,
+            "completed_sessions": completed_sessions,
+            "pattern_found_sessions": pattern_found_sessions,
+            "completion_rate": completed_sessions / total_sessions if total_sessions > 0 else 0,
+            "pattern_success_rate": pattern_found_sessions / completed_sessions if completed_sessions > 0 else 0,
+            "average_flips_all": avg_flips,
+            "average_flips_pattern_found": avg_pattern_flips,
+            "theoretical_ev": theoretical_ev,
+            "actual_ev": avg_pattern_flips,
+            "actual_ev_variance": self.get_variance(),
+            "actual_ev_standard_error": standard_error,
+            "actual_ev_confidence_interval": [avg_pattern_flips - half_width,
+                                              avg_pattern_flips + half_width],
+            "min_flips_pattern_found": self.pattern_flips_min,
+            "max_flips_pattern_found": self.pattern_flips_max,
+            "pattern_description": pattern.get_description() if pattern else "",
+            "is_running": is_running
+        }
+        if pattern is not None and max_flips is not None:
+            stats.update((analysis or analyze(pattern, max_flips)).to_statistics())
+        if isinstance(pattern, PatternSet):
+            race = self.race or RaceAggregate(len(pattern.target_names))
+            stats["race"] = race.to_statistics(pattern)
+        return stats
@@ -0,0 +1,388 @@
+"""
+Exact waiting-time analysis.
+Treats a pattern's automaton as an absorbing Markov chain over fair coin flips
+and computes the distribution of the flip on which the pattern first completes,
+without running a simulation.
+"""
+
+from collections import OrderedDict
+from fractions import Fraction
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple
+import math
+import threading
+import numpy as np
+
+if TYPE_CHECKING:
+    from src.patterns import Pattern, PatternAutomaton
+
+# Flips advanced per matrix product when computing the distribution
+BLOCK_FLIPS = 256
+
+# Longest waiting-time distribution stored per analysis; past it the survival
+# probability decays geometrically and is handled in closed form
+MAX_PMF_FLIPS = 1 << 20
+
+# Memory the cached analyses may hold in total
+MAX_CACHED_ANALYSIS_BYTES = 64 * 1024 * 1024
+
+# Largest chain (in non-accepting states) solved with exact fractions; the
+# cost of exact elimination grows quickly, so bigger chains use float64
+MAX_EXACT_STATES = 24
+
+
+def _transient_states(automaton: "PatternAutomaton") -> List[int]:
+    """Non-accepting states reachable from the start state, in discovery order."""
+    seen = {0}
+    order = [0]
+    for state in order:
+        for next_state in automaton.transitions[state]:
+            if next_state not in seen and not automaton.accepting[next_state]:
+                seen.add(next_state)
+                order.append(next_state)
+    return order
+
+
+def _solve(matrix: List[List[Fraction]], rhs: List[Fraction]) -> List[Fraction]:
+    """Solve matrix @ x = rhs exactly by Gauss-Jordan elimination."""
+    size = len(rhs)
+    rows = [row[:] + [value] for row, value in zip(matrix, rhs)]
+    for column in range(size):
+        pivot = next(index for index in range(column, size) if rows[index][column] != 0)
+        rows[column], rows[pivot] = rows[pivot], rows[column]
+        pivot_row = rows[column]
+        pivot_value = pivot_row[column]
+        for index in range(size):
+            factor = rows[index][column]
+            if index != column and factor != 0:
+                rows[index] = [a - factor * b / pivot_value for a, b in zip(rows[index], pivot_row)]
+    return [rows[index][size] / rows[index][index] for index in range(size)]
+
+
+def exact_moments(automaton: "PatternAutomaton") -> Tuple[Fraction, Fraction]:
+    """
+    Exact mean and variance of the number of flips until the pattern completes.
+
+    With Q the transitions between non-accepting states, the expected times t
+    solve (I - Q) t = 1 and the second moments m solve (I - Q) m = 1 + 2 Q t.
+
+    Args:
+        automaton: Compiled pattern automaton
+
+    Returns:
+        Tuple of (mean, variance) as exact fractions
+    """
+    states = _transient_states(automaton)
+    index = {state: position for position, state in enumerate(states)}
+    half = Fraction(1, 2)
+
+    q = [[Fraction(0)] * len(states) for _ in states]
+    for row, state in enumerate(states):
+        for next_state in automaton.transitions[state]:
+            if next_state in index:
+                q[row][index[next_state]] += half
+    identity_minus_q = [[(1 if row == column else 0) - q[row][column]
+                         for column in range(len(states))] for row in range(len(states))]
+
+    times = _solve(identity_minus_q, [Fraction(1)] * len(states))
+    q_times = [sum(value * time for value, time in zip(row, times)) for row in q]
+    second = _solve(identity_minus_q, [1 + 2 * value for value in q_times])
+    return times[0], second[0] - times[0] ** 2
+
+
+def exact_win_probabilities(automaton: "PatternAutomaton", outputs: List[int],
+                            num_targets: int) -> List[Fraction]:
+    """
+    Exact probability of each target being the first (and only) one to match.
+
+    The absorption probabilities x into the accepting states won by target k
+    solve (I - Q) x = b, with b the one-flip probability of entering them.
+    Whatever is missing from 1 is the probability of a tie.
+
+    Args:
+        automaton: Automaton that accepts when any target matches
+        outputs: Per state, the bitmask of targets that have just matched
+        num_targets: Number of targets
+
+    Returns:
+        List of win probabilities as exact fractions, one per target
+    """
+    states = _transient_states(automaton)
+    index = {state: position for position, state in enumerate(states)}
+    half = Fraction(1, 2)
+
+    identity_minus_q = [[Fraction(1 if row == column else 0) for column in range(len(states))]
+                        for row in range(len(states))]
+    for row, state in enumerate(states):
+        for next_state in automaton.transitions[state]:
+            if next_state in index:
+                identity_minus_q[row][index[next_state]] -= half
+
+    probabilities = []
+    for target in range(num_targets):
+        rhs = [sum((half for next_state in automaton.transitions[state]
+                    if outputs[next_state] == 1 << target), Fraction(0))
+               for state in states]
+        probabilities.append(_solve(identity_minus_q, rhs)[0])
+    return probabilities
+
+
+def _float_system(automaton: "PatternAutomaton") -> Tuple[List[int], np.ndarray]:
+    """Non-accepting states and the float64 transitions Q between them."""
+    states = _transient_states(automaton)
+    index = {state: position for position, state in enumerate(states)}
+    q = np.zeros((len(states), len(states)))
+    for row, state in enumerate(states):
+        for next_state in automaton.transitions[state]:
+            if next_state in index:
+                q[row, index[next_state]] += 0.5
+    return states, q
+
+
+def waiting_time_moments(automaton: "PatternAutomaton") -> Tuple[float, float]:
+    """
+    Mean and variance of the number of flips until the pattern completes.
+
+    Solved exactly (see exact_moments) for chains of up to MAX_EXACT_STATES
+    non-accepting states, and with numpy.linalg.solve in float64 otherwise.
+    """
+    states, q = _float_system(automaton)
+    if len(states) <= MAX_EXACT_STATES:
+        mean, variance = exact_moments(automaton)
+        return float(mean), float(variance)
+    identity_minus_q = np.eye(len(states)) - q
+    times = np.linalg.solve(identity_minus_q, np.ones(len(states)))
+    second = np.linalg.solve(identity_minus_q, 1 + 2 * (q @ times))
+    return float(times[0]), max(0.0, float(second[0] - times[0] ** 2))
+
+
+def win_probabilities(automaton: "PatternAutomaton", outputs: List[int],
+                      num_targets: int) -> List[float]:
+    """
+    Probability of each target being the first (and only) one to match.
+
+    Solved exactly (see exact_win_probabilities) for chains of up to
+    MAX_EXACT_STATES non-accepting states, and in float64 otherwise.
+    """
+    states, q = _float_system(automaton)
+    if len(states) <= MAX_EXACT_STATES:
+        return [float(probability)
+                for probability in exact_win_probabilities(automaton, outputs, num_targets)]
+    rhs = np.zeros((len(states), num_targets))
+    for row, state in enumerate(states):
+        for next_state in automaton.transitions[state]:
+            mask = outputs[next_state]
+            if mask and mask & (mask - 1) == 0:
+                rhs[row, mask.bit_length() - 1] += 0.5
+    solution = np.linalg.solve(np.eye(len(states)) - q, rhs)
+    return [float(probability) for probability in solution[0]]
+
+
+def waiting_time_pmf(automaton: "PatternAutomaton", max_flips: int,
+                     max_length: int = MAX_PMF_FLIPS) -> Tuple[np.ndarray, float, float]:
+    """
+    Probability that the pattern first completes on flip n, for n = 0..max_flips.
+
+    Advances BLOCK_FLIPS flips per step with precomputed matrix powers: for
+    the state distribution d at the start of a block, the block's
+    probabilities are d @ [Q^0 a, ..., Q^(B-1) a] and the next start is d @ Q^B,
+    where a holds each state's probability of completing on the next flip.
+
+    The distribution is only stored until the remaining probability
+    underflows or max_length flips are reached. By then the survival
+    probability decays by a constant factor per flip, so the rest of the
+    distribution is described by that factor (see _geometric_moments).
+
+    Args:
+        automaton: Compiled pattern automaton
+        max_flips: Last flip count to compute
+        max_length: Most flips to store
+
+    Returns:
+        Tuple of (pmf, tail_mass, decay): pmf for n = 0..T with T <= max_flips
+        (entry 0 is always 0), the probability of not having completed
+        within T flips, and the per-flip decay of that probability after T
+    """
+    states = _transient_states(automaton)
+    index = {state: position for position, state in enumerate(states)}
+    size = len(states)
+
+    q = np.zeros((size, size))
+    absorb = np.zeros(size)
+    for row, state in enumerate(states):
+        for next_state in automaton.transitions[state]:
+            if next_state in index:
+                q[row, index[next_state]] += 0.5
+            else:
+                absorb[row] += 0.5
+
+    # columns[:, k] = Q^k a, and power = Q^BLOCK_FLIPS
+    columns = np.empty((size, BLOCK_FLIPS))
+    vector = absorb
+    for k in range(BLOCK_FLIPS):
+        columns[:, k] = vector
+        vector = q @ vector
+    power = np.linalg.matrix_power(q, BLOCK_FLIPS)
+
+    # When capped, stop on a block boundary so the survival after the last stored flip is known
+    cap = -(-max(max_length, 1) // BLOCK_FLIPS) * BLOCK_FLIPS
+    length = min(max_flips, cap) + 1
+    pmf = np.zeros(length)
+    distribution = np.zeros(size)
+    distribution[0] = 1.0
+    survival = previous = 1.0
+    end = length
+    for start in range(1, length, BLOCK_FLIPS):
+        count = min(BLOCK_FLIPS, length - start)
+        pmf[start:start + count] = (distribution @ columns)[:count]
+        if count < BLOCK_FLIPS:
+            break
+        distribution = distribution @ power
+        previous, survival = survival, float(distribution.sum())
+        if survival < 1e-300:
+            end = start + count
+            break
+
+    if end < length:
+        return pmf[:end].copy(), survival, 0.0
+    if length - 1 == max_flips:
+        return pmf, max(0.0, 1.0 - float(pmf.sum())), 0.0
+    decay = (survival / previous) ** (1.0 / BLOCK_FLIPS) if previous > 0 else 0.0
+    return pmf, survival, min(decay, 1.0)
+
+
+def _geometric_moments(first: int, last: int, decay: float) -> Tuple[float, float, float]:
+    """
+    Sums of n^0, n^1 and n^2 weighted by (1 - decay) * decay^(n - first) over first..last.
+
+    These are the tail moments per unit of remaining probability when the
+    survival probability decays by decay per flip. Each is the infinite sum
+    from first minus decay^K times the infinite sum from last + 1.
+    """
+    if decay <= 0.0:
+        return 1.0, float(first), float(first) * first
+    if decay >= 1.0:
+        return 0.0, 0.0, 0.0
+    ratio = decay / (1.0 - decay)
+    second = decay * (1.0 + decay) / (1.0 - decay) ** 2
+
+    def infinite(start: float) -> Tuple[float, float, float]:
+        return 1.0, start + ratio, start * start + 2 * start * ratio + second
+
+    count = last - first + 1
+    scale = math.exp(count * math.log(decay))
+    head = infinite(float(first))
+    rest = infinite(float(last + 1))
+    return (-math.expm1(count * math.log(decay)),
+            head[1] - scale * rest[1],
+            head[2] - scale * rest[2])
+
+
+class WaitingTimeAnalysis:
+    """Exact waiting-time statistics of one pattern, truncated at max_flips."""
+
+    def __init__(self, pattern: "Pattern", max_flips: int):
+        """
+        Analyze a pattern.
+
+        Args:
+            pattern: Pattern to analyze
+            max_flips: Flip limit of a session
+        """
+        automaton = pattern.automaton
+        self.max_flips = max_flips
+
+        # Solved once per pattern instance (see Pattern.theoretical_moments)
+        self.mean, self.variance = pattern.theoretical_moments
+
+        # The pmf is stored up to the flip where its tail becomes geometric
+        self.pmf, self.tail_mass, self.decay = waiting_time_pmf(automaton, max_flips)
+        flips = np.arange(len(self.pmf), dtype=float)
+        moments = [float(self.pmf.sum()), float(flips @ self.pmf),
+                   float((flips * flips) @ self.pmf)]
+        last = len(self.pmf) - 1
+        if last < max_flips and self.tail_mass > 0:
+            tail = _geometric_moments(last + 1, max_flips, self.decay)
+            moments = [value + self.tail_mass * extra for value, extra in zip(moments, tail)]
+
+        success = min(1.0, moments[0])
+        self.success_probability = success
+        if success > 0:
+            self.truncated_mean = moments[1] / success
+            self.truncated_variance = max(0.0, moments[2] / success - self.truncated_mean ** 2)
+        else:
+            self.truncated_mean = 0.0
+            self.truncated_variance = 0.0
+        # Sessions without a match stop at max_flips
+        self.mean_flips_all = moments[1] + max_flips * (1 - success)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the stored distribution."""
+        return int(self.pmf.nbytes)
+
+    def get_cdf(self) -> np.ndarray:
+        """
+        P(pattern found within n flips) for n = 0..min(max_flips, MAX_PMF_FLIPS).
+
+        Built on every call; capped like the stored distribution, so a huge
+        flip limit cannot allocate an unbounded array.
+        """
+        cdf = np.cumsum(self.pmf)
+        missing = min(self.max_flips, MAX_PMF_FLIPS) + 1 - len(cdf)
+        if missing <= 0:
+            return cdf
+        steps = np.arange(1, missing + 1, dtype=float)
+        tail = cdf[-1] + self.tail_mass * -np.expm1(steps * math.log(self.decay)) \
+            if 0 < self.decay < 1 else np.full(missing, cdf[-1] + self.tail_mass)
+        return np.concatenate((cdf, tail))
+
+    def to_statistics(self, include_cdf: bool = False) -> Dict[str, Any]:
+        """
+        Build the theoretical counterparts of the simulation statistics.
+
+        Args:
+            include_cdf: Add "cdf", P(pattern found within n flips) for
+                n = 0..min(max_flips, MAX_PMF_FLIPS)
+        """
+        stats = {
+            "theoretical_ev": float(self.mean),
+            "theoretical_ev_variance": float(self.variance),
+            "theoretical_success_rate": self.success_probability,
+            "theoretical_ev_truncated": self.truncated_mean,
+            "theoretical_ev_truncated_variance": self.truncated_variance,
+            "theoretical_average_flips_all": self.mean_flips_all,
+        }
+        if include_cdf:
+            stats["cdf"] = self.get_cdf().tolist()
+        return stats
+
+
+_cache: "OrderedDict[Tuple, WaitingTimeAnalysis]" = OrderedDict()
+_cache_bytes = 0
+_cache_lock = threading.Lock()
+
+
+def analyze(pattern: "Pattern", max_flips: int) -> WaitingTimeAnalysis:
+    """
+    Get the exact analysis of a pattern, cached per (pattern, max_flips).
+
+    Patterns are keyed by Pattern.cache_key(), so equal patterns share an entry.
+    The least recently used entries are dropped once the cache holds more than
+    MAX_CACHED_ANALYSIS_BYTES.
+    """
+    global _cache_bytes
+    key = (pattern.cache_key(), max_flips)
+    with _cache_lock:
+        analysis = _cache.get(key)
+        if analysis is not None:
+            _cache.move_to_end(key)
+            return analysis
+
+    analysis = WaitingTimeAnalysis(pattern, max_flips)
+    with _cache_lock:
+        if key not in _cache:
+            _cache[key] = analysis
+            _cache_bytes += analysis.nbytes
+        while _cache_bytes > MAX_CACHED_ANALYSIS_BYTES and len(_cache) > 1:
+            _cache_bytes -= _cache.popitem(last=False)[1].nbytes
+    return analysis
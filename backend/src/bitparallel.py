@@ -0,0 +1,73 @@
+"""
+Word-level bit-parallel pattern detection.
+Scans packed flips (bit i = i-th flip) for the first pattern occurrence with
+shift-and operations over a whole word instead of one flip at a time.
+"""
+
+from typing import Optional
+from src.history import FlipHistory
+from src.patterns import Pattern
+
+# Number of flips drawn per random word in fast mode
+WORD_BITS = 64
+
+
+class WordScanner:
+    """Streaming shift-and scanner over consecutive words of flips."""
+    
+    def __init__(self, pattern: Pattern, history: Optional[FlipHistory] = None):
+        """
+        Initialize scanner.
+        
+        Args:
+            pattern: Pattern to detect
+            history: Flips already seen (assumed not to contain the pattern);
+                their tail is carried so matches spanning the boundary are found
+        """
+        self.sequences = pattern.get_sequences()
+        self.match_length = len(self.sequences[0])
+        
+        # The last match_length - 1 flips seen, packed like a word
+        self.carry = 0
+        self.carry_len = 0
+        self.offset = 0
+        if history is not None:
+            tail = history[max(0, len(history) - self.match_length + 1):]
+            for index, flip in enumerate(tail):
+                self.carry |= flip << index
+            self.carry_len = len(tail)
+            self.offset = len(history) - self.carry_len
+    
+    def scan(self, word: int, count: int) -> Optional[int]:
+        """
+        Consume the next count flips.
+        
+        Args:
+            word: Flips packed as an integer, bit i is the i-th new flip
+            count: Number of flips in word
+            
+        Returns:
+            Absolute start position of the first match, or None
+        """
+        width = self.carry_len + count
+        window = self.carry | ((word & ((1 << count) - 1)) << self.carry_len)
+        
+        if width >= self.match_length:
+            inverted = ~window & ((1 << width) - 1)
+            starts = (1 << (width - self.match_length + 1)) - 1
+            matches = 0
+            for sequence in self.sequences:
+                candidate = starts
+                for shift, flip in enumerate(sequence):
+                    candidate &= (window if flip else inverted) >> shift
+                    if not candidate:
+                        break
+                matches |= candidate
+            if matches:
+                return self.offset + (matches & -matches).bit_length() - 1
+        
+        keep = min(width, self.match_length - 1)
+        self.carry = window >> (width - keep)
+        self.carry_len = keep
+        self.offset += width - keep
+        return None
@@ -0,0 +1,155 @@
+"""
+Coalescing of simulation updates between the stepping loop and broadcasters.
+The simulation thread adds every step; a broadcaster periodically takes the
+merged delta, so older per-session states are dropped in favour of the newest.
+"""
+
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+import threading
+import numpy as np
+
+# Pending engine batches merged into one once this many have been added
+MAX_PENDING_BATCHES = 32
+
+
+class UpdateBatch:
+    """
+    Updates of the sessions the vectorized engine stepped, held as arrays.
+    
+    Iterating yields the simulation_update dictionaries, so they are only
+    built for the clients and subscriptions that actually receive them.
+    """
+    
+    __slots__ = ("session_ids", "flip_results", "flips_count", "completed",
+                 "pattern_found", "pattern_position")
+    
+    def __init__(self, session_ids: np.ndarray, flip_results: np.ndarray,
+                 flips_count: np.ndarray, completed: np.ndarray, pattern_found: np.ndarray,
+                 pattern_position: np.ndarray):
+        """
+        Initialize batch (the arrays must not be modified afterwards).
+        
+        Args:
+            session_ids: Stepped session IDs in ascending order
+            flip_results: Latest flip result per session
+            flips_count: flips_count per session
+            completed: Completed flag per session
+            pattern_found: Pattern-found flag per session
+            pattern_position: pattern_position per session (-1 if not found)
+        """
+        self.session_ids = session_ids
+        self.flip_results = flip_results
+        self.flips_count = flips_count
+        self.completed = completed
+        self.pattern_found = pattern_found
+        self.pattern_position = pattern_position
+    
+    def __len__(self) -> int:
+        return int(self.session_ids.size)
+    
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for session_id, flip_result, flips_count, completed, pattern_found in zip(
+                self.session_ids.tolist(), self.flip_results.tolist(),
+                self.flips_count.tolist(), self.completed.tolist(),
+                self.pattern_found.tolist()):
+            yield {
+                "session_id": session_id,
+                "flip_result": flip_result,
+                "flips_count": flips_count,
+                "completed": completed,
+                "pattern_found": pattern_found
+            }
+    
+    def select(self, start: int, end: int) -> "UpdateBatch":
+        """Updates of the sessions with start <= session_id < end."""
+        low, high = np.searchsorted(self.session_ids, (start, end)).tolist()
+        return UpdateBatch(*(getattr(self, name)[low:high] for name in self.__slots__))
+    
+    @classmethod
+    def merge(cls, batches: Sequence["UpdateBatch"]) -> "UpdateBatch":
+        """Combine batches in the order they were stepped, keeping each session's newest update."""
+        if len(batches) == 1:
+            return batches[0]
+        columns = [np.concatenate([getattr(batch, name) for batch in batches])
+                   for name in cls.__slots__]
+        # The first occurrence in reversed order is the newest update of each session
+        _, reversed_index = np.unique(columns[0][::-1], return_index=True)
+        newest = columns[0].size - 1 - reversed_index
+        return cls(*(column[newest] for column in columns))
+
+
+def json_payload(step_result: Dict[str, Any]) -> Dict[str, Any]:
+    """A step result with its updates as a JSON-serializable list."""
+    updates = step_result["updates"]
+    if isinstance(updates, list):
+        return step_result
+    return dict(step_result, updates=list(updates))
+
+
+class UpdateCoalescer:
+    """Merges step_simulation results until a broadcaster takes them."""
+    
+    def __init__(self):
+        """Initialize an empty coalescer."""
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._updates: Dict[int, Dict[str, Any]] = {}
+        self._batches: List[UpdateBatch] = []
+        self._latest: Optional[Dict[str, Any]] = None
+    
+    def add(self, step_result: Dict[str, Any]):
+        """Merge one step result; each session keeps only its newest update."""
+        updates = step_result["updates"]
+        with self._lock:
+            if isinstance(updates, UpdateBatch):
+                self._batches.append(updates)
+                if len(self._batches) >= MAX_PENDING_BATCHES:
+                    self._batches = [UpdateBatch.merge(self._batches)]
+            else:
+                for update in updates:
+                    self._updates[update["session_id"]] = update
+            self._latest = step_result
+    
+    def take(self) -> Optional[Dict[str, Any]]:
+        """
+        Take everything added since the previous take.
+        
+        Returns:
+            A step-result-shaped dict with the coalesced updates (an
+            UpdateBatch for the vectorized engine), or None if nothing was added
+        """
+        with self._lock:
+            latest = self._latest
+            if latest is None:
+                return None
+            updates = self._updates
+            batches = self._batches
+            self._updates = {}
+            self._batches = []
+            self._latest = None
+        
+        merged = list(updates.values())
+        if batches:
+            batch = UpdateBatch.merge(batches)
+            if updates:
+                # Only if the engine changed between takes; fall back to dictionaries
+                for update in batch:
+                    updates[update["session_id"]] = update
+                merged = list(updates.values())
+            else:
+                merged = batch
+        
+        return {
+            "tick": latest.get("tick"),
+            "status": latest["status"],
+            "active_sessions": latest.get("active_sessions", 0),
+            "updates": merged
+        }
+    
+    def close(self):
+        """Signal that no more steps will be added."""
+        self._closed.set()
+    
+    def wait_closed(self, timeout: float) -> bool:
+        """Wait up to timeout seconds; returns True once closed."""
+        return self._closed.wait(timeout)
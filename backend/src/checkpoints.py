@@ -0,0 +1,320 @@
+"""
+Checkpoints of live simulation runs.
+Each run's sessions are kept in a memory-mapped record file next to a small
+JSON file with the configuration, tick and aggregates. Flips are a function of
+the run seed and flip index, so per-session flip counts and automaton states
+plus the seed are the whole RNG state.
+
+Checkpoints are incremental and crash-safe: two record files are written in
+turn, and only sessions that were still running when a file was last written
+can have changed since. The JSON file, replaced atomically once a record file
+is flushed, names the file holding the latest complete checkpoint.
+"""
+
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import numpy as np
+from src.metrics import checkpoint_duration
+
+# Per-session record: flips made, automaton state, COMPLETED_FLAG | PATTERN_FOUND_FLAG
+SESSION_DTYPE = np.dtype([("flips_count", "<i8"), ("state", "<i4"), ("flags", "u1")])
+COMPLETED_FLAG = 1
+PATTERN_FOUND_FLAG = 2
+
+# Storage location and default interval, overridable through the environment
+CHECKPOINT_DIR = os.environ.get("CHECKPOINT_DIR", "checkpoints")
+DEFAULT_CHECKPOINT_INTERVAL = float(os.environ.get("CHECKPOINT_INTERVAL", "30"))
+MIN_CHECKPOINT_INTERVAL = 1.0
+
+# Layout version written to every checkpoint
+CHECKPOINT_FORMAT = 1
+
+META_FILE = "checkpoint.json"
+
+_RUN_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class CheckpointStore:
+    """Directory of checkpoints, one subdirectory per run ID."""
+
+    def __init__(self, directory: str = CHECKPOINT_DIR):
+        """
+        Initialize store.
+
+        Args:
+            directory: Directory holding the checkpoints (created on first write)
+        """
+        self.directory = directory
+
+    def _run_directory(self, run_id: str) -> str:
+        if not _RUN_ID.match(run_id):
+            raise KeyError(run_id)
+        return os.path.join(self.directory, run_id)
+
+    def write(self, run_id: str, slot: int, capture: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Write a captured checkpoint into one of the run's two record files.
+
+        Args:
+            run_id: Run the checkpoint belongs to
+            slot: Record file to write (0 or 1)
+            capture: Result of CoinFlipSimulator.capture_checkpoint; when its
+                session_ids is not None only those records are rewritten, so
+                the slot must hold an earlier checkpoint of the same run
+
+        Returns:
+            The checkpoint metadata as saved
+        """
+        directory = self._run_directory(run_id)
+        os.makedirs(directory, exist_ok=True)
+        meta = dict(capture["meta"], run_id=run_id, slot=slot, format=CHECKPOINT_FORMAT,
+                    updated_at=time.time())
+        num_sessions = meta["num_sessions"]
+        session_ids = capture["session_ids"]
+
+        arrays = [("sessions", capture["records"], SESSION_DTYPE, (num_sessions,))]
+        if capture["first_hits"] is not None:
+            arrays.append(("first_hits", capture["first_hits"], np.int64,
+                           (num_sessions, meta["num_targets"])))
+        for name, values, dtype, shape in arrays:
+            path = os.path.join(directory, f"{name}-{slot}.bin")
+            mode = "w+" if session_ids is None else "r+"
+            if not num_sessions:
+                open(path, "wb").close()
+                continue
+            records = np.memmap(path, dtype=dtype, mode=mode, shape=shape)
+            if session_ids is None:
+                records[:] = values
+            elif session_ids.size:
+                records[session_ids] = values
+            records.flush()
+            del records
+
+        # The metadata switches to the new slot only once its records are on disk
+        temporary = os.path.join(directory, META_FILE + ".tmp")
+        with open(temporary, "w") as handle:
+            json.dump(meta, handle)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(temporary, os.path.join(directory, META_FILE))
+        return meta
+
+    def read_meta(self, run_id: str) -> Dict[str, Any]:
+        """
+        Read the metadata of a run's checkpoint.
+
+        Raises:
+            KeyError: If there is no checkpoint for run_id
+        """
+        try:
+            with open(os.path.join(self._run_directory(run_id), META_FILE)) as handle:
+                return json.load(handle)
+        except (OSError, ValueError):
+            raise KeyError(run_id)
+
+    def load(self, run_id: str) -> Tuple[Dict[str, Any], np.ndarray, Optional[np.ndarray]]:
+        """
+        Load a run's latest checkpoint.
+
+        Returns:
+            Tuple of (metadata, session records, first-hit counts or None)
+
+        Raises:
+            KeyError: If there is no checkpoint for run_id
+        """
+        meta = self.read_meta(run_id)
+        directory = self._run_directory(run_id)
+        slot = meta["slot"]
+        records = np.fromfile(os.path.join(directory, f"sessions-{slot}.bin"), dtype=SESSION_DTYPE)
+        first_hits = None
+        if meta["num_targets"]:
+            first_hits = np.fromfile(os.path.join(directory, f"first_hits-{slot}.bin"),
+                                     dtype=np.int64).reshape(-1, meta["num_targets"])
+        return meta, records, first_hits
+
+    def list_checkpoints(self) -> List[Dict[str, Any]]:
+        """Summaries of every checkpoint, most recently written first."""
+        if not os.path.isdir(self.directory):
+            return []
+        summaries = []
+        for run_id in os.listdir(self.directory):
+            try:
+                meta = self.read_meta(run_id)
+            except KeyError:
+                continue
+            summaries.append(summarize(meta))
+        summaries.sort(key=lambda summary: summary["updated_at"], reverse=True)
+        return summaries
+
+    def delete(self, run_id: str):
+        """
+        Remove a run's checkpoint.
+
+        Raises:
+            KeyError: If there is no checkpoint for run_id
+        """
+        directory = self._run_directory(run_id)
+        if not os.path.isdir(directory):
+            raise KeyError(run_id)
+        shutil.rmtree(directory)
+
+
+def summarize(meta: Dict[str, Any]) -> Dict[str, Any]:
+    """Short description of a checkpoint (its metadata without the aggregates)."""
+    return {key: value for key, value in meta.items() if key != "aggregate"}
+
+
+class _RunState:
+    """What the manager remembers about the checkpoints it wrote for one run."""
+
+    def __init__(self, run_number: int, next_slot: int = 0):
+        self.run_number = run_number
+        self.next_slot = next_slot
+        # Per slot: sessions running when it was last written (None = never written)
+        self.pending: List[Optional[np.ndarray]] = [None, None]
+        self.version: Optional[int] = None
+        # Set once the run completed and its checkpoint was deleted
+        self.completed = False
+
+
+class CheckpointManager:
+    """
+    Writes checkpoints of live runs on a background thread.
+
+    Capturing a checkpoint copies the changed session records under the
+    simulator's writer lock (about the cost of one tick); the file writes
+    happen afterwards, while the run keeps stepping.
+    """
+
+    def __init__(self, store: CheckpointStore, runs: Callable[[], Iterable[Any]],
+                 interval: float = DEFAULT_CHECKPOINT_INTERVAL, enabled: bool = True):
+        """
+        Initialize manager.
+
+        Args:
+            store: Where checkpoints are written
+            runs: Returns the runs to checkpoint (objects with run_id and simulator)
+            interval: Seconds between checkpoints
+            enabled: Whether periodic checkpoints are taken
+        """
+        self.store = store
+        self.runs = runs
+        self.interval = max(MIN_CHECKPOINT_INTERVAL, interval)
+        self.enabled = enabled
+        self._states: Dict[str, _RunState] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start the periodic checkpoint thread (once)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+
+    def configure(self, interval: Optional[float] = None, enabled: Optional[bool] = None):
+        """Change the interval (seconds, at least MIN_CHECKPOINT_INTERVAL) or switch on/off."""
+        if interval is not None:
+            if interval < MIN_CHECKPOINT_INTERVAL:
+                raise ValueError(f"interval must be at least {MIN_CHECKPOINT_INTERVAL} seconds")
+            self.interval = interval
+        if enabled is not None:
+            self.enabled = enabled
+        self._wakeup.set()
+
+    def _loop(self):
+        deadline = time.monotonic() + self.interval
+        while True:
+            self._wakeup.wait(max(0.0, deadline - time.monotonic()))
+            if self._wakeup.is_set():
+                # Settings changed: restart the wait with the new interval
+                self._wakeup.clear()
+                deadline = time.monotonic() + self.interval
+                continue
+            if self.enabled:
+                self.checkpoint_all()
+            deadline = time.monotonic() + self.interval
+
+    def checkpoint_all(self):
+        """Checkpoint every run that changed since its last checkpoint."""
+        for run in list(self.runs()):
+            try:
+                self.checkpoint(run)
+            except Exception as e:
+                print(f"Error checkpointing run {run.run_id}: {e}")
+
+    def checkpoint(self, run, force: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Checkpoint one run now.
+
+        Args:
+            run: Run to checkpoint
+            force: Write even if nothing changed since the last checkpoint
+
+        Returns:
+            The checkpoint metadata, or None if the run has no checkpointable
+            state (not started, or a process-pool run) or did not change
+        """
+        simulator = run.simulator
+        with self._lock:
+            state = self._states.get(run.run_id)
+            if (not force and state is not None and state.run_number == simulator.run_number
+                    and (state.completed or state.version == simulator.snapshot.version)):
+                return None
+
+            started = time.perf_counter()
+            if state is None:
+                state = self._states[run.run_id] = self._new_state(run.run_id, simulator.run_number)
+            slot = state.next_slot
+            capture = simulator.capture_checkpoint(state.pending[slot], state.run_number)
+            if capture is None:
+                return None
+            if capture["run_number"] != state.run_number:
+                # The run was restarted: both record files must be rewritten in full
+                state = self._new_state(run.run_id, capture["run_number"])
+                self._states[run.run_id] = state
+
+            meta = self.store.write(run.run_id, slot, capture)
+            state.pending[slot] = capture["active_ids"]
+            state.next_slot = 1 - slot
+            state.version = capture["version"]
+            checkpoint_duration.observe(time.perf_counter() - started)
+            return summarize(meta)
+
+    def _new_state(self, run_id: str, run_number: int) -> _RunState:
+        """State for a run's first checkpoint here, never overwriting the file its checkpoint names."""
+        try:
+            return _RunState(run_number, next_slot=1 - self.store.read_meta(run_id)["slot"])
+        except (KeyError, TypeError):
+            return _RunState(run_number)
+
+    def forget(self, run_id: str):
+        """Drop what is known about a run's files (after deleting its checkpoint)."""
+        with self._lock:
+            self._states.pop(run_id, None)
+
+    def discard(self, run_id: str, completed_run_number: Optional[int] = None):
+        """
+        Delete a run's checkpoint, if any.
+
+        Args:
+            run_id: Run whose checkpoint is deleted
+            completed_run_number: run_number of the run if it completed; periodic
+                checkpoints then skip it until it is restarted. If None (e.g.
+                the run was evicted) the run is forgotten.
+        """
+        with self._lock:
+            try:
+                self.store.delete(run_id)
+            except KeyError:
+                pass
+            if completed_run_number is None:
+                self._states.pop(run_id, None)
+            else:
+                state = self._states[run_id] = _RunState(completed_run_number)
+                state.completed = True
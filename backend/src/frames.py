@@ -0,0 +1,140 @@
+"""
+Compact binary encoding of simulation_update frames.
+
+Frame layout (little-endian):
+    u8      version (FRAME_VERSION)
+    u8      flags (bit 0: simulation completed after this tick)
+    u32     tick (1-based; sessions still active after this tick have tick flips)
+    u32     num_sessions
+    varint  stepped_count
+    bytes   stepped bitset over session IDs [0, num_sessions)
+    bytes   flip results bitset, one bit per stepped session in ascending ID order
+    bytes   newly-completed bitset, aligned like the flip results
+    varints two per newly-completed session in ascending ID order:
+            flips_count, then pattern_position + 1 (0 if it stopped at max flips)
+Bitsets are packed least significant bit first.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence
+import struct
+import numpy as np
+
+FRAME_VERSION = 2
+FLAG_COMPLETED = 0x01
+
+_HEADER = struct.Struct("<BBII")
+
+
+def encode_varint(value: int, out: bytearray):
+    """Append an unsigned LEB128 varint to out."""
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varint(data: bytes, offset: int):
+    """Read an unsigned LEB128 varint; returns (value, new_offset)."""
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def _pack_bits(bits: np.ndarray) -> bytes:
+    return np.packbits(bits.astype(bool), bitorder="little").tobytes()
+
+
+def _unpack_bits(data: bytes, offset: int, count: int):
+    size = (count + 7) >> 3
+    bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8, count=size, offset=offset),
+                         count=count, bitorder="little")
+    return bits, offset + size
+
+
+def encode_update_frame(tick: int, num_sessions: int, session_ids: Sequence[int],
+                        flip_results: Sequence[int], completed: Sequence[bool],
+                        flips_counts: Sequence[int], positions: Sequence[Optional[int]],
+                        finished: bool = False) -> bytes:
+    """
+    Encode one tick of updates.
+    
+    Args:
+        tick: Tick number (1-based)
+        num_sessions: Total number of sessions in the run
+        session_ids: IDs of the sessions stepped since the last frame (any order)
+        flip_results: Latest flip result per stepped session
+        completed: Whether each stepped session completed since the last frame
+        flips_counts: flips_count per stepped session
+        positions: pattern_position per stepped session (None or -1 if not found)
+        finished: Whether the simulation completed after this tick
+        
+    Returns:
+        Encoded frame
+    """
+    ids = np.asarray(session_ids, dtype=np.int64)
+    order = np.argsort(ids, kind="stable")
+    ids = ids[order]
+    flips = np.asarray(flip_results, dtype=np.uint8)[order]
+    done = np.asarray(completed, dtype=bool)[order]
+    
+    stepped = np.zeros(num_sessions, dtype=bool)
+    stepped[ids] = True
+    
+    out = bytearray(_HEADER.pack(FRAME_VERSION, FLAG_COMPLETED if finished else 0,
+                                 tick, num_sessions))
+    encode_varint(int(ids.size), out)
+    out += _pack_bits(stepped)
+    out += _pack_bits(flips)
+    out += _pack_bits(done)
+    for index in order[done].tolist():
+        position = positions[index]
+        encode_varint(int(flips_counts[index]), out)
+        encode_varint(0 if position is None or position < 0 else int(position) + 1, out)
+    return bytes(out)
+
+
+def decode_update_frame(data: bytes) -> Dict[str, Any]:
+    """
+    Decode a frame into the simulation_update JSON shape.
+    
+    Reference implementation of the client-side decoder.
+    """
+    version, flags, tick, num_sessions = _HEADER.unpack_from(data, 0)
+    if version != FRAME_VERSION:
+        raise ValueError(f"Unsupported frame version {version}")
+    
+    stepped_count, offset = decode_varint(data, _HEADER.size)
+    stepped, offset = _unpack_bits(data, offset, num_sessions)
+    flips, offset = _unpack_bits(data, offset, stepped_count)
+    done, offset = _unpack_bits(data, offset, stepped_count)
+    
+    updates: List[Dict[str, Any]] = []
+    for session_id, flip_result, completed in zip(np.flatnonzero(stepped).tolist(),
+                                                  flips.tolist(), done.tolist()):
+        update = {
+            "session_id": session_id,
+            "flip_result": flip_result,
+            "flips_count": tick,
+            "completed": bool(completed),
+            "pattern_found": False
+        }
+        if completed:
+            update["flips_count"], offset = decode_varint(data, offset)
+            encoded, offset = decode_varint(data, offset)
+            update["pattern_found"] = encoded > 0
+            update["pattern_position"] = encoded - 1 if encoded else None
+        updates.append(update)
+    
+    finished = bool(flags & FLAG_COMPLETED)
+    return {
+        "tick": tick,
+        "status": "completed" if finished else "running",
+        "active_sessions": stepped_count,
+        "updates": updates
+    }
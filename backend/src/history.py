@@ -0,0 +1,175 @@
+"""
+Compact flip history storage.
+Stores coin flips as packed bits (1 bit per flip) in a bytearray.
+"""
+
+from typing import Iterator, List, Union
+
+# Byte value -> its 8 flips as "H"/"T", least significant bit first
+_BYTE_TO_STRING = [
+    "".join("H" if (byte >> bit) & 1 else "T" for bit in range(8))
+    for byte in range(256)
+]
+
+
+class FlipHistory:
+    """Sequence of coin flips (0=tails, 1=heads) packed 8 per byte."""
+
+    __slots__ = ("_bits", "_length")
+
+    def __init__(self, flips: Union[List[int], "FlipHistory", None] = None):
+        """
+        Initialize history.
+
+        Args:
+            flips: Optional initial flips
+        """
+        self._bits = bytearray()
+        self._length = 0
+        if flips is not None:
+            for flip in flips:
+                self.append(flip)
+
+    def append(self, flip: int):
+        """Append one flip."""
+        index = self._length
+        if index & 7 == 0:
+            self._bits.append(0)
+        if flip:
+            self._bits[index >> 3] |= 1 << (index & 7)
+        self._length = index + 1
+
+    def extend_bits(self, word: int, count: int):
+        """
+        Append several flips at once.
+
+        Args:
+            word: Flips packed as an integer, bit i is the i-th new flip
+            count: Number of flips to take from word
+        """
+        if count <= 0:
+            return
+        word &= (1 << count) - 1
+        offset = self._length & 7
+        if offset:
+            word = (word << offset) | self._bits.pop()
+        total = offset + count
+        self._bits += word.to_bytes((total + 7) >> 3, "little")
+        self._length += count
+
+    def truncate(self, length: int):
+        """Drop every flip at index length and beyond."""
+        if length >= self._length:
+            return
+        del self._bits[(length + 7) >> 3:]
+        if length & 7:
+            self._bits[-1] &= (1 << (length & 7)) - 1
+        self._length = length
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, key: Union[int, slice]) -> Union[int, "FlipHistoryView"]:
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self._length)
+            if step != 1:
+                raise ValueError("FlipHistory slices do not support a step")
+            return FlipHistoryView(self, start, max(start, stop))
+
+        if key < 0:
+            key += self._length
+        if not 0 <= key < self._length:
+            raise IndexError("flip index out of range")
+        return (self._bits[key >> 3] >> (key & 7)) & 1
+
+    def __iter__(self) -> Iterator[int]:
+        return self._iter_range(0, self._length)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (FlipHistory, FlipHistoryView, list)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"FlipHistory('{self.to_string()}')"
+
+    def _iter_range(self, start: int, stop: int) -> Iterator[int]:
+        bits = self._bits
+        for index in range(start, stop):
+            yield (bits[index >> 3] >> (index & 7)) & 1
+
+    def _string_range(self, start: int, stop: int) -> str:
+        if start >= stop:
+            return ""
+        first_byte = start >> 3
+        last_byte = (stop + 7) >> 3
+        encoded = "".join(_BYTE_TO_STRING[byte] for byte in self._bits[first_byte:last_byte])
+        offset = start - (first_byte << 3)
+        return encoded[offset:offset + stop - start]
+
+    def tolist(self) -> List[int]:
+        """Copy the flips into a list of ints."""
+        return list(self)
+
+    def to_string(self) -> str:
+        """Encode the flips as a string of "H"/"T" characters."""
+        return self._string_range(0, self._length)
+
+    def nbytes(self) -> int:
+        """Number of bytes used to store the flips."""
+        return len(self._bits)
+
+
+class FlipHistoryView:
+    """Read-only window onto a FlipHistory; does not copy the underlying bits."""
+
+    __slots__ = ("_history", "_start", "_stop")
+
+    def __init__(self, history: FlipHistory, start: int, stop: int):
+        """
+        Initialize view.
+
+        Args:
+            history: History to view
+            start: First flip index (inclusive)
+            stop: Last flip index (exclusive)
+        """
+        self._history = history
+        self._start = start
+        self._stop = stop
+
+    def __len__(self) -> int:
+        return self._stop - self._start
+
+    def __getitem__(self, key: Union[int, slice]) -> Union[int, "FlipHistoryView"]:
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                raise ValueError("FlipHistory slices do not support a step")
+            return FlipHistoryView(self._history, self._start + start,
+                                   self._start + max(start, stop))
+
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError("flip index out of range")
+        return self._history[self._start + key]
+
+    def __iter__(self) -> Iterator[int]:
+        return self._history._iter_range(self._start, self._stop)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (FlipHistory, FlipHistoryView, list)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"FlipHistoryView('{self.to_string()}')"
+
+    def tolist(self) -> List[int]:
+        """Copy the viewed flips into a list of ints."""
+        return list(self)
+
+    def to_string(self) -> str:
+        """Encode the viewed flips as a string of "H"/"T" characters."""
+        return self._history._string_range(self._start, self._stop)
@@ -14,6 +14,13 @@ def create_app():
     app = Flask(__name__)
     app.config['SECRET_KEY'] = 'coin_flip_secret_key_2024'
     
+    # Run history database (SQLite next to the app unless DATABASE_URL is set)
+    database_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database')
+    os.makedirs(database_dir, exist_ok=True)
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
+        'DATABASE_URL', f"sqlite:///{os.path.join(database_dir, 'app.db')}")
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    
     # Enable CORS for all domains
     CORS(app, origins="*")
     
@@ -21,12 +28,25 @@ def create_app():
     socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
     
     # Import and register routes after socketio is created
-    from routes.simulation import simulation_bp, register_socketio_events
+    from routes.simulation import simulation_bp, register_socketio_events, start_checkpointing
+    from routes.metrics import metrics_bp, record_request_latency, start_request_timer
+    from routes.runs import runs_bp
+    from src.run_history import init_run_history
+    init_run_history(app)
     app.register_blueprint(simulation_bp, url_prefix='/api')
+    app.register_blueprint(runs_bp, url_prefix='/api')
+    app.register_blueprint(metrics_bp)
+    
+    # Request latency for every route, whichever blueprint serves it
+    app.before_request(start_request_timer)
+    app.after_request(record_request_latency)
     
     # Register SocketIO events
     register_socketio_events(socketio)
     
+    # Resume runs interrupted by a restart and keep checkpointing
+    start_checkpointing()
+    
     return app, socketio
 
 if __name__ == '__main__':
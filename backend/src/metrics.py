@@ -0,0 +1,244 @@
+"""
+Runtime metrics in the Prometheus text exposition format.
+Timers, counters and histograms are cheap to update and do nothing at all
+while the registry is disabled, so instrumentation can stay in hot paths and
+be switched on only when needed.
+"""
+
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import math
+import os
+import threading
+import time
+
+# Histogram buckets (upper bounds, +Inf is implicit)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# Instrumentation is on unless METRICS_ENABLED=0 (switchable at runtime)
+DEFAULT_ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+
+# Sizing JSON payloads means serializing them a second time, so it is opt-in
+DEFAULT_PAYLOAD_BYTES = os.environ.get("METRICS_PAYLOAD_BYTES", "0") == "1"
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str],
+                   extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+               for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Base class of a metric family with optional labels."""
+
+    kind = ""
+
+    def __init__(self, registry: "MetricsRegistry", name: str, help_text: str,
+                 labels: Sequence[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def clear(self):
+        """Drop every recorded sample."""
+        with self._lock:
+            self._values = {}
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            lines.extend(self._render_samples())
+        return lines
+
+    def _render_samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+                for key, value in sorted(self._values.items())]
+
+
+class Counter(_Metric):
+    """Monotonically increasing total."""
+
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, *label_values: str):
+        """Add amount to the total of the given label values."""
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+
+class Gauge(_Metric):
+    """Value that can go up and down (usually refreshed by a collector at scrape time)."""
+
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, *label_values: str):
+        """Set the value for the given label values."""
+        with self._lock:
+            self._values[label_values] = value
+
+    def replace(self, values: Dict[Tuple[str, ...], float]):
+        """Replace every value at once (drops label values that disappeared)."""
+        with self._lock:
+            self._values = dict(values)
+
+
+class Histogram(_Metric):
+    """Distribution of observations over fixed buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, registry: "MetricsRegistry", name: str, help_text: str,
+                 labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(registry, name, help_text, labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (last is +Inf), sum]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *label_values: str):
+        """Record one observation."""
+        if not self.registry.enabled:
+            return
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def observe_since(self, started: Optional[float], *label_values: str):
+        """Record the seconds elapsed since a MetricsRegistry.start() value (None is ignored)."""
+        if started is not None:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def _render_samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                labels = _format_labels(self.labels, key, ("le", _format_value(float(bound))))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Set of metrics rendered together; collectors refresh gauges at scrape time."""
+
+    def __init__(self, enabled: bool = DEFAULT_ENABLED,
+                 payload_bytes: bool = DEFAULT_PAYLOAD_BYTES):
+        """
+        Initialize registry.
+
+        Args:
+            enabled: Whether metrics record anything
+            payload_bytes: Whether the size of JSON payloads is measured
+                (binary frames are always measured)
+        """
+        self.enabled = enabled
+        self.payload_bytes = payload_bytes
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        """Create and register a counter."""
+        return self._register(Counter(self, name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Gauge:
+        """Create and register a gauge."""
+        return self._register(Gauge(self, name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        """Create and register a histogram."""
+        return self._register(Histogram(self, name, help_text, labels, buckets))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], None]):
+        """Call collector before every render (e.g. to set gauges from live state)."""
+        self._collectors.append(collector)
+
+    def start(self) -> Optional[float]:
+        """Start a timer: a perf_counter value, or None while disabled."""
+        return time.perf_counter() if self.enabled else None
+
+    def set_enabled(self, enabled: bool):
+        """Switch instrumentation on or off; samples recorded so far are kept."""
+        self.enabled = enabled
+
+    def set_payload_bytes(self, payload_bytes: bool):
+        """Switch measuring the size of JSON payloads on or off."""
+        self.payload_bytes = payload_bytes
+
+    def reset(self):
+        """Drop every recorded sample."""
+        for metric in self._metrics:
+            metric.clear()
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text format (version 0.0.4)."""
+        if self.enabled:
+            for collector in self._collectors:
+                collector()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry and the metrics the server records
+registry = MetricsRegistry()
+
+step_duration = registry.histogram(
+    "coinflip_step_duration_seconds", "Time to step a run by one tick.", labels=("engine",))
+sessions_stepped = registry.counter(
+    "coinflip_sessions_stepped_total",
+    "Session flips performed by the scheduler (rate() gives sessions stepped per second).",
+    labels=("engine",))
+emit_bytes = registry.histogram(
+    "coinflip_emit_payload_bytes", "Size of Socket.IO payloads sent to clients.",
+    labels=("event",), buckets=BYTES_BUCKETS)
+emit_duration = registry.histogram(
+    "coinflip_emit_duration_seconds", "Time spent in Socket.IO emit calls.", labels=("event",))
+connected_clients = registry.gauge(
+    "coinflip_connected_clients", "Connected Socket.IO clients.")
+active_sessions = registry.gauge(
+    "coinflip_active_sessions", "Sessions that have not completed yet.", labels=("run_id",))
+completed_sessions = registry.gauge(
+    "coinflip_completed_sessions", "Sessions that have completed.", labels=("run_id",))
+request_duration = registry.histogram(
+    "coinflip_http_request_duration_seconds", "Latency of API requests.",
+    labels=("route", "method", "status"))
+checkpoint_duration = registry.histogram(
+    "coinflip_checkpoint_duration_seconds", "Time to capture and write a run checkpoint.")
@@ -0,0 +1,86 @@
+from datetime import datetime, timezone
+from src.models.user import db
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class RunSummary(db.Model):
+    """Final aggregate statistics of one finished simulation run."""
+
+    __tablename__ = 'run_summaries'
+
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.String(64), nullable=False)
+    kind = db.Column(db.String(16), nullable=False)
+    engine = db.Column(db.String(16))
+    pattern_key = db.Column(db.String(512), nullable=False, index=True)
+    pattern_description = db.Column(db.String(512), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=_utcnow, index=True)
+    seed = db.Column(db.String(20))
+    num_sessions = db.Column(db.Integer, nullable=False, index=True)
+    max_flips_per_session = db.Column(db.Integer, nullable=False)
+    complete = db.Column(db.Boolean, nullable=False)
+    completed_sessions = db.Column(db.Integer, nullable=False)
+    pattern_found_sessions = db.Column(db.Integer, nullable=False)
+    completed_flips_sum = db.Column(db.BigInteger, nullable=False)
+    pattern_flips_sum = db.Column(db.BigInteger, nullable=False)
+    pattern_flips_mean = db.Column(db.Float, nullable=False)
+    pattern_flips_m2 = db.Column(db.Float, nullable=False)
+    pattern_flips_min = db.Column(db.Integer)
+    pattern_flips_max = db.Column(db.Integer)
+    theoretical_ev = db.Column(db.Float)
+
+    histogram = db.relationship('RunHistogramBin', backref='run', lazy='dynamic',
+                                cascade='all, delete-orphan')
+
+    def __repr__(self):
+        return f'<RunSummary {self.id} {self.pattern_key}>'
+
+    def to_dict(self):
+        found = self.pattern_found_sessions
+        variance = self.pattern_flips_m2 / (found - 1) if found > 1 else 0.0
+        return {
+            'id': self.id,
+            'run_id': self.run_id,
+            'kind': self.kind,
+            'engine': self.engine,
+            'pattern_key': self.pattern_key,
+            'pattern_description': self.pattern_description,
+            'created_at': self.created_at.isoformat() + 'Z',
+            'seed': self.seed,
+            'num_sessions': self.num_sessions,
+            'max_flips_per_session': self.max_flips_per_session,
+            'complete': self.complete,
+            'completed_sessions': self.completed_sessions,
+            'pattern_found_sessions': found,
+            'pattern_success_rate': found / self.completed_sessions if self.completed_sessions else 0,
+            'average_flips_all': (self.completed_flips_sum / self.completed_sessions
+                                  if self.completed_sessions else 0),
+            'actual_ev': self.pattern_flips_mean,
+            'actual_ev_variance': variance,
+            'min_flips_pattern_found': self.pattern_flips_min,
+            'max_flips_pattern_found': self.pattern_flips_max,
+            'theoretical_ev': self.theoretical_ev
+        }
+
+
+class RunHistogramBin(db.Model):
+    """Sessions of a run that found the pattern after exactly `flips` flips."""
+
+    __tablename__ = 'run_histogram_bins'
+
+    run_summary_id = db.Column(db.Integer, db.ForeignKey('run_summaries.id', ondelete='CASCADE'),
+                               primary_key=True)
+    flips = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f'<RunHistogramBin {self.run_summary_id} {self.flips}>'
+
+    def to_dict(self):
+        return {
+            'flips': self.flips,
+            'count': self.count
+        }
@@ -0,0 +1,100 @@
+"""
+Process-pool execution of large simulations.
+Splits sessions into shards that run to completion in worker processes and
+merges their compact aggregates.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+import multiprocessing
+import os
+from src.aggregates import RunAggregate
+from src.patterns import Pattern
+from src.rng import random_seed
+from src.vectorized import VectorizedEngine
+
+# Sessions per shard (flips are keyed by session ID, so this does not change results)
+DEFAULT_SHARD_SIZE = 50000
+
+# Most worker processes a run may use
+MAX_WORKERS = os.cpu_count() or 1
+
+# Engine every shard runs on, whatever engine the simulator is configured with
+SHARD_ENGINE = "numpy"
+
+
+def run_shard(pattern: Pattern, first_session_id: int, num_sessions: int, max_flips: int,
+              seed: int, deadline: Optional[float] = None) -> RunAggregate:
+    """
+    Run one shard of sessions to completion.
+    
+    Args:
+        pattern: Pattern to detect
+        first_session_id: Global ID of the shard's first session
+        num_sessions: Number of sessions in the shard
+        max_flips: Maximum flips per session
+        seed: Run seed
+        deadline: Optional time.time() value after which to stop early
+        
+    Returns:
+        Aggregate over the shard's sessions (unfinished ones are not completed)
+    """
+    engine = VectorizedEngine(pattern, num_sessions, max_flips, seed=seed,
+                              first_session_id=first_session_id)
+    engine.run_until_completion(deadline)
+    
+    aggregate = RunAggregate()
+    aggregate.add_arrays(engine.completed, engine.pattern_found, engine.flips_count,
+                         engine.first_hits)
+    return aggregate
+
+
+def split_shards(num_sessions: int, shard_size: int = DEFAULT_SHARD_SIZE) -> List[int]:
+    """Split a session count into shard sizes of at most shard_size."""
+    full, remainder = divmod(num_sessions, shard_size)
+    return [shard_size] * full + ([remainder] if remainder else [])
+
+
+def run_parallel(pattern: Pattern, num_sessions: int, max_flips: int, workers: int = 1,
+                 seed: Optional[int] = None, deadline: Optional[float] = None,
+                 shard_size: int = DEFAULT_SHARD_SIZE,
+                 first_session_id: int = 0) -> RunAggregate:
+    """
+    Run sessions to completion across a pool of worker processes.
+    
+    Args:
+        pattern: Pattern to detect
+        num_sessions: Total number of sessions
+        max_flips: Maximum flips per session
+        workers: Number of worker processes (1 runs in-process, at most MAX_WORKERS)
+        seed: Run seed (random if omitted); the same seed gives the same result
+            for any worker count or shard size
+        deadline: Optional time.time() value after which shards stop early
+        shard_size: Maximum sessions per shard
+        first_session_id: ID of the first session (continues an earlier batch)
+        
+    Returns:
+        Aggregate merged over all shards
+    """
+    if seed is None:
+        seed = random_seed()
+    shards = split_shards(num_sessions, shard_size)
+    first_ids = [first_session_id + index * shard_size for index in range(len(shards))]
+    
+    aggregate = RunAggregate()
+    if workers <= 1 or len(shards) <= 1:
+        for first_id, size in zip(first_ids, shards):
+            aggregate.merge(run_shard(pattern, first_id, size, max_flips, seed, deadline))
+        return aggregate
+    
+    # Spawn rather than fork: the server process runs request and Socket.IO threads
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(workers, MAX_WORKERS, len(shards)),
+                             mp_context=context) as pool:
+        futures = [
+            pool.submit(run_shard, pattern, first_id, size, max_flips, seed, deadline)
+            for first_id, size in zip(first_ids, shards)
+        ]
+        for future in futures:
+            aggregate.merge(future.result())
+    return aggregate
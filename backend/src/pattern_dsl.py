@@ -0,0 +1,315 @@
+"""
+Pattern expression language.
+A small regex-like language over H/T, e.g. "H{3}", "(HT){2}", "T?HH" or
+"[HT]H{2}", compiled to a minimized automaton the simulation engines run
+directly. Compiled patterns are cached by their normalized expression.
+"""
+
+from collections import OrderedDict
+from functools import cached_property
+from typing import List, Tuple
+import threading
+from src.patterns import MAX_AUTOMATON_STATES, Pattern, PatternAutomaton, PATTERN_CONFIGS
+
+# Limits on what an expression may expand to (its automaton is also limited
+# to MAX_AUTOMATON_STATES states)
+MAX_SEQUENCES = 256
+MAX_MATCH_LENGTH = 32
+
+# Number of compiled expressions kept
+MAX_CACHED_PATTERNS = 256
+
+# Parsed expressions are nested tuples:
+#   ("flips", (flip, ...))            one flip out of a set
+#   ("concat", (node, ...))           nodes in sequence
+#   ("alt", (node, ...))              any one of the nodes
+#   ("repeat", node, minimum, maximum)
+Node = Tuple
+
+_FLIPS = {"T": 0, "H": 1}
+
+
+class _Parser:
+    """Recursive-descent parser for pattern expressions."""
+
+    def __init__(self, expression: str):
+        self.text = "".join(expression.split()).upper()
+        self.position = 0
+
+    def parse(self) -> Node:
+        if not self.text:
+            raise ValueError("Empty pattern expression")
+        node = self._alternation()
+        if self.position < len(self.text):
+            self._error("Unexpected character")
+        return node
+
+    def _peek(self) -> str:
+        return self.text[self.position] if self.position < len(self.text) else ""
+
+    def _take(self, expected: str):
+        if self._peek() != expected:
+            self._error(f"Expected '{expected}'")
+        self.position += 1
+
+    def _error(self, message: str):
+        raise ValueError(f"{message} at position {self.position} in pattern '{self.text}'")
+
+    def _alternation(self) -> Node:
+        options = [self._concatenation()]
+        while self._peek() == "|":
+            self.position += 1
+            options.append(self._concatenation())
+        return options[0] if len(options) == 1 else ("alt", tuple(options))
+
+    def _concatenation(self) -> Node:
+        parts = []
+        while self._peek() and self._peek() not in "|)":
+            parts.append(self._repetition())
+        if not parts:
+            self._error("Expected a flip, class or group")
+        return parts[0] if len(parts) == 1 else ("concat", tuple(parts))
+
+    def _repetition(self) -> Node:
+        node = self._atom()
+        while self._peek() and self._peek() in "?{*+":
+            character = self._peek()
+            if character in "*+":
+                self._error("Unbounded repetition is not supported")
+            self.position += 1
+            if character == "?":
+                node = ("repeat", node, 0, 1)
+                continue
+            minimum = self._number()
+            maximum = minimum
+            if self._peek() == ",":
+                self.position += 1
+                maximum = self._number()
+            self._take("}")
+            if maximum < minimum:
+                self._error("Repetition maximum is below its minimum")
+            if maximum > MAX_MATCH_LENGTH:
+                self._error(f"Repetition count is above {MAX_MATCH_LENGTH}")
+            node = ("repeat", node, minimum, maximum)
+        return node
+
+    def _number(self) -> int:
+        start = self.position
+        while self._peek().isdigit():
+            self.position += 1
+        if start == self.position:
+            self._error("Expected a number")
+        return int(self.text[start:self.position])
+
+    def _atom(self) -> Node:
+        character = self._peek()
+        if character in _FLIPS:
+            self.position += 1
+            return ("flips", (_FLIPS[character],))
+        if character == "[":
+            self.position += 1
+            flips = set()
+            while self._peek() in _FLIPS:
+                flips.add(_FLIPS[self._peek()])
+                self.position += 1
+            self._take("]")
+            if not flips:
+                self._error("Empty flip class")
+            return ("flips", tuple(sorted(flips)))
+        if character == "(":
+            self.position += 1
+            node = self._alternation()
+            self._take(")")
+            return node
+        self._error("Expected a flip, class or group")
+
+
+def parse_expression(expression: str) -> Node:
+    """
+    Parse a pattern expression.
+
+    Grammar: alternatives separated by "|", each a sequence of atoms ("H",
+    "T", a class like "[HT]" or a parenthesized expression), each optionally
+    followed by "?", "{n}" or "{m,n}" (counts up to MAX_MATCH_LENGTH). Case
+    and whitespace are ignored.
+
+    Raises:
+        ValueError: If the expression is malformed
+    """
+    return _Parser(expression).parse()
+
+
+def format_expression(node: Node) -> str:
+    """Write a parsed expression in normalized form."""
+    kind = node[0]
+    if kind == "flips":
+        letters = "".join("TH"[flip] for flip in sorted(node[1], reverse=True))
+        return letters if len(letters) == 1 else f"[{letters}]"
+    if kind == "concat":
+        return "".join(f"({format_expression(part)})" if part[0] == "alt"
+                       else format_expression(part) for part in node[1])
+    if kind == "alt":
+        return "|".join(format_expression(option) for option in node[1])
+
+    _, child, minimum, maximum = node
+    text = format_expression(child)
+    if child[0] != "flips":
+        text = f"({text})"
+    if (minimum, maximum) == (1, 1):
+        return text
+    if (minimum, maximum) == (0, 1):
+        return f"{text}?"
+    if minimum == maximum:
+        return f"{text}{{{minimum}}}"
+    return f"{text}{{{minimum},{maximum}}}"
+
+
+def normalize_expression(expression: str) -> str:
+    """Normalized form of an expression (the key compiled patterns are cached by)."""
+    return format_expression(parse_expression(expression))
+
+
+def _expand(node: Node) -> set:
+    """All flip sequences (as tuples) a parsed expression matches."""
+    kind = node[0]
+    if kind == "flips":
+        return {(flip,) for flip in node[1]}
+    if kind == "alt":
+        return set().union(*(_expand(option) for option in node[1]))
+    if kind == "concat":
+        sequences = {()}
+        for part in node[1]:
+            sequences = _product(sequences, _expand(part))
+        return sequences
+
+    _, child, minimum, maximum = node
+    options = _expand(child)
+    sequences = {()}
+    # Once another repetition adds nothing (e.g. an empty-only body) the rest would not either
+    for _ in range(minimum):
+        expanded = _product(sequences, options)
+        if expanded == sequences:
+            break
+        sequences = expanded
+    result = set(sequences)
+    for _ in range(minimum, maximum):
+        sequences = _product(sequences, options)
+        if sequences <= result:
+            break
+        result |= sequences
+    return result
+
+
+def _product(prefixes: set, suffixes: set) -> set:
+    """Concatenate every prefix with every suffix, enforcing the expansion limits."""
+    if len(prefixes) * len(suffixes) > MAX_SEQUENCES:
+        raise ValueError(f"Pattern matches more than {MAX_SEQUENCES} sequences")
+    result = {prefix + suffix for prefix in prefixes for suffix in suffixes}
+    if any(len(sequence) > MAX_MATCH_LENGTH for sequence in result):
+        raise ValueError(f"Pattern matches sequences longer than {MAX_MATCH_LENGTH} flips")
+    return result
+
+
+def expression_sequences(expression: str) -> List[List[int]]:
+    """
+    Expand an expression into the sequences whose occurrence completes it.
+
+    A sequence that ends with another matched sequence can never complete
+    the pattern first, so it is dropped (e.g. "T?HH" reduces to "HH"). The
+    remaining sequences must have equal length, so that a match has a
+    well-defined start position.
+
+    Raises:
+        ValueError: If the expression is malformed, matches the empty
+            sequence, exceeds the limits or has matches of different lengths
+    """
+    sequences = _expand(parse_expression(expression))
+    if () in sequences:
+        raise ValueError(f"Pattern '{expression}' matches the empty sequence")
+
+    minimal = sorted(sequence for sequence in sequences
+                     if not any(sequence[start:] in sequences
+                                for start in range(1, len(sequence))))
+    if len({len(sequence) for sequence in minimal}) != 1:
+        raise ValueError(f"Pattern '{expression}' matches sequences of different lengths")
+    return [list(sequence) for sequence in minimal]
+
+
+class ExpressionPattern(Pattern):
+    """Pattern defined by an expression of the pattern language."""
+
+    def __init__(self, expression: str):
+        """
+        Compile a pattern expression.
+
+        Args:
+            expression: Pattern expression, e.g. "[HT]H{2}"
+
+        Raises:
+            ValueError: If the expression is invalid (see expression_sequences)
+                or its minimized automaton has more than MAX_AUTOMATON_STATES states
+        """
+        self.expression = normalize_expression(expression)
+        self.sequences = expression_sequences(self.expression)
+        if self.automaton.num_states > MAX_AUTOMATON_STATES:
+            raise ValueError(f"Pattern '{self.expression}' needs {self.automaton.num_states} "
+                             f"automaton states (at most {MAX_AUTOMATON_STATES})")
+
+    def get_sequences(self) -> List[List[int]]:
+        """Get the sequences the expression reduces to."""
+        return [list(sequence) for sequence in self.sequences]
+
+    @cached_property
+    def automaton(self) -> PatternAutomaton:
+        """Minimized automaton for the expression."""
+        return PatternAutomaton.from_sequences(self.sequences).minimized()
+
+    def get_theoretical_ev(self) -> float:
+        """Exact expected flips until the expression first matches."""
+        return self.exact_ev
+
+    def get_description(self) -> str:
+        """Get description of the pattern."""
+        return f"Pattern {self.expression}"
+
+
+_cache: "OrderedDict[str, ExpressionPattern]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def compile_pattern(expression: str) -> ExpressionPattern:
+    """
+    Compile an expression, cached by its normalized form.
+
+    The automaton is built (and its size checked) on first compilation, so
+    cached patterns are ready to run.
+
+    Raises:
+        ValueError: If the expression is invalid
+    """
+    key = normalize_expression(expression)
+    with _cache_lock:
+        pattern = _cache.get(key)
+        if pattern is not None:
+            _cache.move_to_end(key)
+            return pattern
+
+    pattern = ExpressionPattern(key)
+    with _cache_lock:
+        _cache[key] = pattern
+        while len(_cache) > MAX_CACHED_PATTERNS:
+            _cache.popitem(last=False)
+    return pattern
+
+
+def resolve_pattern(name_or_expression: str) -> Pattern:
+    """
+    Look up a predefined pattern by name, or compile an expression.
+
+    Raises:
+        ValueError: If it is neither a name from PATTERN_CONFIGS nor a valid expression
+    """
+    pattern = PATTERN_CONFIGS.get(name_or_expression)
+    if pattern is not None:
+        return pattern
+    return compile_pattern(name_or_expression)
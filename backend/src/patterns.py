@@ -4,31 +4,270 @@ Provides modular pattern detection classes for different coin flip patterns.
 """
 
 from abc import ABC, abstractmethod
-from typing import List, Optional, Tuple
+from collections import deque
+from functools import cached_property
+from typing import Dict, List, Optional, Tuple
 import math
+from src.analytics import waiting_time_moments, win_probabilities
+
+# Modes of a PatternSet: stop at the first target hit, or once every target has hit
+PATTERN_SET_MODES = ("race", "census")
+
+# Largest automaton a user-defined pattern may compile to; bounds the cost of
+# its exact analysis and the size of every engine's transition table
+MAX_AUTOMATON_STATES = 256
+
+
+class PatternAutomaton:
+    """
+    Deterministic automaton that recognises a set of flip sequences.
+    
+    States are the prefixes of the target sequences (Aho-Corasick over the
+    alphabet {0, 1}); for a single sequence this is the KMP automaton.
+    """
+    
+    def __init__(self, transitions: List[Tuple[int, int]], accepting: List[bool],
+                 match_length: int, match_lengths: Optional[List[int]] = None):
+        """
+        Initialize automaton.
+        
+        Args:
+            transitions: transitions[state][flip] -> next state
+            accepting: accepting[state] is True when a target has just matched
+            match_length: Length of the longest matched sequence
+            match_lengths: Per state, the length of the match ending on entry to
+                it (0 if not accepting); defaults to match_length for every
+                accepting state
+        """
+        self.transitions = transitions
+        self.accepting = accepting
+        self.match_length = match_length
+        if match_lengths is None:
+            match_lengths = [match_length if accept else 0 for accept in accepting]
+        self.match_lengths = match_lengths
+        self.num_states = len(transitions)
+    
+    @classmethod
+    def from_sequences(cls, sequences: List[List[int]]) -> "PatternAutomaton":
+        """
+        Build the automaton for a set of equal-length sequences.
+        
+        Args:
+            sequences: Target sequences (0=tails, 1=heads)
+            
+        Returns:
+            Compiled automaton, state 0 is the start state
+        """
+        lengths = {len(sequence) for sequence in sequences}
+        if len(lengths) != 1 or 0 in lengths:
+            raise ValueError("Sequences must be non-empty and of equal length")
+        
+        transitions, outputs = cls.build_outputs([sequences])
+        return cls(transitions, [bool(mask) for mask in outputs], lengths.pop())
+    
+    @staticmethod
+    def build_outputs(groups: List[List[List[int]]]) -> Tuple[List[Tuple[int, int]], List[int]]:
+        """
+        Build the Aho-Corasick transitions for several groups of sequences.
+        
+        Args:
+            groups: groups[i] holds the sequences of target i
+            
+        Returns:
+            Tuple of (transitions, outputs) where bit i of outputs[state] is
+            set when a sequence of group i has just matched
+        """
+        # Trie of all sequences
+        goto: List[List[Optional[int]]] = [[None, None]]
+        terminal = [0]
+        for group, sequences in enumerate(groups):
+            for sequence in sequences:
+                state = 0
+                for flip in sequence:
+                    if goto[state][flip] is None:
+                        goto.append([None, None])
+                        terminal.append(0)
+                        goto[state][flip] = len(goto) - 1
+                    state = goto[state][flip]
+                terminal[state] |= 1 << group
+        
+        # Breadth-first completion of the transition function via failure links
+        transitions: List[List[int]] = [[0, 0] for _ in goto]
+        outputs = list(terminal)
+        failure = [0] * len(goto)
+        queue = deque()
+        for flip in (0, 1):
+            child = goto[0][flip]
+            if child is None:
+                transitions[0][flip] = 0
+            else:
+                transitions[0][flip] = child
+                queue.append(child)
+        
+        while queue:
+            state = queue.popleft()
+            outputs[state] |= outputs[failure[state]]
+            for flip in (0, 1):
+                child = goto[state][flip]
+                if child is None:
+                    transitions[state][flip] = transitions[failure[state]][flip]
+                else:
+                    failure[child] = transitions[failure[state]][flip]
+                    transitions[state][flip] = child
+                    queue.append(child)
+        
+        return [tuple(row) for row in transitions], outputs
+    
+    def minimized(self) -> "PatternAutomaton":
+        """
+        Get the equivalent automaton with the fewest states.
+        
+        Moore partition refinement: states start split by match length (0 when
+        not accepting) and are split further by the classes of their successors
+        until stable. Only states reachable from the start are kept, numbered
+        in BFS order.
+        
+        Returns:
+            Minimized automaton, state 0 is the start state
+        """
+        classes = list(self.match_lengths)
+        num_classes = len(set(classes))
+        while True:
+            signatures = {}
+            refined = []
+            for state, (tails, heads) in enumerate(self.transitions):
+                signature = (classes[state], classes[tails], classes[heads])
+                refined.append(signatures.setdefault(signature, len(signatures)))
+            classes = refined
+            if len(signatures) == num_classes:
+                break
+            num_classes = len(signatures)
+        
+        index = {classes[0]: 0}
+        order = [0]
+        transitions = []
+        for state in order:
+            row = []
+            for next_state in self.transitions[state]:
+                if classes[next_state] not in index:
+                    index[classes[next_state]] = len(order)
+                    order.append(next_state)
+                row.append(index[classes[next_state]])
+            transitions.append(tuple(row))
+        accepting = [self.accepting[state] for state in order]
+        match_lengths = [self.match_lengths[state] for state in order]
+        return PatternAutomaton(transitions, accepting, self.match_length, match_lengths)
+    
+    def new_matcher(self) -> "PatternMatcher":
+        """Create a fresh matcher positioned at the start state."""
+        return PatternMatcher(self)
+
+
+class PatternMatcher:
+    """Incremental matcher that consumes one flip at a time in O(1)."""
+    
+    __slots__ = ("transitions", "accepting", "match_lengths", "state", "count")
+    
+    def __init__(self, automaton: PatternAutomaton):
+        """
+        Initialize matcher.
+        
+        Args:
+            automaton: Compiled automaton to run
+        """
+        self.transitions = automaton.transitions
+        self.accepting = automaton.accepting
+        self.match_lengths = automaton.match_lengths
+        self.state = 0
+        self.count = 0
+    
+    def feed(self, flip: int) -> Optional[int]:
+        """
+        Consume one flip.
+        
+        Args:
+            flip: Coin flip (0=tails, 1=heads)
+            
+        Returns:
+            Start position of the match if the pattern completes on this flip,
+            None otherwise
+        """
+        self.state = self.transitions[self.state][flip]
+        self.count += 1
+        if self.accepting[self.state]:
+            return self.count - self.match_lengths[self.state]
+        return None
 
 
 class Pattern(ABC):
     """Abstract base class for pattern detection."""
     
+    # For patterns made of several targets (PatternSet): target names, and per
+    # automaton state the bitmask of targets that have just matched
+    target_names: Optional[List[str]] = None
+    hit_masks: Optional[List[int]] = None
+    
     @abstractmethod
+    def get_sequences(self) -> List[List[int]]:
+        """
+        Get the flip sequences that complete this pattern.
+        
+        Returns:
+            List of equal-length sequences (0=tails, 1=heads)
+        """
+        pass
+    
+    @cached_property
+    def automaton(self) -> PatternAutomaton:
+        """Compiled automaton for this pattern (built once per instance)."""
+        return PatternAutomaton.from_sequences(self.get_sequences())
+    
+    def cache_key(self) -> Tuple:
+        """Hashable key that is equal for patterns with the same automaton."""
+        return tuple(tuple(sequence) for sequence in self.get_sequences())
+    
+    def new_matcher(self) -> PatternMatcher:
+        """Create an incremental matcher for this pattern."""
+        return self.automaton.new_matcher()
+    
     def check_pattern(self, flips: List[int]) -> Tuple[bool, Optional[int]]:
         """
         Check if pattern is found in the flip sequence.
         
+        Compatibility wrapper around new_matcher(); prefer feeding flips to a
+        matcher incrementally instead of rescanning the whole sequence.
+        
         Args:
             flips: List of coin flips (0=tails, 1=heads)
             
         Returns:
             Tuple of (pattern_found, position_of_pattern)
         """
-        pass
+        matcher = self.new_matcher()
+        for flip in flips:
+            position = matcher.feed(flip)
+            if position is not None:
+                return True, position
+        return False, None
     
     @abstractmethod
     def get_theoretical_ev(self) -> float:
         """Get theoretical expected value for this pattern."""
         pass
     
+    @cached_property
+    def theoretical_moments(self) -> Tuple[float, float]:
+        """
+        Mean and variance of the flips until the pattern completes, solved
+        from the automaton once per instance (see analytics.waiting_time_moments).
+        """
+        return waiting_time_moments(self.automaton)
+    
+    @property
+    def exact_ev(self) -> float:
+        """Expected flips until the pattern completes, from theoretical_moments."""
+        return self.theoretical_moments[0]
+    
     @abstractmethod
     def get_description(self) -> str:
         """Get human-readable description of the pattern."""
@@ -50,21 +289,9 @@ class ConsecutivePattern(Pattern):
         self.target_value = target_value
         self.name = "heads" if target_value == 1 else "tails"
     
-    def check_pattern(self, flips: List[int]) -> Tuple[bool, Optional[int]]:
-        """Check for consecutive pattern in flip sequence."""
-        if len(flips) < self.length:
-            return False, None
-        
-        consecutive_count = 0
-        for i, flip in enumerate(flips):
-            if flip == self.target_value:
-                consecutive_count += 1
-                if consecutive_count >= self.length:
-                    return True, i - self.length + 1
-            else:
-                consecutive_count = 0
-        
-        return False, None
+    def get_sequences(self) -> List[List[int]]:
+        """Get the run of target values that completes the pattern."""
+        return [[self.target_value] * self.length]
     
     def get_theoretical_ev(self) -> float:
         """
@@ -104,30 +331,17 @@ class AlternatingPattern(Pattern):
         """
         self.length = length
     
-    def check_pattern(self, flips: List[int]) -> Tuple[bool, Optional[int]]:
-        """Check for alternating pattern in flip sequence."""
-        if len(flips) < self.length:
-            return False, None
-        
-        for i in range(len(flips) - self.length + 1):
-            is_alternating = True
-            for j in range(1, self.length):
-                if flips[i + j] == flips[i + j - 1]:
-                    is_alternating = False
-                    break
-            
-            if is_alternating:
-                return True, i
-        
-        return False, None
+    def get_sequences(self) -> List[List[int]]:
+        """Get both alternating sequences (starting with tails or heads)."""
+        return [[(start + i) % 2 for i in range(self.length)] for start in (0, 1)]
     
     def get_theoretical_ev(self) -> float:
         """
         Calculate theoretical expected value for alternating pattern.
-        This is more complex and depends on the specific length.
+        Either alternating sequence completes the pattern and the two overlap,
+        so the value is solved exactly from the pattern's Markov chain.
         """
-        # Simplified calculation - actual calculation is more complex
-        return 2**self.length
+        return self.exact_ev
     
     def get_description(self) -> str:
         """Get description of the pattern."""
@@ -148,29 +362,151 @@ class CustomPattern(Pattern):
         self.sequence = sequence
         self.description = description or f"Custom sequence: {sequence}"
     
-    def check_pattern(self, flips: List[int]) -> Tuple[bool, Optional[int]]:
-        """Check for custom pattern in flip sequence."""
-        if len(flips) < len(self.sequence):
-            return False, None
-        
-        for i in range(len(flips) - len(self.sequence) + 1):
-            if flips[i:i + len(self.sequence)] == self.sequence:
-                return True, i
-        
-        return False, None
+    def get_sequences(self) -> List[List[int]]:
+        """Get the custom sequence."""
+        return [list(self.sequence)]
     
     def get_theoretical_ev(self) -> float:
         """
         Calculate theoretical expected value for custom pattern.
-        For a specific sequence of length n, EV ≈ 2^n (simplified)
+        Self-overlaps make this differ from 2^n (e.g. HTH is 10, not 8), so it
+        is solved exactly from the pattern's Markov chain.
         """
-        return 2**len(self.sequence)
+        return self.exact_ev
     
     def get_description(self) -> str:
         """Get description of the pattern."""
         return self.description
 
 
+class PatternSet(Pattern):
+    """
+    Several patterns watched on the same flips (e.g. Penney's game).
+    
+    All targets are compiled into one Aho-Corasick automaton, so each flip is
+    checked against every target in O(1). In "race" mode a session completes
+    when the first target hits; in "census" mode it continues until every
+    target has hit (the automaton then also tracks which targets were seen).
+    Targets may have different lengths; a match's position is that of the
+    longest target ending on the completing flip.
+    """
+    
+    def __init__(self, patterns: Dict[str, Pattern], mode: str = "race"):
+        """
+        Initialize pattern set.
+        
+        Args:
+            patterns: Targets by name (at most 16 targets)
+            mode: One of PATTERN_SET_MODES
+            
+        Raises:
+            ValueError: If the mode or number of targets is invalid, or the
+                automaton for the mode has more than MAX_AUTOMATON_STATES states
+        """
+        if mode not in PATTERN_SET_MODES:
+            raise ValueError(f"Unknown pattern set mode: {mode}")
+        if not 2 <= len(patterns) <= 16:
+            raise ValueError("A pattern set needs between 2 and 16 patterns")
+        
+        self.patterns = dict(patterns)
+        self.mode = mode
+        self.target_names = list(patterns)
+        # Every sequence of one target has the same length
+        self.target_lengths = [len(pattern.get_sequences()[0])
+                               for pattern in self.patterns.values()]
+        self.match_length = max(self.target_lengths)
+        self._transitions, self._outputs = PatternAutomaton.build_outputs(
+            [pattern.get_sequences() for pattern in self.patterns.values()]
+        )
+        if len(self._transitions) > MAX_AUTOMATON_STATES:
+            raise ValueError(f"Pattern set needs {len(self._transitions)} automaton states "
+                             f"(at most {MAX_AUTOMATON_STATES})")
+        
+        self._match_lengths = [self._longest_target(mask) for mask in self._outputs]
+        self.race_automaton = PatternAutomaton(self._transitions,
+                                               [bool(mask) for mask in self._outputs],
+                                               self.match_length, self._match_lengths)
+        if mode == "race":
+            self.automaton = self.race_automaton
+            self.hit_masks = list(self._outputs)
+        else:
+            self.automaton, self.hit_masks = self._build_census()
+    
+    def _longest_target(self, mask: int) -> int:
+        """Length of the longest target in a bitmask of targets (0 if empty)."""
+        return max((length for target, length in enumerate(self.target_lengths)
+                    if mask >> target & 1), default=0)
+    
+    def _build_census(self) -> Tuple[PatternAutomaton, List[int]]:
+        """
+        Build the census automaton: the Aho-Corasick state times the set of
+        targets seen so far.
+        
+        Returns:
+            Tuple of (automaton, hit mask per state)
+            
+        Raises:
+            ValueError: If it has more than MAX_AUTOMATON_STATES states
+        """
+        everything = (1 << len(self.patterns)) - 1
+        index = {(0, 0): 0}
+        order = [(0, 0)]
+        transitions = []
+        for state, seen in order:
+            row = []
+            for flip in (0, 1):
+                target = self._transitions[state][flip]
+                key = (target, seen | self._outputs[target])
+                if key not in index:
+                    if len(order) == MAX_AUTOMATON_STATES:
+                        raise ValueError(f"Census of these patterns needs more than "
+                                         f"{MAX_AUTOMATON_STATES} automaton states")
+                    index[key] = len(order)
+                    order.append(key)
+                row.append(index[key])
+            transitions.append(tuple(row))
+        
+        accepting = [seen == everything for _, seen in order]
+        # The longest target ending on the completing flip is always newly seen
+        match_lengths = [self._match_lengths[state] if accept else 0
+                         for (state, _), accept in zip(order, accepting)]
+        automaton = PatternAutomaton(transitions, accepting, self.match_length, match_lengths)
+        return automaton, [self._outputs[state] for state, _ in order]
+    
+    def get_sequences(self) -> List[List[int]]:
+        """Get the sequences of every target (lengths may differ between targets)."""
+        return [sequence for pattern in self.patterns.values()
+                for sequence in pattern.get_sequences()]
+    
+    def cache_key(self) -> Tuple:
+        """Key including the mode and which sequences belong to which target."""
+        return (self.mode,) + tuple(pattern.cache_key() for pattern in self.patterns.values())
+    
+    def get_theoretical_ev(self) -> float:
+        """
+        Exact expected flips until the session completes: the first hit of
+        any target in race mode, the last first-hit in census mode.
+        """
+        return self.exact_ev
+    
+    def get_theoretical_win_probabilities(self) -> Dict[str, float]:
+        """Exact probability of each target hitting first (without a flip limit)."""
+        return dict(self._win_probabilities)
+    
+    @cached_property
+    def _win_probabilities(self) -> Dict[str, float]:
+        probabilities = win_probabilities(self.race_automaton, self._outputs,
+                                          len(self.patterns))
+        return {name: probability
+                for name, probability in zip(self.target_names, probabilities)}
+    
+    def get_description(self) -> str:
+        """Get description of the pattern set."""
+        joiner = " vs " if self.mode == "race" else ", "
+        descriptions = joiner.join(pattern.get_description() for pattern in self.patterns.values())
+        return f"{self.mode.capitalize()}: {descriptions}"
+
+
 # Predefined pattern configurations
 PATTERN_CONFIGS = {
     "2_consecutive_tails": ConsecutiveTails(2),
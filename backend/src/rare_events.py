@@ -0,0 +1,283 @@
+"""
+Rare-event estimation by importance sampling.
+Sessions flip a coin tilted towards progress through the pattern automaton and
+carry likelihood-ratio weights, so long patterns that almost never complete
+within max_flips can still be estimated precisely. The tilt per automaton state
+is tuned with the multilevel cross-entropy method.
+"""
+
+from collections import deque
+from typing import Any, Dict, Optional
+import math
+import time
+import numpy as np
+from src.patterns import Pattern
+
+# Cross-entropy tuning: pilot size, iterations, elite fraction and smoothing
+DEFAULT_PILOT_SESSIONS = 1000
+DEFAULT_CE_ITERATIONS = 6
+ELITE_FRACTION = 0.1
+CE_SMOOTHING = 0.7
+
+# Tilt probabilities are kept away from 0 and 1 so weights stay bounded
+MIN_TILT = 0.01
+MAX_TILT = 0.99
+
+# Sessions sampled between deadline checks of the estimation run
+CHUNK_SESSIONS = 1000
+
+
+class TiltedSampler:
+    """Vectorized sessions whose flips are tilted per automaton state."""
+
+    def __init__(self, pattern: Pattern, max_flips: int):
+        """
+        Initialize sampler.
+
+        Args:
+            pattern: Pattern to detect
+            max_flips: Maximum number of flips per session
+        """
+        automaton = pattern.automaton
+        self.max_flips = max_flips
+        self.transitions = np.asarray(automaton.transitions, dtype=np.int64)
+        self.accepting = np.asarray(automaton.accepting, dtype=bool)
+        num_states = automaton.num_states
+
+        # Fewest flips from each state to a match (reverse BFS from accepting states)
+        distance = np.full(num_states, num_states, dtype=np.int64)
+        predecessors = [[] for _ in range(num_states)]
+        for state, targets in enumerate(automaton.transitions):
+            for target in targets:
+                predecessors[target].append(state)
+        queue = deque(np.flatnonzero(self.accepting).tolist())
+        distance[self.accepting] = 0
+        while queue:
+            state = queue.popleft()
+            for previous in predecessors[state]:
+                if distance[previous] > distance[state] + 1:
+                    distance[previous] = distance[state] + 1
+                    queue.append(previous)
+        self.progress = automaton.match_length - distance
+
+        # The one flip that gets closer to a match, or -1 if both or neither do
+        closer = distance[self.transitions] < distance[:, None]
+        self.forward = np.where(closer[:, 0] & ~closer[:, 1], 0,
+                                np.where(closer[:, 1] & ~closer[:, 0], 1, -1))
+        self.num_states = num_states
+
+    def initial_tilt(self) -> np.ndarray:
+        """Probability of taking the forward flip in each state, untilted."""
+        return np.full(self.num_states, 0.5)
+
+    def sample(self, tilt: np.ndarray, num_sessions: int, rng: np.random.Generator,
+               track_moves: bool = False,
+               deadline: Optional[float] = None) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Run sessions to completion under a tilt.
+
+        Args:
+            tilt: Probability of the forward flip per state
+            num_sessions: Number of sessions
+            rng: Random generator
+            track_moves: Also count, per session and state, tiltable visits and
+                forward moves (needed for cross-entropy updates)
+            deadline: Optional time.time() value after which to give up
+
+        Returns:
+            Dictionary of per-session arrays: found, flips_count, log_weight,
+            max_progress and, with track_moves, visits and forward_moves;
+            None if the deadline passed first
+        """
+        states = np.zeros(num_sessions, dtype=np.int64)
+        flips_count = np.zeros(num_sessions, dtype=np.int64)
+        found = np.zeros(num_sessions, dtype=bool)
+        log_weight = np.zeros(num_sessions)
+        max_progress = np.zeros(num_sessions, dtype=np.int64)
+        if track_moves:
+            visits = np.zeros((num_sessions, self.num_states), dtype=np.int32)
+            forward_moves = np.zeros((num_sessions, self.num_states), dtype=np.int32)
+
+        # Probability of heads per state, and the log-weight of each outcome
+        heads_probability = np.where(self.forward == 1, tilt,
+                                     np.where(self.forward == 0, 1 - tilt, 0.5))
+        log_weight_heads = np.log(0.5 / heads_probability)
+        log_weight_tails = np.log(0.5 / (1 - heads_probability))
+        tiltable_states = self.forward >= 0
+
+        active = np.arange(num_sessions)
+        while active.size:
+            if deadline is not None and time.time() >= deadline:
+                return None
+            current = states[active]
+            flips = rng.random(active.size) < heads_probability[current]
+            log_weight[active] += np.where(flips, log_weight_heads[current],
+                                           log_weight_tails[current])
+            if track_moves:
+                tiltable = tiltable_states[current]
+                visits[active, current] += tiltable
+                forward_moves[active, current] += tiltable & (flips == self.forward[current])
+
+            next_states = self.transitions[current, flips.astype(np.int64)]
+            states[active] = next_states
+            counts = flips_count[active] + 1
+            flips_count[active] = counts
+            max_progress[active] = np.maximum(max_progress[active], self.progress[next_states])
+            hit = self.accepting[next_states]
+            found[active] = hit
+            active = active[~(hit | (counts >= self.max_flips))]
+
+        result = {
+            "found": found,
+            "flips_count": flips_count,
+            "log_weight": log_weight,
+            "max_progress": max_progress,
+        }
+        if track_moves:
+            result["visits"] = visits
+            result["forward_moves"] = forward_moves
+        return result
+
+    def tune_tilt(self, rng: np.random.Generator, pilot_sessions: int = DEFAULT_PILOT_SESSIONS,
+                  iterations: int = DEFAULT_CE_ITERATIONS,
+                  deadline: Optional[float] = None) -> np.ndarray:
+        """
+        Tune the tilt with the multilevel cross-entropy method.
+
+        Each iteration keeps the sessions that progressed furthest through
+        the pattern (at least the ELITE_FRACTION quantile, or every match
+        once enough sessions match) and refits each state's forward
+        probability to their weighted move frequencies. Tuning ends early,
+        with the tilt reached so far, once deadline (a time.time() value)
+        has passed.
+        """
+        tilt = self.initial_tilt()
+        target = int(self.progress.max())
+        for _ in range(iterations):
+            pilot = self.sample(tilt, pilot_sessions, rng, track_moves=True, deadline=deadline)
+            if pilot is None:
+                break
+            level = min(int(np.quantile(pilot["max_progress"], 1 - ELITE_FRACTION)), target)
+            elite = pilot["max_progress"] >= level
+            # Weights are relative to the untilted coin; rescale to avoid underflow
+            log_weight = pilot["log_weight"][elite]
+            weights = np.exp(log_weight - log_weight.max())
+
+            visits = weights @ pilot["visits"][elite]
+            forward_moves = weights @ pilot["forward_moves"][elite]
+            fitted = np.divide(forward_moves, visits, out=tilt.copy(), where=visits > 0)
+            tilt = np.clip(CE_SMOOTHING * fitted + (1 - CE_SMOOTHING) * tilt, MIN_TILT, MAX_TILT)
+        return tilt
+
+
+def estimate_rare_event(pattern: Pattern, num_sessions: int, max_flips: int,
+                        seed: Optional[int] = None,
+                        pilot_sessions: int = DEFAULT_PILOT_SESSIONS,
+                        ce_iterations: int = DEFAULT_CE_ITERATIONS,
+                        deadline: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Estimate the hit probability and waiting time of a pattern by importance sampling.
+
+    With weights W (likelihood ratio of the fair coin to the tilted one), the
+    estimators are P(hit) = E[W 1{hit}], E[T | hit] = E[W T 1{hit}] / P(hit)
+    (a ratio estimator, consistent with O(1/n) bias) and the mean flips of all
+    sessions E[min(T, max_flips)] = E[W min(T, max_flips)].
+
+    Variance-reduction factors compare per-session variances with those of
+    plain simulation, derived from the same estimates; the work-normalized
+    factors also account for the different number of flips per session
+    (excluding the tuning runs).
+
+    Sessions are sampled in chunks of CHUNK_SESSIONS. Once the deadline has
+    passed, tuning keeps the tilt reached so far and the unfinished chunk is
+    dropped; the estimates use the sessions of the chunks that finished,
+    which keeps them unbiased (all zero if none did), and "timed_out" is set.
+
+    Args:
+        pattern: Pattern to detect
+        num_sessions: Sessions in the final (estimation) run
+        max_flips: Maximum flips per session
+        seed: Seed for reproducible results
+        pilot_sessions: Sessions per cross-entropy tuning iteration
+        ce_iterations: Number of tuning iterations
+        deadline: Optional time.time() value after which to stop early
+
+    Returns:
+        Dictionary of estimates, standard errors and variance-reduction factors
+    """
+    rng = np.random.default_rng(seed)
+    sampler = TiltedSampler(pattern, max_flips)
+    tilt = sampler.tune_tilt(rng, pilot_sessions, ce_iterations, deadline)
+    chunks = []
+    sampled = 0
+    while sampled < num_sessions:
+        chunk = sampler.sample(tilt, min(CHUNK_SESSIONS, num_sessions - sampled), rng,
+                               deadline=deadline)
+        if chunk is None:
+            break
+        chunks.append(chunk)
+        sampled += len(chunk["found"])
+    timed_out = sampled < num_sessions
+    num_sessions = sampled
+    if not chunks:
+        chunks.append(sampler.sample(tilt, 0, rng))
+    run = {key: np.concatenate([chunk[key] for chunk in chunks]) for key in chunks[0]}
+
+    weights = np.exp(run["log_weight"])
+    flips = run["flips_count"].astype(float)
+    hit_weights = weights * run["found"]
+
+    def mean(values: np.ndarray) -> float:
+        return float(values.mean()) if values.size else 0.0
+
+    hit_probability = mean(hit_weights)
+    hit_variance = float(hit_weights.var(ddof=1)) if num_sessions > 1 else 0.0
+    flips_all_samples = weights * flips
+    mean_flips_all = mean(flips_all_samples)
+
+    if hit_probability > 0:
+        ev = mean(hit_weights * flips) / hit_probability
+        # Delta method for the ratio estimator
+        residuals = hit_weights * (flips - ev)
+        ev_variance = float(residuals.var(ddof=1)) / hit_probability ** 2 if num_sessions > 1 else 0.0
+        conditional_variance = max(
+            0.0, mean(hit_weights * flips * flips) / hit_probability - ev ** 2
+        )
+    else:
+        ev = 0.0
+        ev_variance = 0.0
+        conditional_variance = 0.0
+
+    # Per-session variances of plain simulation, for comparison
+    naive_hit_variance = hit_probability * (1 - hit_probability)
+    naive_ev_variance = conditional_variance / hit_probability if hit_probability > 0 else 0.0
+    work_ratio = mean_flips_all / mean(flips) if flips.size else 0.0
+
+    def factor(naive: float, tilted: float) -> Optional[float]:
+        return naive / tilted if tilted > 0 else None
+
+    hit_factor = factor(naive_hit_variance, hit_variance)
+    ev_factor = factor(naive_ev_variance, ev_variance)
+    return {
+        "method": "importance_sampling",
+        "sessions": num_sessions,
+        "timed_out": timed_out,
+        "pilot_sessions": pilot_sessions * ce_iterations,
+        "flips_used": int(run["flips_count"].sum()),
+        "tilt": tilt.tolist(),
+        "pattern_success_rate": hit_probability,
+        "pattern_success_rate_standard_error": math.sqrt(hit_variance / max(1, num_sessions)),
+        "actual_ev": ev,
+        "actual_ev_standard_error": math.sqrt(ev_variance / max(1, num_sessions)),
+        "average_flips_all": mean_flips_all,
+        "average_flips_all_standard_error": math.sqrt(
+            float(flips_all_samples.var(ddof=1)) / num_sessions) if num_sessions > 1 else 0.0,
+        "effective_sample_size": float(hit_weights.sum() ** 2 / (hit_weights ** 2).sum())
+        if hit_probability > 0 else 0.0,
+        "variance_reduction_factor": {
+            "pattern_success_rate": hit_factor,
+            "actual_ev": ev_factor,
+            "pattern_success_rate_per_flip": hit_factor * work_ratio if hit_factor else None,
+            "actual_ev_per_flip": ev_factor * work_ratio if ev_factor else None,
+        },
+    }
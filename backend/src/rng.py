@@ -0,0 +1,113 @@
+"""
+Counter-based coin flip generation.
+Flip i of session s under seed k is a pure function of (k, s, i): flips come
+in 64-flip blocks, each the SplitMix64 output for (session key, block index).
+Any session can be replayed on demand, and results do not depend on how
+sessions are split across engines, threads or processes.
+"""
+
+import random
+import numpy as np
+from src.history import FlipHistory
+
+MASK64 = (1 << 64) - 1
+GOLDEN_GAMMA = 0x9E3779B97F4A7C15
+
+# Flips per generated block
+BLOCK_BITS = 64
+
+
+def random_seed() -> int:
+    """Draw a fresh 64-bit seed for runs that were not given one."""
+    return random.getrandbits(64)
+
+
+def is_valid_seed(seed) -> bool:
+    """Whether seed is usable as a run seed: an integer from 0 to MASK64."""
+    return isinstance(seed, int) and not isinstance(seed, bool) and 0 <= seed <= MASK64
+
+
+def mix64(x: int) -> int:
+    """SplitMix64 output function (a bijection on 64-bit integers)."""
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK64
+    return x ^ (x >> 31)
+
+
+def session_key(seed: int, session_id: int) -> int:
+    """Key of one session's flip stream."""
+    return mix64((mix64(seed & MASK64) + (session_id + 1) * GOLDEN_GAMMA) & MASK64)
+
+
+def flip_block(key: int, block: int) -> int:
+    """Flips block * BLOCK_BITS .. + BLOCK_BITS - 1 of a stream, bit i = i-th flip."""
+    return mix64((key + (block + 1) * GOLDEN_GAMMA) & MASK64)
+
+
+def _mix64_array(x: np.ndarray) -> np.ndarray:
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def session_keys(seed: int, session_ids: np.ndarray) -> np.ndarray:
+    """Vectorized session_key over an array of session IDs (uint64 arithmetic wraps)."""
+    counters = session_ids.astype(np.uint64) + np.uint64(1)
+    return _mix64_array(np.uint64(mix64(seed & MASK64)) + counters * np.uint64(GOLDEN_GAMMA))
+
+
+def flip_blocks(keys: np.ndarray, blocks: np.ndarray) -> np.ndarray:
+    """Vectorized flip_block over arrays of session keys and block indices."""
+    counters = blocks.astype(np.uint64) + np.uint64(1)
+    return _mix64_array(keys + counters * np.uint64(GOLDEN_GAMMA))
+
+
+class FlipStream:
+    """The flip sequence of one session, generated on demand."""
+
+    __slots__ = ("seed", "session_id", "_key", "_block", "_word")
+
+    def __init__(self, seed: int, session_id: int):
+        """
+        Initialize stream.
+
+        Args:
+            seed: Run seed
+            session_id: Session whose flips this stream produces
+        """
+        self.seed = seed
+        self.session_id = session_id
+        self._key = session_key(seed, session_id)
+        self._block = -1
+        self._word = 0
+
+    def flip(self, index: int) -> int:
+        """Get flip number index (0=tails, 1=heads)."""
+        block = index >> 6
+        if block != self._block:
+            self._word = flip_block(self._key, block)
+            self._block = block
+        return (self._word >> (index & 63)) & 1
+
+    def bits(self, start: int, count: int) -> int:
+        """Get count flips from index start, packed with bit i = flip start + i."""
+        word = 0
+        filled = 0
+        while filled < count:
+            index = start + filled
+            offset = index & 63
+            take = min(BLOCK_BITS - offset, count - filled)
+            chunk = flip_block(self._key, index >> 6) >> offset
+            word |= (chunk & ((1 << take) - 1)) << filled
+            filled += take
+        return word
+
+    def history(self, count: int, start: int = 0) -> FlipHistory:
+        """Regenerate flips start .. start + count - 1 as a FlipHistory."""
+        history = FlipHistory()
+        history.extend_bits(self.bits(start, count), count)
+        return history
+
+    def to_string(self, count: int, start: int = 0) -> str:
+        """Regenerate count flips as a string of "H"/"T" characters."""
+        return self.history(count, start).to_string()
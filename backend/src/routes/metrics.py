@@ -0,0 +1,57 @@
+"""
+Metrics routes: Prometheus scrape endpoint and runtime switch.
+"""
+
+from flask import Blueprint, Response, g, request, jsonify
+from src.metrics import registry, request_duration
+
+metrics_bp = Blueprint('metrics', __name__)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def start_request_timer():
+    """Note when a request started (registered app-wide with app.before_request)."""
+    g.request_started = registry.start()
+
+
+def record_request_latency(response):
+    """Record a request's latency by route, method and status (app.after_request)."""
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    request_duration.observe_since(g.get('request_started'), route, request.method,
+                                   str(response.status_code))
+    return response
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Render every metric in the Prometheus text format."""
+    try:
+        return Response(registry.render(), mimetype=None, content_type=PROMETHEUS_CONTENT_TYPE)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@metrics_bp.route('/api/metrics/config', methods=['GET', 'POST'])
+def configure_metrics():
+    """
+    Get or change the instrumentation settings.
+    
+    POST {"enabled": false} stops recording (instrumented paths then skip
+    all timing); {"payload_bytes": true} also measures JSON Socket.IO payloads
+    (binary frames are always measured); {"reset": true} drops the samples
+    recorded so far.
+    """
+    try:
+        if request.method == 'POST':
+            data = request.get_json() or {}
+            if 'enabled' in data:
+                registry.set_enabled(bool(data['enabled']))
+            if 'payload_bytes' in data:
+                registry.set_payload_bytes(bool(data['payload_bytes']))
+            if data.get('reset'):
+                registry.reset()
+        return jsonify({'enabled': registry.enabled,
+                        'payload_bytes': registry.payload_bytes}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,94 @@
+"""
+Run history routes: stored results of finished runs and pooled estimates.
+"""
+
+from datetime import datetime, timezone
+from flask import Blueprint, request, jsonify
+from src.pattern_dsl import resolve_pattern
+from src.run_history import RUN_KINDS, best_estimates, get_run, list_runs, pattern_key
+
+runs_bp = Blueprint('runs', __name__)
+
+# Page sizes of the run listing
+DEFAULT_RUNS_PAGE_SIZE = 20
+MAX_RUNS_PAGE_SIZE = 100
+
+
+def _pattern_arg():
+    """Pattern key for the pattern query parameter (a name, expression or key)."""
+    pattern = request.args.get('pattern')
+    if pattern is None:
+        return None
+    try:
+        return pattern_key(resolve_pattern(pattern))
+    except ValueError:
+        # Not a pattern name or expression, e.g. a pattern set key such as "race:HTH,THT"
+        return pattern
+
+
+@runs_bp.route('/runs', methods=['GET'])
+def get_runs():
+    """
+    List stored runs, newest first.
+
+    Query parameters: page, per_page, pattern (name, expression or pattern
+    key), kind (live, parallel, adaptive or batch), min_sessions and since
+    (ISO 8601 date or time).
+    """
+    try:
+        try:
+            page = max(1, int(request.args.get('page', 1)))
+            per_page = min(max(1, int(request.args.get('per_page', DEFAULT_RUNS_PAGE_SIZE))),
+                           MAX_RUNS_PAGE_SIZE)
+            min_sessions = request.args.get('min_sessions', type=int)
+            since = request.args.get('since')
+            if since is not None:
+                since = datetime.fromisoformat(since.replace('Z', '+00:00'))
+                if since.tzinfo is not None:
+                    since = since.astimezone(timezone.utc).replace(tzinfo=None)
+        except ValueError:
+            return jsonify({'error': 'Invalid page, per_page or since'}), 400
+        kind = request.args.get('kind')
+        if kind is not None and kind not in RUN_KINDS:
+            return jsonify({'error': f'kind must be one of {", ".join(RUN_KINDS)}'}), 400
+
+        return jsonify(list_runs(page, per_page, _pattern_arg(), kind, min_sessions, since)), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@runs_bp.route('/runs/<int:summary_id>', methods=['GET'])
+def get_stored_run(summary_id):
+    """Get one stored run with its waiting-time histogram (?bins= buckets)."""
+    try:
+        run = get_run(summary_id, max(1, request.args.get('bins', 50, type=int)))
+        if run is None:
+            return jsonify({'error': 'Unknown run'}), 404
+        return jsonify(run), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@runs_bp.route('/runs/estimates', methods=['GET'])
+def get_best_estimates():
+    """
+    Best estimate of the expected flips per pattern and flip limit, pooled
+    over every complete stored run.
+
+    With ?pattern=, return that pattern's estimate for ?max_flips_per_session=
+    (default: the largest stored limit, the least truncated estimate).
+    """
+    try:
+        estimates = best_estimates()
+        key = _pattern_arg()
+        if key is None:
+            return jsonify([estimates[group] for group in sorted(estimates)]), 200
+        limits = [max_flips for pattern, max_flips in estimates if pattern == key]
+        max_flips = request.args.get('max_flips_per_session', type=int)
+        if max_flips is None and limits:
+            max_flips = max(limits)
+        if max_flips not in limits:
+            return jsonify({'error': 'No complete runs of this pattern'}), 404
+        return jsonify(estimates[(key, max_flips)]), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
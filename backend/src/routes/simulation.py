@@ -2,17 +2,135 @@
 API routes for coin flip simulation - Fixed SocketIO handling
 """
 
-from flask import Blueprint, request, jsonify
-from flask_socketio import emit
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from flask_socketio import emit, join_room, leave_room
+from itertools import islice
+import json
 import threading
 import time
-from src.simulation import simulator
+from src.broadcast import UpdateCoalescer, json_payload
+from src.checkpoints import CheckpointManager, CheckpointStore
+from src.metrics import (active_sessions, completed_sessions, connected_clients, emit_bytes,
+                         emit_duration, registry as metrics_registry)
+from src.rng import MASK64, is_valid_seed
+from src.run_history import record_run, record_simulator_run
+from src.runs import RunRegistry, RunScheduler, new_run_id
+from src.parallel import MAX_WORKERS, SHARD_ENGINE
+from src.simulation import MAX_FLIPS_PER_SESSION, simulator
+from src.subscriptions import parse_subscription
 
 simulation_bp = Blueprint('simulation', __name__)
 
+# Session listing: page sizes and the fields returned when fields= is omitted
+DEFAULT_SESSIONS_PAGE_SIZE = 100
+MAX_SESSIONS_PAGE_SIZE = 1000
+DEFAULT_SESSION_FIELDS = ('session_id', 'flips_count', 'completed', 'pattern_found',
+                          'pattern_position', 'stopped_reason')
+
+# Limits for headless batch runs
+MAX_BATCH_SESSIONS = 1000000
+MAX_RARE_EVENT_SESSIONS = 100000
+MAX_RARE_EVENT_FLIPS = 100000
+
+INVALID_SEED = f'seed must be an integer between 0 and {MASK64}'
+DEFAULT_BATCH_TIMEOUT = 10.0
+MAX_BATCH_TIMEOUT = 60.0
+
+# Points per downsampled chart series
+DEFAULT_HISTORY_POINTS = 500
+MAX_HISTORY_POINTS = 5000
+
 # Global SocketIO instance (will be set by main.py)
 _socketio = None
 
+# Per-run Socket.IO rooms. Every client watching a run is in ALL_ROOM plus the
+# room for the simulation_update format it picked on connect (connect with
+# ?format=binary to receive compact simulation_frame messages).
+ALL_ROOM = 'all'
+JSON_UPDATES_ROOM = 'updates_json'
+BINARY_UPDATES_ROOM = 'updates_binary'
+
+# Fixed rate at which coalesced updates are pushed to clients
+BROADCAST_INTERVAL = 0.1  # 100ms frames
+STATS_UPDATE_INTERVAL = 0.5  # 500ms for statistics
+
+def _on_run_evicted(run):
+    """Registry callback: an evicted run can no longer be restored, so drop its checkpoint."""
+    _checkpoints.discard(run.run_id)
+
+
+# Run registry: the global simulator is the default run used when no run_id is given
+_runs = RunRegistry(simulator, on_evict=_on_run_evicted)
+
+# Client sid -> (run_id, update format) of the run it is watching
+_clients = {}
+
+
+def _join_run(run, update_format):
+    """Put the current Socket.IO client in a run's rooms."""
+    join_room(run.room(ALL_ROOM))
+    if update_format == 'binary':
+        join_room(run.room(BINARY_UPDATES_ROOM))
+        run.binary_clients.add(request.sid)
+    else:
+        join_room(run.room(JSON_UPDATES_ROOM))
+        run.json_clients.add(request.sid)
+    _clients[request.sid] = (run.run_id, update_format)
+
+
+def _leave_run():
+    """Remove the current Socket.IO client from the rooms of the run it watches."""
+    run_id, _ = _clients.pop(request.sid, (None, None))
+    run = _runs.get(run_id) if run_id is not None else None
+    if run is None:
+        return
+    room = run.subscriptions.unsubscribe(request.sid)
+    if room is not None:
+        leave_room(room)
+    for name in (ALL_ROOM, JSON_UPDATES_ROOM, BINARY_UPDATES_ROOM):
+        leave_room(run.room(name))
+    run.binary_clients.discard(request.sid)
+    run.json_clients.discard(request.sid)
+
+
+def _client_run():
+    """Run watched by the current Socket.IO client."""
+    run_id, _ = _clients.get(request.sid, (None, None))
+    return _runs.get(run_id)
+
+
+def _collect_metrics():
+    """Refresh the client and session gauges from live state at scrape time."""
+    connected_clients.set(len(_clients))
+    active, completed = {}, {}
+    for run in _runs.list_runs():
+        stats = run.simulator.get_statistics()
+        completed[(run.run_id,)] = stats.get('completed_sessions', 0)
+        active[(run.run_id,)] = stats.get('total_sessions', 0) - stats.get('completed_sessions', 0)
+    active_sessions.replace(active)
+    completed_sessions.replace(completed)
+
+
+metrics_registry.add_collector(_collect_metrics)
+
+
+def _emit(event, payload, room):
+    """
+    Emit to a room, recording emit time when metrics are enabled.
+    
+    The size of binary frames is recorded too; JSON payloads are only sized
+    (by serializing them again) when payload_bytes is switched on.
+    """
+    started = metrics_registry.start()
+    _socketio.emit(event, payload, to=room)
+    if started is not None:
+        emit_duration.observe_since(started, event)
+        if isinstance(payload, (bytes, bytearray)):
+            emit_bytes.observe(len(payload), event)
+        elif metrics_registry.payload_bytes:
+            emit_bytes.observe(len(json.dumps(payload)), event)
+
+
 def register_socketio_events(socketio_instance):
     """Register SocketIO events with the provided instance."""
     global _socketio
@@ -21,17 +139,90 @@ def register_socketio_events(socketio_instance):
     @socketio_instance.on('connect')
     def handle_connect():
         print('Client connected')
-        emit('status', {'message': 'Connected to simulation server'})
+        update_format = 'binary' if request.args.get('format') == 'binary' else 'json'
+        run = _runs.get(request.args.get('run_id')) or _runs.get()
+        _join_run(run, update_format)
+        emit('status', {'message': 'Connected to simulation server', 'format': update_format,
+                        'run_id': run.run_id})
     
     @socketio_instance.on('disconnect')
     def handle_disconnect():
         print('Client disconnected')
+        _leave_run()
+    
+    @socketio_instance.on('join_run')
+    def handle_join_run(data):
+        """Switch to watching another run."""
+        data = data or {}
+        run = _runs.get(data.get('run_id'))
+        if run is None:
+            emit('error', {'message': 'Unknown run'})
+            return
+        _leave_run()
+        _join_run(run, 'binary' if data.get('format') == 'binary' else 'json')
+        emit('joined_run', {'run_id': run.run_id})
+    
+    @socketio_instance.on('subscribe')
+    def handle_subscribe(data):
+        """Only receive updates for a session range or completion filter."""
+        spec = parse_subscription(data or {})
+        run = _client_run()
+        if spec is None or run is None:
+            emit('error', {'message': 'Invalid subscription'})
+            return
+        
+        was_subscribed = run.subscriptions.is_subscribed(request.sid)
+        previous_room, room = run.subscriptions.subscribe(request.sid, spec)
+        if previous_room is not None and previous_room != room:
+            leave_room(previous_room)
+        if not was_subscribed:
+            leave_room(run.room(JSON_UPDATES_ROOM))
+            leave_room(run.room(BINARY_UPDATES_ROOM))
+            run.binary_clients.discard(request.sid)
+            run.json_clients.discard(request.sid)
+        join_room(room)
+        emit('subscribed', {'subscription': room})
+    
+    @socketio_instance.on('unsubscribe')
+    def handle_unsubscribe(data=None):
+        """Go back to receiving every session update."""
+        run = _client_run()
+        if run is None:
+            return
+        room = run.subscriptions.unsubscribe(request.sid)
+        if room is not None:
+            leave_room(room)
+        update_format = 'binary' if (data or {}).get('format') == 'binary' else 'json'
+        _join_run(run, update_format)
+        emit('unsubscribed', {})
+
+
+def _get_run():
+    """Run named by the run_id query parameter or JSON field (default run if absent)."""
+    data = request.get_json(silent=True) or {}
+    return _runs.get(request.args.get('run_id') or data.get('run_id'))
+
+
+def _unknown_run():
+    return jsonify({'success': False, 'error': 'Unknown run'}), 404
 
 
 @simulation_bp.route('/patterns', methods=['GET'])
 def get_patterns():
-    """Get all available pattern configurations."""
+    """
+    Get all available pattern configurations.
+    
+    With ?expression=, compile that ad-hoc pattern expression (e.g. "[HT]H{2}")
+    and describe it instead; its normalized form can be passed as pattern_type.
+    """
     try:
+        expression = request.args.get('expression')
+        if expression is not None:
+            pattern = simulator.describe_pattern(expression)
+            if pattern is None:
+                return jsonify({'error': 'Invalid pattern expression'}), 400
+            return jsonify(pattern), 200
+        
         patterns = simulator.get_available_patterns()
         return jsonify(patterns), 200
     except Exception as e:
@@ -43,16 +234,32 @@ def configure_simulation():
     """Configure simulation parameters."""
     try:
         data = request.get_json()
+        run = _get_run()
+        if run is None:
+            return _unknown_run()
+        simulator = run.simulator
         pattern_name = data.get('pattern_type', '2_consecutive_tails')
         num_sessions = data.get('num_sessions', 1000)
         max_flips = data.get('max_flips_per_session', 10000)
+        engine = data.get('engine', 'python')
+        workers = data.get('workers', 1)
+        ticks_per_second = data.get('ticks_per_second', 10)
+        seed = data.get('seed')
+        if seed is not None and not is_valid_seed(seed):
+            return jsonify({'success': False, 'error': INVALID_SEED}), 400
         
-        success = simulator.configure_simulation(pattern_name, num_sessions, max_flips)
+        success = simulator.configure_simulation(pattern_name, num_sessions, max_flips, engine, workers,
+                                                 ticks_per_second, seed,
+                                                 data.get('target_relative_error'),
+                                                 data.get('target_half_width'),
+                                                 data.get('max_total_flips'),
+                                                 data.get('race_patterns'),
+                                                 data.get('race_mode', 'race'))
         
         if success:
-            return jsonify({'success': True, 'message': 'Simulation configured'}), 200
+            return jsonify({'success': True, 'message': 'Simulation configured', 'run_id': run.run_id}), 200
         else:
-            return jsonify({'success': False, 'error': 'Invalid pattern name'}), 400
+            return jsonify({'success': False, 'error': 'Invalid configuration'}), 400
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -60,28 +267,72 @@ def configure_simulation():
 
 @simulation_bp.route('/simulation/start', methods=['POST'])
 def start_simulation():
-    """Start the simulation."""
+    """
+    Start the simulation.
+    
+    Starts the run named by run_id (the default run if omitted), or a new run
+    with its own simulator when "new_run" is true. The response carries the
+    run_id to pass to the other routes and to the Socket.IO join_run event.
+    """
     try:
         data = request.get_json() or {}
         
+        if data.get('new_run'):
+            run = _runs.create()
+            if run is None:
+                return jsonify({'success': False, 'error': 'Too many active runs'}), 503
+        else:
+            run = _get_run()
+            if run is None:
+                return _unknown_run()
+        simulator = run.simulator
+        
         # Configure simulation if parameters provided
-        if 'pattern_type' in data:
+        if 'pattern_type' in data or 'race_patterns' in data:
             pattern_name = data.get('pattern_type', '2_consecutive_tails')
             num_sessions = data.get('num_sessions', 1000)
             max_flips = data.get('max_flips_per_session', 10000)
+            engine = data.get('engine', 'python')
+            workers = data.get('workers', 1)
+            ticks_per_second = data.get('ticks_per_second', 10)
+            seed = data.get('seed')
+            if seed is not None and not is_valid_seed(seed):
+                return jsonify({'success': False, 'error': INVALID_SEED}), 400
             
-            config_success = simulator.configure_simulation(pattern_name, num_sessions, max_flips)
+            config_success = simulator.configure_simulation(pattern_name, num_sessions, max_flips,
+                                                            engine, workers, ticks_per_second, seed,
+                                                            data.get('target_relative_error'),
+                                                            data.get('target_half_width'),
+                                                            data.get('max_total_flips'),
+                                                            data.get('race_patterns'),
+                                                            data.get('race_mode', 'race'))
             if not config_success:
                 return jsonify({'success': False, 'error': 'Invalid configuration'}), 400
         
+        # Adaptive runs execute in growing batches until the precision target is met
+        if simulator.is_adaptive:
+            if simulator.current_pattern is None or simulator.is_running:
+                return jsonify({'success': False, 'error': 'Failed to start simulation'}), 400
+            threading.Thread(target=run_adaptive_simulation, args=(run,), daemon=True).start()
+            return jsonify({'success': True, 'message': 'Adaptive simulation started',
+                            'run_id': run.run_id}), 200
+        
+        # Multi-worker runs execute on a process pool without per-flip updates
+        if simulator.workers > 1:
+            if simulator.current_pattern is None or simulator.is_running:
+                return jsonify({'success': False, 'error': 'Failed to start simulation'}), 400
+            threading.Thread(target=run_parallel_simulation, args=(run,), daemon=True).start()
+            return jsonify({'success': True, 'message': 'Parallel simulation started',
+                            'run_id': run.run_id}), 200
+        
         # Start simulation
         success = simulator.start_simulation()
         
         if success:
-            # Start background simulation thread
+            # Hand the run to the scheduler and start its broadcaster
             if _socketio:
-                threading.Thread(target=run_simulation_with_updates, daemon=True).start()
-            return jsonify({'success': True, 'message': 'Simulation started'}), 200
+                start_run_with_updates(run)
+            return jsonify({'success': True, 'message': 'Simulation started', 'run_id': run.run_id}), 200
         else:
             return jsonify({'success': False, 'error': 'Failed to start simulation'}), 400
             
@@ -89,11 +340,108 @@ def start_simulation():
         return jsonify({'error': str(e)}), 500
 
 
+@simulation_bp.route('/simulation/batch', methods=['POST'])
+def run_batch_simulation():
+    """
+    Run sessions to completion headlessly and return aggregate results only.
+    
+    The results include the run_id the run was stored under in the run history.
+    """
+    try:
+        data = request.get_json() or {}
+        pattern_name = data.get('pattern_type', '2_consecutive_tails')
+        num_sessions = data.get('num_sessions', 1000)
+        max_flips = data.get('max_flips_per_session', 10000)
+        workers = data.get('workers', 1)
+        seed = data.get('seed')
+        bins = data.get('bins', 50)
+        try:
+            timeout = min(float(data.get('timeout', DEFAULT_BATCH_TIMEOUT)), MAX_BATCH_TIMEOUT)
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'timeout must be a positive number'}), 400
+        
+        if not 1 <= num_sessions <= MAX_BATCH_SESSIONS:
+            return jsonify({'success': False,
+                            'error': f'num_sessions must be between 1 and {MAX_BATCH_SESSIONS}'}), 400
+        if not _is_int_between(max_flips, 1, MAX_FLIPS_PER_SESSION):
+            return jsonify({'success': False, 'error': 'max_flips_per_session must be between 1 '
+                                                       f'and {MAX_FLIPS_PER_SESSION}'}), 400
+        if not _is_int_between(workers, 1, MAX_WORKERS):
+            return jsonify({'success': False,
+                            'error': f'workers must be between 1 and {MAX_WORKERS}'}), 400
+        if not timeout > 0:
+            return jsonify({'success': False, 'error': 'timeout must be a positive number'}), 400
+        if not isinstance(bins, int) or bins < 1:
+            return jsonify({'success': False, 'error': 'bins must be a positive integer'}), 400
+        if seed is not None and not is_valid_seed(seed):
+            return jsonify({'success': False, 'error': INVALID_SEED}), 400
+        
+        run_id = new_run_id()
+        
+        def store(pattern, aggregate):
+            _store_run(record_run, run_id, 'batch', pattern, aggregate, max_flips, seed,
+                       SHARD_ENGINE)
+        
+        stats = simulator.run_batch(pattern_name, num_sessions, max_flips, workers, seed, timeout, bins,
+                                    on_complete=store)
+        if stats is None:
+            return jsonify({'success': False, 'error': 'Invalid pattern name'}), 400
+        
+        stats['run_id'] = run_id
+        return jsonify(stats), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@simulation_bp.route('/simulation/rare_event', methods=['POST'])
+def run_rare_event_simulation():
+    """
+    Estimate a rare pattern by importance sampling.
+    
+    Returns the hit probability, actual_ev and mean flips with standard
+    errors and variance-reduction factors, next to a plain simulation of the
+    same flip budget (unless compare_naive is false). Both stop after timeout
+    seconds (at most MAX_BATCH_TIMEOUT), with "timed_out" set.
+    """
+    try:
+        data = request.get_json() or {}
+        pattern_name = data.get('pattern_type', '2_consecutive_tails')
+        num_sessions = data.get('num_sessions', 10000)
+        max_flips = data.get('max_flips_per_session', 10000)
+        workers = data.get('workers', 1)
+        seed = data.get('seed')
+        compare_naive = data.get('compare_naive', True)
+        timeout = min(float(data.get('timeout', DEFAULT_BATCH_TIMEOUT)), MAX_BATCH_TIMEOUT)
+        
+        if not 2 <= num_sessions <= MAX_RARE_EVENT_SESSIONS:
+            return jsonify({'success': False,
+                            'error': f'num_sessions must be between 2 and {MAX_RARE_EVENT_SESSIONS}'}), 400
+        if not 1 <= max_flips <= MAX_RARE_EVENT_FLIPS:
+            return jsonify({'success': False,
+                            'error': f'max_flips_per_session must be between 1 and {MAX_RARE_EVENT_FLIPS}'}), 400
+        if seed is not None and not is_valid_seed(seed):
+            return jsonify({'success': False, 'error': INVALID_SEED}), 400
+        
+        result = simulator.run_rare_event(pattern_name, num_sessions, max_flips, seed,
+                                          compare_naive, workers, timeout)
+        if result is None:
+            return jsonify({'success': False, 'error': 'Invalid pattern name'}), 400
+        
+        return jsonify(result), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @simulation_bp.route('/simulation/stop', methods=['POST'])
 def stop_simulation():
     """Stop the simulation."""
     try:
-        simulator.stop_simulation()
+        run = _get_run()
+        if run is None:
+            return _unknown_run()
+        run.simulator.stop_simulation()
         return jsonify({'success': True, 'message': 'Simulation stopped'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -103,7 +451,10 @@ def stop_simulation():
 def reset_simulation():
     """Reset the simulation."""
     try:
-        simulator.reset_simulation()
+        run = _get_run()
+        if run is None:
+            return _unknown_run()
+        run.simulator.reset_simulation()
         return jsonify({'success': True, 'message': 'Simulation reset'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -113,7 +464,10 @@ def reset_simulation():
 def get_simulation_status():
     """Get current simulation status."""
     try:
-        stats = simulator.get_statistics()
+        run = _get_run()
+        if run is None:
+            return _unknown_run()
+        stats = run.simulator.get_statistics()
         return jsonify(stats), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -121,71 +475,411 @@ def get_simulation_status():
 
 @simulation_bp.route('/statistics', methods=['GET'])
 def get_statistics():
-    """Get simulation statistics."""
+    """
+    Get simulation statistics.
+    
+    With a pattern_type query parameter, returns the exact theoretical
+    statistics for that pattern instead (max_flips_per_session, and
+    include_cdf=true for the waiting-time CDF), without running anything.
+    """
     try:
-        stats = simulator.get_statistics()
+        pattern_name = request.args.get('pattern_type')
+        if pattern_name is not None:
+            stats = simulator.get_theoretical_statistics(
+                pattern_name,
+                request.args.get('max_flips_per_session', 10000, type=int),
+                include_cdf=bool(_bool_arg('include_cdf'))
+            )
+            if stats is None:
+                return jsonify({'error': 'Invalid pattern or max_flips_per_session'}), 400
+            return jsonify(stats), 200
+        
+        run = _get_run()
+        if run is None:
+            return _unknown_run()
+        stats = run.simulator.get_statistics()
         return jsonify(stats), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@simulation_bp.route('/statistics/history', methods=['GET'])
+def get_statistics_history():
+    """
+    Get chart data for a run: the statistics history, survival curve and
+    waiting-time histogram, downsampled server-side.
+    
+    Query parameters: points (default 500, at most MAX_HISTORY_POINTS),
+    method (lttb or minmax), fields (comma-separated history series) and bins.
+    """
+    try:
+        run = _get_run()
+        if run is None:
+            return _unknown_run()
+        points = request.args.get('points', DEFAULT_HISTORY_POINTS, type=int)
+        bins = request.args.get('bins', 50, type=int)
+        if bins < 1:
+            return jsonify({'error': 'bins must be a positive integer'}), 400
+        fields = request.args.get('fields')
+        try:
+            history = run.simulator.get_statistics_history(
+                points=max(3, min(points, MAX_HISTORY_POINTS)),
+                method=request.args.get('method', 'lttb'),
+                fields=fields.split(',') if fields else None,
+                bins=bins
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify(history), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def _is_int_between(value, minimum, maximum):
+    """Whether a JSON value is an integer (not a bool) from minimum to maximum."""
+    return isinstance(value, int) and not isinstance(value, bool) and minimum <= value <= maximum
+
+
+def _bool_arg(name):
+    """Parse an optional true/false query parameter."""
+    value = request.args.get(name)
+    if value is None:
+        return None
+    return value.lower() in ('1', 'true', 'yes')
+
+
 @simulation_bp.route('/sessions', methods=['GET'])
 def get_sessions():
-    """Get all session data."""
+    """
+    Get session data.
+    
+    Query parameters:
+        cursor: session_id to continue after (next_cursor of the previous page)
+        limit: page size, 1 to MAX_SESSIONS_PAGE_SIZE (for ndjson: any
+            positive number of sessions; all if omitted)
+        fields: comma-separated status keys ("flips" is only sent when listed)
+        completed, pattern_found: true/false filters
+        min_flips, max_flips: inclusive flips_count range
+        format: "ndjson" streams one session per line instead of a page
+    """
     try:
-        sessions = simulator.get_all_sessions()
-        return jsonify(sessions), 200
+        run = _get_run()
+        if run is None:
+            return _unknown_run()
+        ndjson = request.args.get('format') == 'ndjson'
+        limit = request.args.get('limit', None if ndjson else DEFAULT_SESSIONS_PAGE_SIZE, type=int)
+        if limit is not None and ndjson and limit < 1:
+            return jsonify({'error': 'limit must be at least 1'}), 400
+        if limit is not None and not ndjson and not 1 <= limit <= MAX_SESSIONS_PAGE_SIZE:
+            return jsonify({'error': f'limit must be between 1 and {MAX_SESSIONS_PAGE_SIZE}'}), 400
+        fields = request.args.get('fields')
+        sessions = run.simulator.iter_sessions(
+            fields=fields.split(',') if fields else DEFAULT_SESSION_FIELDS,
+            start_after=request.args.get('cursor', type=int),
+            completed=_bool_arg('completed'),
+            pattern_found=_bool_arg('pattern_found'),
+            min_flips=request.args.get('min_flips', type=int),
+            max_flips=request.args.get('max_flips', type=int)
+        )
+        
+        if ndjson:
+            def generate():
+                for status in islice(sessions, limit):
+                    yield json.dumps(status) + '\n'
+            
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+        
+        page = list(islice(sessions, limit + 1))
+        next_cursor = page[limit - 1]['session_id'] if len(page) > limit else None
+        return jsonify({'sessions': page[:limit], 'next_cursor': next_cursor}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
-def run_simulation_with_updates():
-    """Run simulation with real-time WebSocket updates."""
-    global _socketio
+@simulation_bp.route('/sessions/active', methods=['GET'])
+def get_active_sessions():
+    """Get the IDs of sessions that are still running."""
+    try:
+        run = _get_run()
+        if run is None:
+            return _unknown_run()
+        active_ids = run.simulator.get_active_session_ids()
+        return jsonify({'count': len(active_ids), 'session_ids': active_ids}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@simulation_bp.route('/simulation/runs', methods=['GET'])
+def list_runs():
+    """List registered runs, most recently used first."""
+    try:
+        runs = [run.get_summary() for run in reversed(_runs.list_runs())]
+        return jsonify(runs), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@simulation_bp.route('/checkpoints', methods=['GET'])
+def list_checkpoints():
+    """List saved checkpoints, most recently written first."""
+    try:
+        return jsonify(_checkpoints.store.list_checkpoints()), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@simulation_bp.route('/checkpoints', methods=['POST'])
+def create_checkpoint():
+    """Checkpoint the run named by run_id (the default run if omitted) now."""
+    try:
+        run = _get_run()
+        if run is None:
+            return _unknown_run()
+        checkpoint = _checkpoints.checkpoint(run, force=True)
+        if checkpoint is None:
+            return jsonify({'success': False, 'error': 'Run has no checkpointable state'}), 400
+        return jsonify(checkpoint), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@simulation_bp.route('/checkpoints/config', methods=['GET', 'POST'])
+def configure_checkpoints():
+    """
+    Get or change the checkpoint settings.
     
-    if not _socketio:
-        return
+    POST {"interval": seconds} changes how often runs are checkpointed;
+    {"enabled": false} stops periodic checkpoints.
+    """
+    try:
+        if request.method == 'POST':
+            data = request.get_json() or {}
+            try:
+                interval = data.get('interval')
+                _checkpoints.configure(float(interval) if interval is not None else None,
+                                       bool(data['enabled']) if 'enabled' in data else None)
+            except (TypeError, ValueError) as e:
+                return jsonify({'error': str(e)}), 400
+        return jsonify({'enabled': _checkpoints.enabled, 'interval': _checkpoints.interval,
+                        'directory': _checkpoints.store.directory}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@simulation_bp.route('/checkpoints/<run_id>/restore', methods=['POST'])
+def restore_checkpoint(run_id):
+    """
+    Restore a checkpoint into the run with the same ID (created if needed).
+    
+    The run keeps stepping if it was running when checkpointed, unless
+    {"resume": false} is given.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        try:
+            run = _restore_run(run_id, data.get('resume', True))
+        except KeyError:
+            return jsonify({'success': False, 'error': 'Unknown checkpoint'}), 404
+        if run is None:
+            return jsonify({'success': False, 'error': 'Too many active runs'}), 503
+        if not run:
+            return jsonify({'success': False, 'error': 'Run is in progress or checkpoint is invalid'}), 409
+        return jsonify({'success': True, 'run': run.get_summary()}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@simulation_bp.route('/checkpoints/<run_id>', methods=['DELETE'])
+def delete_checkpoint(run_id):
+    """Delete a saved checkpoint."""
+    try:
+        try:
+            _checkpoints.store.delete(run_id)
+        except KeyError:
+            return jsonify({'success': False, 'error': 'Unknown checkpoint'}), 404
+        _checkpoints.forget(run_id)
+        return jsonify({'success': True}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def _restore_run(run_id, resume=True):
+    """
+    Load a checkpoint into its run and hand the run to the scheduler if it resumed.
     
-    update_interval = 0.1  # 100ms updates
+    Returns:
+        The run, False if the restore was refused, or None if no run slot is free
+        
+    Raises:
+        KeyError: If there is no checkpoint for run_id
+    """
+    meta, records, first_hits = _checkpoints.store.load(run_id)
+    run = _runs.get(run_id) or _runs.create(run_id)
+    if run is None:
+        return None
+    if not run.simulator.restore_checkpoint(meta, records, first_hits, resume):
+        return False
+    if run.simulator.is_running and _socketio:
+        start_run_with_updates(run)
+    return run
+
+
+def start_checkpointing():
+    """Resume every checkpointed run that was still running, then start periodic checkpoints."""
+    for checkpoint in _checkpoints.store.list_checkpoints():
+        if not checkpoint['is_running'] or not checkpoint['active_sessions']:
+            continue
+        try:
+            if _restore_run(checkpoint['run_id']):
+                print(f"Resumed run {checkpoint['run_id']} at tick {checkpoint['tick']}")
+        except Exception as e:
+            print(f"Error resuming run {checkpoint['run_id']}: {e}")
+    _checkpoints.start()
+
+
+def _on_run_step(run, step_result):
+    """Scheduler callback: queue a step for the run's broadcaster."""
+    run.coalescer.add(step_result)
+
+
+def _on_run_finish(run, error, coalescer):
+    """Scheduler callback: the run stopped, completed or failed."""
+    if error is not None:
+        print(f"Error in simulation update: {error}")
+        if _socketio:
+            _socketio.emit('error', {'message': str(error)}, to=run.room(ALL_ROOM))
+    else:
+        _store_run(record_simulator_run, run.run_id, 'live', run.simulator)
+        aggregate = run.simulator.aggregate
+        if aggregate is not None and aggregate.completed_sessions == aggregate.total_sessions:
+            # Nothing left to resume: the result is in the run history
+            _checkpoints.discard(run.run_id, run.simulator.run_number)
+    coalescer.close()
+    _runs.evict()
+
+
+def _store_run(record, *args):
+    """Write a finished run to the run history; a database error never fails the run."""
+    try:
+        record(*args)
+    except Exception as e:
+        print(f"Error storing run history: {e}")
+
+
+# Bounded pool that time-slices every live run
+_scheduler = RunScheduler(on_step=_on_run_step, on_finish=_on_run_finish)
+
+# Periodic checkpoints of every run (started by start_checkpointing)
+_checkpoints = CheckpointManager(CheckpointStore(), _runs.list_runs)
+
+
+def start_run_with_updates(run):
+    """
+    Step a started run on the scheduler at its configured speed.
+    
+    Broadcasting runs on its own thread at a fixed frame rate, so slow
+    clients never throttle the stepping loop.
+    """
+    # A broadcaster left over from a stop the scheduler has not seen yet exits here
+    run.coalescer.close()
+    run.coalescer = UpdateCoalescer()
+    threading.Thread(target=broadcast_updates, args=(run, run.coalescer), daemon=True).start()
+    _scheduler.schedule(run, run.coalescer)
+
+
+def broadcast_updates(run, coalescer):
+    """Send the newest coalesced state of a run to its clients at a fixed frame rate."""
+    simulator = run.simulator
     last_stats_update = 0
-    stats_update_interval = 0.5  # 500ms for statistics
+    last_status = None
     
-    while simulator.is_running:
+    while True:
         try:
-            # Step simulation
-            step_result = simulator.step_simulation()
+            finished = coalescer.wait_closed(BROADCAST_INTERVAL)
+            step_result = coalescer.take()
+            if step_result:
+                last_status = step_result['status']
             
-            # Send step updates
-            if step_result['updates']:
-                _socketio.emit('simulation_update', step_result)
+            # Send step updates; per-session dictionaries are only built for JSON clients
+            if step_result and step_result['updates']:
+                if run.json_clients:
+                    _emit('simulation_update', json_payload(step_result),
+                          run.room(JSON_UPDATES_ROOM))
+                if run.binary_clients:
+                    frame = simulator.encode_step_frame(step_result)
+                    _emit('simulation_frame', frame, run.room(BINARY_UPDATES_ROOM))
+            
+            # Send each viewport subscription only the data it asked for
+            for room, spec in run.subscriptions.active():
+                payload = run.subscriptions.build_payload(room, spec, step_result, simulator)
+                if payload is not None:
+                    _emit('subscription_update', payload, room)
             
             # Send statistics updates less frequently
             current_time = time.time()
-            if current_time - last_stats_update >= stats_update_interval:
+            if current_time - last_stats_update >= STATS_UPDATE_INTERVAL:
                 stats = simulator.get_statistics()
-                _socketio.emit('statistics_update', stats)
+                _emit('statistics_update', stats, run.room(ALL_ROOM))
                 last_stats_update = current_time
             
-            # Check if simulation completed
-            if step_result['status'] == 'completed':
-                final_stats = simulator.get_statistics()
-                _socketio.emit('simulation_completed', final_stats)
+            if finished:
+                # Check if simulation completed
+                if last_status == 'completed':
+                    final_stats = simulator.get_statistics()
+                    _socketio.emit('simulation_completed', final_stats, to=run.room(ALL_ROOM))
                 break
             
-            time.sleep(update_interval)
-            
         except Exception as e:
-            print(f"Error in simulation update: {e}")
-            _socketio.emit('error', {'message': str(e)})
+            print(f"Error in simulation broadcast: {e}")
+            _socketio.emit('error', {'message': str(e)}, to=run.room(ALL_ROOM))
             break
 
 
+def run_parallel_simulation(run):
+    """Run a run's configured simulation on the process pool and report the result."""
+    try:
+        final_stats = run.simulator.run_parallel()
+        _store_run(record_simulator_run, run.run_id, 'parallel', run.simulator)
+        if _socketio:
+            _socketio.emit('simulation_completed', final_stats, to=run.room(ALL_ROOM))
+    except Exception as e:
+        print(f"Error in parallel simulation: {e}")
+        if _socketio:
+            _socketio.emit('error', {'message': str(e)}, to=run.room(ALL_ROOM))
+    finally:
+        _runs.evict()
+
+
+def run_adaptive_simulation(run):
+    """Run a run's adaptive simulation, reporting statistics after every batch."""
+    def on_batch(stats):
+        if _socketio:
+            _socketio.emit('statistics_update', stats, to=run.room(ALL_ROOM))
+    
+    try:
+        final_stats = run.simulator.run_adaptive(on_batch=on_batch)
+        _store_run(record_simulator_run, run.run_id, 'adaptive', run.simulator)
+        if _socketio:
+            _socketio.emit('simulation_completed', final_stats, to=run.room(ALL_ROOM))
+    except Exception as e:
+        print(f"Error in adaptive simulation: {e}")
+        if _socketio:
+            _socketio.emit('error', {'message': str(e)}, to=run.room(ALL_ROOM))
+    finally:
+        _runs.evict()
+
+
 @simulation_bp.route('/simulation/step', methods=['POST'])
 def step_simulation():
     """Perform one step of simulation (for manual stepping)."""
     try:
-        result = simulator.step_simulation()
-        return jsonify(result), 200
+        run = _get_run()
+        if run is None:
+            return _unknown_run()
+        result = run.simulator.step_simulation(blocking=False)
+        if result['status'] == 'busy':
+            return jsonify({'error': 'Simulation is being stepped by another request'}), 409
+        return jsonify(json_payload(result)), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
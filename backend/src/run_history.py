@@ -0,0 +1,262 @@
+"""
+Persistent history of finished runs.
+Each run's final aggregates and waiting-time counts are written to the
+database in one transaction when it ends, and completed runs of the same
+pattern are pooled into a cached best estimate of its expected waiting time.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+import math
+import threading
+from sqlalchemy import func, insert, inspect, select, text
+from src.aggregates import RunAggregate, Z_95
+from src.models.run import RunHistogramBin, RunSummary
+from src.models.user import db
+from src.patterns import Pattern, PatternSet
+
+# How a run was executed
+RUN_KINDS = ("live", "parallel", "adaptive", "batch")
+
+# Application the history is written through (set by init_run_history)
+_app = None
+
+# Pooled estimates per (pattern key, max_flips_per_session), rebuilt after the next write
+_estimates_lock = threading.Lock()
+_estimates: Optional[Dict[Tuple[str, int], Dict[str, Any]]] = None
+
+
+def init_run_history(app):
+    """Bind the database to app, create missing tables and enable recording."""
+    global _app
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        _add_missing_columns()
+    _app = app
+
+
+def _add_missing_columns():
+    """Add columns introduced after a database was created (create_all skips existing tables)."""
+    columns = {column["name"] for column in inspect(db.engine).get_columns("run_summaries")}
+    if "engine" not in columns:
+        with db.engine.begin() as connection:
+            connection.execute(text("ALTER TABLE run_summaries ADD COLUMN engine VARCHAR(16)"))
+
+
+def pattern_key(pattern: Pattern) -> str:
+    """
+    Canonical name of a pattern: its sequences as "H"/"T" strings.
+
+    Equal patterns get the same key however they were given (e.g.
+    "2_consecutive_tails" and "TT" are both "TT"); pattern sets are keyed by
+    mode and targets, e.g. "race:HTH,THT".
+    """
+    if isinstance(pattern, PatternSet):
+        return f"{pattern.mode}:" + ",".join(pattern_key(pattern.patterns[name])
+                                             for name in pattern.target_names)
+    return "|".join(sorted("".join("TH"[flip] for flip in sequence)
+                           for sequence in pattern.get_sequences()))
+
+
+def record_run(run_id: str, kind: str, pattern: Pattern, aggregate: Optional[RunAggregate],
+               max_flips_per_session: int, seed: Optional[int] = None,
+               engine: Optional[str] = None) -> Optional[int]:
+    """
+    Write a finished run's summary and waiting-time counts in one transaction.
+
+    Args:
+        run_id: Run registry ID (see new_run_id)
+        kind: One of RUN_KINDS
+        pattern: Simulated pattern
+        aggregate: Final aggregate of the run
+        max_flips_per_session: Flip limit per session
+        seed: Run seed
+        engine: Engine that stepped the sessions ("python" or "numpy")
+
+    Returns:
+        ID of the stored summary, or None if recording is not enabled or no
+        session completed
+    """
+    if _app is None or aggregate is None or not aggregate.completed_sessions:
+        return None
+
+    with _app.app_context():
+        summary = RunSummary(
+            run_id=run_id,
+            kind=kind,
+            engine=engine,
+            pattern_key=pattern_key(pattern),
+            pattern_description=pattern.get_description(),
+            seed=str(seed) if seed is not None else None,
+            num_sessions=aggregate.total_sessions,
+            max_flips_per_session=max_flips_per_session,
+            complete=aggregate.completed_sessions == aggregate.total_sessions,
+            completed_sessions=aggregate.completed_sessions,
+            pattern_found_sessions=aggregate.pattern_found_sessions,
+            completed_flips_sum=aggregate.completed_flips_sum,
+            pattern_flips_sum=aggregate.pattern_flips_sum,
+            pattern_flips_mean=aggregate.pattern_flips_mean,
+            pattern_flips_m2=aggregate.pattern_flips_m2,
+            pattern_flips_min=aggregate.pattern_flips_min,
+            pattern_flips_max=aggregate.pattern_flips_max,
+            theoretical_ev=pattern.get_theoretical_ev()
+        )
+        db.session.add(summary)
+        db.session.flush()
+        summary_id = summary.id
+        bins = [{"run_summary_id": summary_id, "flips": flips, "count": count}
+                for flips, count in sorted(aggregate.waiting_time_counts.items())]
+        if bins:
+            db.session.execute(insert(RunHistogramBin), bins)
+        db.session.commit()
+
+    _invalidate_estimates()
+    return summary_id
+
+
+def record_simulator_run(run_id: str, kind: str, simulator) -> Optional[int]:
+    """Record the run a CoinFlipSimulator just finished (see record_run)."""
+    if simulator.current_pattern is None:
+        return None
+    return record_run(run_id, kind, simulator.current_pattern, simulator.aggregate,
+                      simulator.max_flips_per_session, simulator.run_seed, simulator.run_engine)
+
+
+def list_runs(page: int = 1, per_page: int = 20, pattern: Optional[str] = None,
+              kind: Optional[str] = None, min_sessions: Optional[int] = None,
+              since: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    One page of stored runs, newest first.
+
+    Args:
+        page: Page number (from 1)
+        per_page: Runs per page
+        pattern: Only runs of this pattern key
+        kind: Only runs of this kind
+        min_sessions: Only runs with at least this many sessions
+        since: Only runs stored at or after this (naive UTC) time
+
+    Returns:
+        Dictionary with the "runs" of the page and "page", "per_page",
+        "total" and "pages"
+    """
+    query = select(RunSummary).order_by(RunSummary.created_at.desc(), RunSummary.id.desc())
+    if pattern is not None:
+        query = query.where(RunSummary.pattern_key == pattern)
+    if kind is not None:
+        query = query.where(RunSummary.kind == kind)
+    if min_sessions is not None:
+        query = query.where(RunSummary.num_sessions >= min_sessions)
+    if since is not None:
+        query = query.where(RunSummary.created_at >= since)
+
+    result = db.paginate(query, page=page, per_page=per_page, error_out=False, count=True)
+    return {
+        "runs": [summary.to_dict() for summary in result.items],
+        "page": result.page,
+        "per_page": result.per_page,
+        "total": result.total,
+        "pages": result.pages
+    }
+
+
+def get_run(summary_id: int, bins: int = 50) -> Optional[Dict[str, Any]]:
+    """
+    A stored run with its waiting-time histogram.
+
+    Args:
+        summary_id: ID of the stored summary
+        bins: Maximum number of histogram buckets
+
+    Returns:
+        The run (see RunSummary.to_dict) with a "histogram" in the shape of
+        RunAggregate.get_histogram, or None if there is no such run
+    """
+    summary = db.session.get(RunSummary, summary_id)
+    if summary is None:
+        return None
+
+    aggregate = RunAggregate()
+    for flips, count in db.session.execute(
+            select(RunHistogramBin.flips, RunHistogramBin.count)
+            .where(RunHistogramBin.run_summary_id == summary_id)):
+        aggregate.waiting_time_counts[flips] = count
+
+    result = summary.to_dict()
+    result["histogram"] = aggregate.get_histogram(bins)
+    return result
+
+
+def best_estimates() -> Dict[Tuple[str, int], Dict[str, Any]]:
+    """
+    Pooled estimate of the expected flips of every pattern with complete runs.
+
+    Only runs with the same flip limit are pooled: the mean over sessions
+    that found the pattern is conditional on that limit. Runs that were
+    stopped early are left out, since only their quickest sessions
+    completed, and so are adaptive runs, whose size depends on the estimate
+    they reached. The result is cached until the next run is recorded.
+
+    Returns:
+        Dictionary of (pattern key, max_flips_per_session) -> pooled statistics
+    """
+    global _estimates
+    with _estimates_lock:
+        if _estimates is None:
+            _estimates = _pool_runs()
+        return _estimates
+
+
+def _invalidate_estimates():
+    global _estimates
+    with _estimates_lock:
+        _estimates = None
+
+
+def _pool_runs() -> Dict[Tuple[str, int], Dict[str, Any]]:
+    """Pool all complete fixed-size runs per pattern and flip limit with one grouped query."""
+    found = RunSummary.pattern_found_sessions
+    rows = db.session.execute(
+        select(RunSummary.pattern_key,
+               RunSummary.max_flips_per_session,
+               func.max(RunSummary.pattern_description),
+               func.count(RunSummary.id),
+               func.sum(RunSummary.num_sessions),
+               func.sum(found),
+               func.sum(RunSummary.pattern_flips_sum),
+               # Sum of squares: m2 + n * mean^2 per run
+               func.sum(RunSummary.pattern_flips_m2
+                        + found * RunSummary.pattern_flips_mean * RunSummary.pattern_flips_mean),
+               func.min(RunSummary.pattern_flips_min),
+               func.max(RunSummary.pattern_flips_max),
+               func.max(RunSummary.theoretical_ev),
+               func.max(RunSummary.created_at))
+        .where(RunSummary.complete.is_(True), RunSummary.kind != "adaptive")
+        .group_by(RunSummary.pattern_key, RunSummary.max_flips_per_session))
+
+    estimates = {}
+    for (key, max_flips, description, runs, sessions, found_sessions, flips_sum, squares_sum,
+         flips_min, flips_max, theoretical_ev, last_run_at) in rows:
+        mean = flips_sum / found_sessions if found_sessions else 0
+        m2 = max(0.0, squares_sum - found_sessions * mean * mean) if found_sessions else 0.0
+        variance = m2 / (found_sessions - 1) if found_sessions > 1 else 0.0
+        standard_error = math.sqrt(variance / found_sessions) if found_sessions > 1 else 0.0
+        estimates[(key, max_flips)] = {
+            "pattern_key": key,
+            "max_flips_per_session": max_flips,
+            "pattern_description": description,
+            "runs": runs,
+            "sessions": sessions,
+            "pattern_found_sessions": found_sessions,
+            "actual_ev": mean,
+            "actual_ev_variance": variance,
+            "actual_ev_standard_error": standard_error,
+            "actual_ev_confidence_interval": [mean - Z_95 * standard_error,
+                                              mean + Z_95 * standard_error],
+            "min_flips_pattern_found": flips_min,
+            "max_flips_pattern_found": flips_max,
+            "theoretical_ev": theoretical_ev,
+            "last_run_at": last_run_at.isoformat() + "Z" if last_run_at else None
+        }
+    return estimates
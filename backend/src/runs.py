@@ -0,0 +1,272 @@
+"""
+Run registry and scheduler for concurrent simulations.
+Each run owns its own CoinFlipSimulator and Socket.IO rooms; a bounded pool of
+scheduler threads time-slices every live run.
+"""
+
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+import heapq
+import itertools
+import threading
+import time
+import uuid
+from src.broadcast import UpdateCoalescer
+from src.metrics import registry as metrics_registry, sessions_stepped, step_duration
+from src.simulation import CoinFlipSimulator
+from src.subscriptions import SubscriptionRegistry
+
+# ID of the run backed by the global simulator (used when no run ID is given)
+DEFAULT_RUN_ID = "default"
+
+# Registry limits
+MAX_RUNS = 32
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024  # bytes across finished runs
+
+# Scheduler settings
+DEFAULT_SCHEDULER_WORKERS = 2
+SLICE_SECONDS = 0.01  # longest a run may step before yielding to others
+
+
+def new_run_id() -> str:
+    """Random ID for a new run (registry runs and headless batch runs alike)."""
+    return uuid.uuid4().hex[:12]
+
+
+class SimulationRun:
+    """One simulation run: its simulator plus per-run broadcast state."""
+
+    def __init__(self, run_id: str, simulator: CoinFlipSimulator):
+        """
+        Initialize run.
+
+        Args:
+            run_id: Unique run identifier
+            simulator: Simulator owned by this run
+        """
+        self.run_id = run_id
+        self.simulator = simulator
+        self.created_at = time.time()
+        self.last_access = self.created_at
+        self.coalescer = UpdateCoalescer()
+        # Bumped whenever the run is scheduled; older scheduler entries are dropped
+        self.generation = 0
+        self.subscriptions = SubscriptionRegistry(prefix=self.room(""))
+        self.binary_clients = set()
+        self.json_clients = set()
+
+    def room(self, name: str) -> str:
+        """Socket.IO room name scoped to this run."""
+        return f"run:{self.run_id}:{name}"
+
+    def get_summary(self) -> Dict[str, Any]:
+        """Get a short description of the run."""
+        simulator = self.simulator
+        return {
+            "run_id": self.run_id,
+            "created_at": self.created_at,
+            "last_access": self.last_access,
+            "is_running": simulator.is_running,
+            "pattern_description": (simulator.current_pattern.get_description()
+                                    if simulator.current_pattern else ""),
+            "num_sessions": simulator.num_sessions,
+            "tick": simulator.tick,
+            "memory_bytes": simulator.estimate_memory_bytes()
+        }
+
+
+class RunRegistry:
+    """Run lookup with LRU eviction of finished runs under a memory budget."""
+
+    def __init__(self, default_simulator: CoinFlipSimulator, max_runs: int = MAX_RUNS,
+                 memory_budget: int = DEFAULT_MEMORY_BUDGET,
+                 on_evict: Optional[Callable[[SimulationRun], None]] = None):
+        """
+        Initialize registry.
+
+        Args:
+            default_simulator: Simulator for the default run (never evicted)
+            max_runs: Maximum number of runs kept, including the default run
+            memory_budget: Estimated bytes finished runs may hold in total
+            on_evict: Called with each evicted run, outside the registry lock
+        """
+        self.max_runs = max_runs
+        self.memory_budget = memory_budget
+        self.on_evict = on_evict
+        self._lock = threading.Lock()
+        self._runs: "OrderedDict[str, SimulationRun]" = OrderedDict()
+        self._runs[DEFAULT_RUN_ID] = SimulationRun(DEFAULT_RUN_ID, default_simulator)
+
+    def create(self, run_id: Optional[str] = None) -> Optional[SimulationRun]:
+        """
+        Create a run with a fresh simulator.
+
+        Args:
+            run_id: ID for the run (a new random ID if None), e.g. to restore
+                a checkpointed run under its old ID
+
+        Returns:
+            The new run, or None if every slot is held by a running simulation
+        """
+        with self._lock:
+            evicted = self._evict(reserve=1)
+            run = None
+            if len(self._runs) < self.max_runs:
+                run = SimulationRun(run_id or new_run_id(), CoinFlipSimulator())
+                self._runs[run.run_id] = run
+        self._notify_evicted(evicted)
+        return run
+
+    def get(self, run_id: Optional[str] = None) -> Optional[SimulationRun]:
+        """Look up a run (the default run if run_id is None) and mark it used."""
+        with self._lock:
+            run = self._runs.get(run_id or DEFAULT_RUN_ID)
+            if run is not None:
+                run.last_access = time.time()
+                self._runs.move_to_end(run.run_id)
+            return run
+
+    def list_runs(self) -> List[SimulationRun]:
+        """All runs, least recently used first."""
+        with self._lock:
+            return list(self._runs.values())
+
+    def evict(self):
+        """Evict finished runs over the run limit or memory budget."""
+        with self._lock:
+            evicted = self._evict()
+        self._notify_evicted(evicted)
+
+    def _evict(self, reserve: int = 0) -> List[SimulationRun]:
+        finished = [run for run in self._runs.values()
+                    if run.run_id != DEFAULT_RUN_ID and not run.simulator.is_running]
+        memory = sum(run.simulator.estimate_memory_bytes() for run in finished)
+
+        # finished is in LRU order, so the least recently used go first
+        evicted = []
+        for run in finished:
+            if len(self._runs) + reserve <= self.max_runs and memory <= self.memory_budget:
+                break
+            memory -= run.simulator.estimate_memory_bytes()
+            del self._runs[run.run_id]
+            evicted.append(run)
+        return evicted
+
+    def _notify_evicted(self, evicted: List[SimulationRun]):
+        if self.on_evict is None:
+            return
+        for run in evicted:
+            try:
+                self.on_evict(run)
+            except Exception as e:
+                print(f"Error cleaning up evicted run {run.run_id}: {e}")
+
+
+class RunScheduler:
+    """
+    Fair time-slicing of live runs over a bounded pool of threads.
+
+    Runs wait in a heap ordered by when their next tick is due. A worker takes
+    the earliest due run, steps it for at most SLICE_SECONDS (or a single tick
+    for rate-limited runs) and puts it back, so each run is stepped by one
+    thread at a time and no run can starve the others.
+    """
+
+    def __init__(self, on_step: Callable[[SimulationRun, Dict[str, Any]], None],
+                 on_finish: Callable[[SimulationRun, Optional[Exception], Any], None],
+                 workers: int = DEFAULT_SCHEDULER_WORKERS):
+        """
+        Initialize scheduler.
+
+        Args:
+            on_step: Called with (run, step_result) after every tick
+            on_finish: Called with (run, error, context) once a run stops,
+                completes or fails, context being the value passed to schedule
+            workers: Number of stepping threads
+        """
+        self.on_step = on_step
+        self.on_finish = on_finish
+        self.workers = workers
+        self._condition = threading.Condition()
+        self._queue = []  # heap of (due_time, sequence, run, generation, context)
+        self._sequence = itertools.count()
+        self._threads: List[threading.Thread] = []
+
+    def schedule(self, run: SimulationRun, context: Any = None):
+        """
+        Add a started run to the scheduler.
+
+        Scheduling a run again (e.g. restarted right after a stop) supersedes
+        its earlier entry, which is then dropped without stepping or finishing.
+
+        Args:
+            run: Run to step
+            context: Passed to on_finish (e.g. the run's update coalescer)
+        """
+        with self._condition:
+            if not self._threads:
+                for _ in range(self.workers):
+                    thread = threading.Thread(target=self._work, daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+            run.generation += 1
+            heapq.heappush(self._queue, (time.perf_counter(), next(self._sequence), run,
+                                         run.generation, context))
+            self._condition.notify()
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while True:
+                    if not self._queue:
+                        self._condition.wait()
+                        continue
+                    delay = self._queue[0][0] - time.perf_counter()
+                    if delay <= 0:
+                        due, _, run, generation, context = heapq.heappop(self._queue)
+                        break
+                    self._condition.wait(delay)
+            if generation != run.generation:
+                continue
+
+            try:
+                reschedule = self._run_slice(run, generation)
+                error = None
+            except Exception as e:
+                reschedule = False
+                error = e
+
+            with self._condition:
+                if generation != run.generation:
+                    continue
+                if reschedule:
+                    heapq.heappush(self._queue, (self._next_due(run, due), next(self._sequence),
+                                                 run, generation, context))
+                    self._condition.notify()
+                    continue
+            self.on_finish(run, error, context)
+
+    def _run_slice(self, run: SimulationRun, generation: int) -> bool:
+        """Step a run for one slice; returns True if it should be rescheduled."""
+        simulator = run.simulator
+        slice_end = time.perf_counter() + SLICE_SECONDS
+        while simulator.is_running and run.generation == generation:
+            started = metrics_registry.start()
+            step_result = simulator.step_simulation()
+            step_duration.observe_since(started, simulator.run_engine)
+            sessions_stepped.inc(step_result.get("active_sessions", 0), simulator.run_engine)
+            self.on_step(run, step_result)
+            if step_result["status"] == "completed":
+                return False
+            if simulator.ticks_per_second or time.perf_counter() >= slice_end:
+                return simulator.is_running
+        return False
+
+    @staticmethod
+    def _next_due(run: SimulationRun, due: float) -> float:
+        now = time.perf_counter()
+        ticks_per_second = run.simulator.ticks_per_second
+        if not ticks_per_second:
+            return now
+        # Keep the configured rate, but do not try to catch up after falling behind
+        return max(due + 1.0 / ticks_per_second, now)
@@ -3,15 +3,59 @@ Coin flip simulation module.
 Handles individual coin flip sessions and pattern detection.
 """
 
-import random
-from typing import List, Optional, Dict, Any
-from src.patterns import Pattern, PATTERN_CONFIGS
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+import numpy as np
+from src.active_set import ActiveSet
+from src.aggregates import RunAggregate, Z_95
+from src.analytics import WaitingTimeAnalysis, analyze
+from src.bitparallel import WordScanner, WORD_BITS
+from src.broadcast import UpdateBatch
+from src.checkpoints import COMPLETED_FLAG, PATTERN_FOUND_FLAG, SESSION_DTYPE
+from src.frames import encode_update_frame
+from src.history import FlipHistory
+from src.rng import FlipStream, is_valid_seed, random_seed
+from src.parallel import MAX_WORKERS, SHARD_ENGINE, run_parallel
+from src.pattern_dsl import compile_pattern, resolve_pattern
+from src.patterns import Pattern, PatternSet, PATTERN_CONFIGS
+from src.rare_events import estimate_rare_event
+from src.snapshots import EMPTY_RECORD, SimulationSnapshot, SnapshotPublisher
+from src.subscriptions import CompletionLog
+from src.timeseries import StatisticsHistory, downsample, downsample_curve
+from src.vectorized import VectorizedEngine
+
+# Available stepping engines: per-session objects or NumPy arrays
+ENGINES = ("python", "numpy")
+
+# Largest run that can be configured
+MAX_SESSIONS = 1000000
+MAX_FLIPS_PER_SESSION = 1000000
+
+# Approximate memory of one CoinFlipSession (histories are regenerated, not stored)
+SESSION_OVERHEAD_BYTES = 400
+
+# Adaptive runs: size of the first batch, and pattern-found sessions needed
+# before the normal-approximation confidence interval is trusted
+ADAPTIVE_INITIAL_BATCH = 1000
+ADAPTIVE_MIN_FOUND = 100
+
+# Keys of a session status, in order
+SESSION_FIELDS = ("session_id", "flips", "flips_count", "completed", "pattern_found",
+                  "pattern_position", "stopped_reason", "pattern_description")
+
+
+def _is_int_in_range(value, minimum: int, maximum: int) -> bool:
+    """Whether value is an integer (not a bool) from minimum to maximum."""
+    return isinstance(value, int) and not isinstance(value, bool) and minimum <= value <= maximum
 
 
 class CoinFlipSession:
     """Represents a single coin flip session."""
     
-    def __init__(self, session_id: int, pattern: Pattern, max_flips: int = 10000):
+    def __init__(self, session_id: int, pattern: Pattern, max_flips: int = 10000,
+                 seed: Optional[int] = None):
         """
         Initialize a coin flip session.
         
@@ -19,19 +63,30 @@ class CoinFlipSession:
             session_id: Unique identifier for the session
             pattern: Pattern to detect
             max_flips: Maximum number of flips before stopping
+            seed: Run seed; flips are a function of (seed, session_id, flip index)
         """
         self.session_id = session_id
         self.pattern = pattern
         self.max_flips = max_flips
-        self.flips: List[int] = []
+        self.stream = FlipStream(seed if seed is not None else random_seed(), session_id)
+        self.flips_count = 0
         self.completed = False
         self.pattern_found = False
         self.pattern_position: Optional[int] = None
         self.stopped_reason = ""
+        self._matcher = pattern.new_matcher()
+        # Pattern sets: flip count at which each target first matched (0 = not yet)
+        self._hit_masks = pattern.hit_masks
+        self.first_hits = [0] * len(pattern.target_names) if self._hit_masks else None
+    
+    @property
+    def flips(self) -> FlipHistory:
+        """Flip history, regenerated from the stream on every access."""
+        return self.stream.history(self.flips_count)
     
     def flip_coin(self) -> int:
         """Flip a coin and return result (0=tails, 1=heads)."""
-        return random.randint(0, 1)
+        return self.stream.flip(self.flips_count)
     
     def add_flip(self, flip_result: int) -> bool:
         """
@@ -46,11 +101,13 @@ class CoinFlipSession:
         if self.completed:
             return False
         
-        self.flips.append(flip_result)
+        self.flips_count += 1
         
-        # Check for pattern
-        pattern_found, position = self.pattern.check_pattern(self.flips)
-        if pattern_found:
+        # Advance the pattern matcher by one flip
+        position = self._matcher.feed(flip_result)
+        if self._hit_masks is not None:
+            self._record_first_hits(self._hit_masks[self._matcher.state])
+        if position is not None:
             self.pattern_found = True
             self.pattern_position = position
             self.completed = True
@@ -58,32 +115,107 @@ class CoinFlipSession:
             return False
         
         # Check max flips limit
-        if len(self.flips) >= self.max_flips:
+        if self.flips_count >= self.max_flips:
             self.completed = True
             self.stopped_reason = "max_flips_reached"
             return False
         
         return True
     
-    def run_until_completion(self) -> Dict[str, Any]:
+    def _record_first_hits(self, mask: int):
+        """Store the current flip count for targets in mask matching for the first time."""
+        target = 0
+        while mask:
+            if mask & 1 and not self.first_hits[target]:
+                self.first_hits[target] = self.flips_count
+            mask >>= 1
+            target += 1
+    
+    @property
+    def automaton_state(self) -> int:
+        """Current state of the pattern matcher."""
+        return self._matcher.state
+    
+    def restore(self, flips_count: int, automaton_state: int, completed: bool,
+                pattern_found: bool, first_hits: Optional[Sequence[int]] = None):
+        """
+        Continue from a saved state (e.g. a checkpoint).
+        
+        Args:
+            flips_count: Flips already made
+            automaton_state: Pattern matcher state after those flips
+            completed: Whether the session has completed
+            pattern_found: Whether it completed by finding the pattern
+            first_hits: First-hit flip counts (pattern sets only)
+        """
+        self.flips_count = flips_count
+        self._matcher.state = automaton_state
+        self._matcher.count = flips_count
+        self.completed = completed
+        self.pattern_found = pattern_found
+        if pattern_found:
+            self.pattern_position = flips_count - self._matcher.match_lengths[automaton_state]
+            self.stopped_reason = "pattern_found"
+        elif completed:
+            self.stopped_reason = "max_flips_reached"
+        if first_hits is not None and self.first_hits is not None:
+            self.first_hits = [int(flips) for flips in first_hits]
+    
+    def run_until_completion(self, fast: bool = False) -> Dict[str, Any]:
         """
         Run the session until completion (pattern found or max flips).
         
+        Args:
+            fast: Draw WORD_BITS flips at a time and detect the pattern with
+                word-level bit operations instead of flipping one at a time
+                (ignored for pattern sets, which track every target)
+        
         Returns:
             Dictionary with session results
         """
+        if fast and self._hit_masks is None:
+            self._run_word_parallel()
+        
         while not self.completed:
             flip_result = self.flip_coin()
             self.add_flip(flip_result)
         
         return self.get_status()
     
-    def get_status(self) -> Dict[str, Any]:
-        """Get current session status."""
+    def _run_word_parallel(self):
+        """Generate and scan whole words of flips, stopping at the first hit."""
+        scanner = WordScanner(self.pattern, self.flips if self.flips_count else None)
+        
+        while not self.completed:
+            count = min(WORD_BITS, self.max_flips - self.flips_count)
+            word = self.stream.bits(self.flips_count, count)
+            self.flips_count += count
+            
+            position = scanner.scan(word, count)
+            if position is not None:
+                self.flips_count = position + scanner.match_length
+                self.pattern_found = True
+                self.pattern_position = position
+                self.completed = True
+                self.stopped_reason = "pattern_found"
+            elif self.flips_count >= self.max_flips:
+                self.completed = True
+                self.stopped_reason = "max_flips_reached"
+    
+    def get_status(self, include_flips: bool = True) -> Dict[str, Any]:
+        """
+        Get current session status.
+        
+        Flips are replayed from the seed and encoded as a string of "H"/"T"
+        characters.
+        
+        Args:
+            include_flips: Encode the flip history (None when False)
+        """
         return {
             "session_id": self.session_id,
-            "flips": self.flips.copy(),
-            "flips_count": len(self.flips),
+            "flips": self.stream.to_string(self.flips_count) if include_flips else None,
+            "flips_count": self.flips_count,
             "completed": self.completed,
             "pattern_found": self.pattern_found,
             "pattern_position": self.pattern_position,
@@ -98,32 +230,162 @@ class CoinFlipSimulator:
     def __init__(self):
         """Initialize the simulator."""
         self.sessions: Dict[int, CoinFlipSession] = {}
+        self.active_sessions = ActiveSet()
+        self.batch_engine: Optional[VectorizedEngine] = None
+        self.aggregate: Optional[RunAggregate] = None
+        self.completion_log = CompletionLog()
         self.current_pattern: Optional[Pattern] = None
         self.num_sessions = 1000
         self.max_flips_per_session = 10000
+        self.engine = "python"
+        self.workers = 1
+        self.ticks_per_second: Optional[float] = 10.0
+        self.seed: Optional[int] = None
+        self.target_relative_error: Optional[float] = None
+        self.target_half_width: Optional[float] = None
+        self.max_total_flips: Optional[int] = None
+        # Exact analysis of the configured pattern and flip limit, solved when
+        # configuring so that publishing under the writer lock never solves it
+        self.analysis: Optional[WaitingTimeAnalysis] = None
+        # Progress of the current adaptive run (None for fixed-size runs)
+        self.adaptive_status: Optional[Dict[str, Any]] = None
+        # Seed of the current run (self.seed, or a random one if that is None)
+        self.run_seed: Optional[int] = None
+        # Engine stepping the current run (process-pool runs always use SHARD_ENGINE)
+        self.run_engine: Optional[str] = None
+        self.tick = 0
         self.is_running = False
+        # How the pattern was configured (pattern_name or race_patterns), for checkpoints
+        self.pattern_name: Optional[str] = None
+        self.race_patterns: Optional[List[str]] = None
+        self.race_mode = "race"
+        # Increases whenever the sessions are replaced (start, reset, restore)
+        self.run_number = 0
+        # Latest published state; request threads read this instead of live sessions
+        self.snapshot = SimulationSnapshot(0, 0, False, {})
+        # Statistics sampled at every publication, for convergence charts
+        self.history = StatisticsHistory()
+        self._publisher: Optional[SnapshotPublisher] = None
+        # Held by whichever thread is mutating sessions (stepping, starting, resetting)
+        self._writer_lock = threading.Lock()
     
     def configure_simulation(self, pattern_name: str, num_sessions: int = 1000, 
-                           max_flips_per_session: int = 10000) -> bool:
+                           max_flips_per_session: int = 10000,
+                           engine: str = "python", workers: int = 1,
+                           ticks_per_second: Optional[float] = 10.0,
+                           seed: Optional[int] = None,
+                           target_relative_error: Optional[float] = None,
+                           target_half_width: Optional[float] = None,
+                           max_total_flips: Optional[int] = None,
+                           race_patterns: Optional[List[str]] = None,
+                           race_mode: str = "race") -> bool:
         """
         Configure the simulation parameters.
         
         Args:
-            pattern_name: Name of pattern from PATTERN_CONFIGS
-            num_sessions: Number of parallel sessions
-            max_flips_per_session: Maximum flips per session
+            pattern_name: Name of pattern from PATTERN_CONFIGS, or a pattern
+                expression (see src.pattern_dsl)
+            num_sessions: Number of parallel sessions (1 to MAX_SESSIONS)
+            max_flips_per_session: Maximum flips per session (1 to MAX_FLIPS_PER_SESSION)
+            engine: Stepping engine, one of ENGINES
+            workers: Worker processes used by run_parallel (1 to MAX_WORKERS)
+            ticks_per_second: Live stepping speed; None or 0 runs as fast as possible
+            seed: Run seed for reproducible runs (0 to 2**64 - 1); a random
+                seed per run if None
+            target_relative_error: Adaptive mode: stop once the 95% CI half-width
+                of actual_ev is at most this fraction of actual_ev
+            target_half_width: Adaptive mode: stop once the 95% CI half-width of
+                actual_ev is at most this many flips
+            max_total_flips: Adaptive mode: flip budget across all sessions
+                (num_sessions is the session budget)
+            race_patterns: Pattern names or expressions to watch together as a
+                PatternSet (replaces pattern_name)
+            race_mode: PatternSet mode, "race" (stop at the first target) or
+                "census" (stop once every target has matched)
             
         Returns:
             True if configuration successful, False otherwise
         """
-        if pattern_name not in PATTERN_CONFIGS:
+        config = self._prepare_configuration(
+            pattern_name, num_sessions, max_flips_per_session, engine, workers,
+            ticks_per_second, seed, target_relative_error, target_half_width,
+            max_total_flips, race_patterns, race_mode)
+        if config is None:
             return False
-        
-        self.current_pattern = PATTERN_CONFIGS[pattern_name]
-        self.num_sessions = num_sessions
-        self.max_flips_per_session = max_flips_per_session
+        self._apply_configuration(config)
         return True
     
+    def _prepare_configuration(self, pattern_name: str, num_sessions: int = 1000,
+                               max_flips_per_session: int = 10000,
+                               engine: str = "python", workers: int = 1,
+                               ticks_per_second: Optional[float] = 10.0,
+                               seed: Optional[int] = None,
+                               target_relative_error: Optional[float] = None,
+                               target_half_width: Optional[float] = None,
+                               max_total_flips: Optional[int] = None,
+                               race_patterns: Optional[List[str]] = None,
+                               race_mode: str = "race") -> Optional[Dict[str, Any]]:
+        """
+        Validate a configuration and solve its analysis without touching the simulator.
+        
+        Args:
+            See configure_simulation
+        
+        Returns:
+            Attribute values for _apply_configuration, or None if invalid
+        """
+        try:
+            if race_patterns is not None:
+                pattern = PatternSet({name: resolve_pattern(name) for name in race_patterns},
+                                     race_mode)
+            else:
+                pattern = resolve_pattern(pattern_name)
+        except ValueError:
+            return None
+        if engine not in ENGINES or not _is_int_in_range(workers, 1, MAX_WORKERS):
+            return None
+        if not (_is_int_in_range(num_sessions, 1, MAX_SESSIONS)
+                and _is_int_in_range(max_flips_per_session, 1, MAX_FLIPS_PER_SESSION)):
+            return None
+        if ticks_per_second is not None and ticks_per_second < 0:
+            return None
+        if seed is not None and not is_valid_seed(seed):
+            return None
+        if any(value is not None and value <= 0
+               for value in (target_relative_error, target_half_width, max_total_flips)):
+            return None
+        
+        analysis = analyze(pattern, max_flips_per_session)
+        if isinstance(pattern, PatternSet):
+            pattern.get_theoretical_win_probabilities()
+        
+        return {
+            "current_pattern": pattern,
+            "analysis": analysis,
+            "pattern_name": pattern_name,
+            "race_patterns": list(race_patterns) if race_patterns is not None else None,
+            "race_mode": race_mode,
+            "num_sessions": num_sessions,
+            "max_flips_per_session": max_flips_per_session,
+            "engine": engine,
+            "workers": workers,
+            "ticks_per_second": ticks_per_second,
+            "seed": seed,
+            "target_relative_error": target_relative_error,
+            "target_half_width": target_half_width,
+            "max_total_flips": max_total_flips
+        }
+    
+    def _apply_configuration(self, config: Dict[str, Any]):
+        """Set the attributes prepared by _prepare_configuration."""
+        for name, value in config.items():
+            setattr(self, name, value)
+    
+    @property
+    def is_adaptive(self) -> bool:
+        """Whether a precision target is configured (start with run_adaptive)."""
+        return self.target_relative_error is not None or self.target_half_width is not None
+    
     def start_simulation(self) -> bool:
         """
         Start a new simulation with configured parameters.
@@ -131,6 +393,10 @@ class CoinFlipSimulator:
         Returns:
             True if started successfully, False otherwise
         """
+        with self._writer_lock:
+            return self._start_locked()
+    
+    def _start_locked(self) -> bool:
         if self.current_pattern is None:
             return False
         
@@ -139,106 +405,866 @@ class CoinFlipSimulator:
         
         # Clear previous sessions
         self.sessions.clear()
+        self.active_sessions.clear()
+        self.batch_engine = None
+        self.aggregate = RunAggregate()
+        self.aggregate.add_sessions(self.num_sessions)
+        self.completion_log = CompletionLog()
+        self.adaptive_status = None
+        self.tick = 0
+        self.run_seed = self.seed if self.seed is not None else random_seed()
+        self.run_engine = self.engine
+        self.history.clear()
+        self.run_number += 1
+        self._publisher = SnapshotPublisher([EMPTY_RECORD] * self.num_sessions,
+                                            self.current_pattern.get_description(),
+                                            seed=self.run_seed, version=self.snapshot.version)
+        
+        if self.engine == "numpy":
+            self.batch_engine = VectorizedEngine(
+                pattern=self.current_pattern,
+                num_sessions=self.num_sessions,
+                max_flips=self.max_flips_per_session,
+                seed=self.run_seed
+            )
+            self.is_running = True
+            self._publish()
+            return True
         
         # Create new sessions
         for i in range(self.num_sessions):
             session = CoinFlipSession(
                 session_id=i,
                 pattern=self.current_pattern,
-                max_flips=self.max_flips_per_session
+                max_flips=self.max_flips_per_session,
+                seed=self.run_seed
             )
             self.sessions[i] = session
+            self.active_sessions.add(i)
         
         self.is_running = True
+        self._publish()
         return True
     
     def stop_simulation(self):
         """Stop the current simulation."""
-        self.is_running = False
+        with self._writer_lock:
+            self.is_running = False
+            if self._publisher is not None:
+                self._publish()
     
     def reset_simulation(self):
         """Reset all sessions and stop simulation."""
-        self.sessions.clear()
-        self.is_running = False
+        with self._writer_lock:
+            self.sessions.clear()
+            self.active_sessions.clear()
+            self.batch_engine = None
+            self.aggregate = None
+            self.adaptive_status = None
+            self.is_running = False
+            self._publisher = None
+            self.history.clear()
+            self.run_number += 1
+            self.snapshot = SimulationSnapshot(self.snapshot.version + 1, self.tick, False, {})
+    
+    def _publish(self):
+        """Publish the state at the current tick boundary (writer lock held)."""
+        statistics = {}
+        if self.aggregate is not None:
+            statistics = self.aggregate.to_statistics(self.current_pattern, self.is_running,
+                                                      self.max_flips_per_session, self.analysis)
+            statistics["seed"] = self.run_seed
+            if self.adaptive_status is not None:
+                statistics["adaptive"] = dict(self.adaptive_status)
+            self.history.record(self.tick, statistics["completed_sessions"],
+                                statistics["actual_ev"], statistics["pattern_success_rate"])
+        if self.batch_engine is not None:
+            # The engine replaces active_ids on every step rather than modifying it
+            active_ids = self.batch_engine.active_ids
+        else:
+            active_ids = self.active_sessions.freeze()
+        # A single reference assignment, so readers see either the old or the new snapshot
+        self.snapshot = self._publisher.publish(self.tick, self.is_running, statistics, active_ids)
+    
+    def capture_checkpoint(self, session_ids: Optional[np.ndarray] = None,
+                           run_number: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Copy the state needed to resume the current run (see src.checkpoints).
+        
+        Only the copy happens under the writer lock; the caller writes it out
+        while stepping continues.
+        
+        Args:
+            session_ids: Sessions that may have changed since an earlier
+                capture of run run_number (all sessions if None, or if the
+                run has since been replaced)
+            run_number: run_number the session_ids refer to
+        
+        Returns:
+            Dictionary with the JSON "meta" data, the "records" (SESSION_DTYPE)
+            and "first_hits" rows of "session_ids" (None = every session), the
+            still running "active_ids", "run_number" and snapshot "version";
+            None if there is no tick-stepped run to checkpoint
+        """
+        with self._writer_lock:
+            if self._publisher is None or (self.batch_engine is None and not self.sessions):
+                return None
+            if run_number != self.run_number:
+                session_ids = None
+            
+            engine = self.batch_engine
+            pattern = self.current_pattern
+            num_targets = len(pattern.target_names) if pattern.hit_masks is not None else 0
+            first_hits = None
+            if engine is not None:
+                ids = slice(None) if session_ids is None else session_ids
+                flips_count = engine.flips_count[ids]
+                states = engine.states[ids]
+                flags = (engine.completed[ids] * COMPLETED_FLAG
+                         | engine.pattern_found[ids] * PATTERN_FOUND_FLAG)
+                if num_targets:
+                    first_hits = engine.first_hits[ids].copy()
+                active_ids = engine.active_ids.copy()
+            else:
+                ids = range(self.num_sessions) if session_ids is None else session_ids.tolist()
+                sessions = [self.sessions[session_id] for session_id in ids]
+                flips_count = [session.flips_count for session in sessions]
+                states = [session.automaton_state for session in sessions]
+                flags = [session.completed * COMPLETED_FLAG
+                         | session.pattern_found * PATTERN_FOUND_FLAG for session in sessions]
+                if num_targets:
+                    first_hits = np.asarray([session.first_hits for session in sessions],
+                                            dtype=np.int64).reshape(-1, num_targets)
+                active_ids = np.fromiter(self.active_sessions, dtype=np.int64)
+            
+            records = np.empty(len(flips_count), dtype=SESSION_DTYPE)
+            records["flips_count"] = flips_count
+            records["state"] = states
+            records["flags"] = flags
+            meta = {
+                "config": {
+                    "pattern_name": self.pattern_name,
+                    "num_sessions": self.num_sessions,
+                    "max_flips_per_session": self.max_flips_per_session,
+                    "engine": self.engine,
+                    "ticks_per_second": self.ticks_per_second,
+                    "seed": self.seed,
+                    "race_patterns": self.race_patterns,
+                    "race_mode": self.race_mode
+                },
+                "pattern_description": pattern.get_description(),
+                "num_sessions": self.num_sessions,
+                "num_targets": num_targets,
+                "seed": self.run_seed,
+                "tick": self.tick,
+                "is_running": self.is_running,
+                "active_sessions": int(active_ids.size),
+                "completed_sessions": self.aggregate.completed_sessions,
+                "aggregate": self.aggregate.get_state()
+            }
+            return {
+                "meta": meta,
+                "session_ids": session_ids,
+                "records": records,
+                "first_hits": first_hits,
+                "active_ids": active_ids,
+                "run_number": self.run_number,
+                "version": self.snapshot.version
+            }
+    
+    def restore_checkpoint(self, meta: Dict[str, Any], records: np.ndarray,
+                           first_hits: Optional[np.ndarray] = None, resume: bool = True) -> bool:
+        """
+        Replace the current run with a checkpointed one.
+        
+        The checkpoint is validated and the new run built without the writer
+        lock; the simulator is only changed, in one step under the lock, once
+        everything checked out.
+        
+        Args:
+            meta: Checkpoint metadata (see capture_checkpoint)
+            records: Session records (SESSION_DTYPE), one per session
+            first_hits: First-hit flip counts (pattern sets only)
+            resume: Keep stepping if the run was running when checkpointed
+                and has unfinished sessions
+        
+        Returns:
+            True if restored, False if a run is in progress or the checkpoint
+            is invalid or does not match its configuration
+        """
+        if self.is_running:
+            return False
+        try:
+            config = self._prepare_configuration(**meta["config"])
+            if config is None:
+                return False
+            aggregate = RunAggregate.from_state(meta["aggregate"])
+            tick, run_seed, was_running = meta["tick"], meta["seed"], meta["is_running"]
+        except (KeyError, TypeError, ValueError):
+            return False
+        
+        pattern = config["current_pattern"]
+        num_sessions = config["num_sessions"]
+        max_flips = config["max_flips_per_session"]
+        if records.dtype != SESSION_DTYPE or records.shape != (num_sessions,):
+            return False
+        # A run stops on the tick after its last session completed, at most max_flips + 1
+        if not (_is_int_in_range(tick, 0, max_flips + 1) and is_valid_seed(run_seed)):
+            return False
+        if isinstance(pattern, PatternSet):
+            if first_hits is None or first_hits.shape != (num_sessions, len(pattern.target_names)):
+                return False
+        else:
+            first_hits = None
+        
+        flips_count = records["flips_count"]
+        states = records["state"]
+        completed = (records["flags"] & COMPLETED_FLAG) != 0
+        pattern_found = (records["flags"] & PATTERN_FOUND_FLAG) != 0
+        if ((flips_count < 0) | (flips_count > max_flips) | (states < 0)
+                | (states >= pattern.automaton.num_states)).any():
+            return False
+        
+        match_lengths = pattern.automaton.match_lengths
+        published = []
+        for flips, state, done, found in zip(flips_count.tolist(), states.tolist(),
+                                             completed.tolist(), pattern_found.tolist()):
+            if found:
+                published.append((flips, True, True, flips - match_lengths[state],
+                                  "pattern_found"))
+            elif done:
+                published.append((flips, True, False, None, "max_flips_reached"))
+            else:
+                published.append((flips, False, False, None, ""))
+        
+        batch_engine = None
+        sessions: Dict[int, CoinFlipSession] = {}
+        active_sessions = ActiveSet()
+        if config["engine"] == "numpy":
+            batch_engine = VectorizedEngine(
+                pattern=pattern,
+                num_sessions=num_sessions,
+                max_flips=max_flips,
+                seed=run_seed
+            )
+            batch_engine.load_state(flips_count, states, completed, pattern_found, first_hits)
+            has_active = bool(batch_engine.active_ids.size)
+        else:
+            for i in range(num_sessions):
+                session = CoinFlipSession(
+                    session_id=i,
+                    pattern=pattern,
+                    max_flips=max_flips,
+                    seed=run_seed
+                )
+                session.restore(int(flips_count[i]), int(states[i]), bool(completed[i]),
+                                bool(pattern_found[i]),
+                                first_hits[i] if first_hits is not None else None)
+                sessions[i] = session
+                if not session.completed:
+                    active_sessions.add(i)
+            has_active = len(active_sessions) > 0
+        
+        with self._writer_lock:
+            if self.is_running:
+                return False
+            self._apply_configuration(config)
+            self.sessions = sessions
+            self.active_sessions = active_sessions
+            self.batch_engine = batch_engine
+            self.aggregate = aggregate
+            self.completion_log = CompletionLog()
+            self.adaptive_status = None
+            self.tick = tick
+            self.run_seed = run_seed
+            self.run_engine = self.engine
+            self.history.clear()
+            self.run_number += 1
+            self._publisher = SnapshotPublisher(published, pattern.get_description(),
+                                                seed=run_seed, version=self.snapshot.version)
+            self.is_running = bool(resume and was_running and has_active)
+            self._publish()
+            return True
+    
+    def run_parallel(self, seed: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Run the configured simulation to completion on a process pool.
+        
+        Only aggregate results are kept; individual sessions are not stored.
+        
+        Args:
+            seed: Run seed (defaults to the configured seed, random if neither is set)
+            
+        Returns:
+            Final statistics, or an empty dict if not configured or already running
+        """
+        with self._writer_lock:
+            if self.current_pattern is None or self.is_running:
+                return {}
+            
+            self.sessions.clear()
+            self.active_sessions.clear()
+            self.batch_engine = None
+            self.aggregate = None
+            self.adaptive_status = None
+            self.is_running = True
+            if seed is None:
+                seed = self.seed if self.seed is not None else random_seed()
+            self.run_seed = seed
+            self.run_engine = SHARD_ENGINE
+            self.history.clear()
+            self.run_number += 1
+            self._publisher = SnapshotPublisher([], self.current_pattern.get_description(),
+                                                seed=self.run_seed,
+                                                version=self.snapshot.version)
+            self._publish()
+        
+        # The pool runs outside the lock; is_running keeps other writers out meanwhile
+        aggregate = None
+        try:
+            aggregate = run_parallel(
+                self.current_pattern, self.num_sessions, self.max_flips_per_session,
+                workers=self.workers, seed=self.run_seed
+            )
+        finally:
+            with self._writer_lock:
+                self.aggregate = aggregate
+                self.is_running = False
+                self._publish()
+        
+        return self.get_statistics()
     
-    def step_simulation(self) -> Dict[str, Any]:
+    def run_adaptive(self, seed: Optional[int] = None,
+                     on_batch: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        Run batches of sessions until actual_ev reaches the configured precision.
+        
+        Batches are sized from the running variance estimate but at most double
+        the sessions run so far. The run stops once the target is met, the
+        session budget (num_sessions) or flip budget (max_total_flips) is used
+        up, or stop_simulation is called. Sessions are numbered across batches,
+        so a seeded adaptive run is reproducible.
+        
+        Args:
+            seed: Run seed (defaults to the configured seed, random if neither is set)
+            on_batch: Called with the statistics after every batch
+            
+        Returns:
+            Final statistics (see the "adaptive" key), or an empty dict if not
+            configured for adaptive mode or already running
+        """
+        with self._writer_lock:
+            if self.current_pattern is None or self.is_running or not self.is_adaptive:
+                return {}
+            
+            self.sessions.clear()
+            self.active_sessions.clear()
+            self.batch_engine = None
+            self.aggregate = RunAggregate()
+            self.is_running = True
+            if seed is None:
+                seed = self.seed if self.seed is not None else random_seed()
+            self.run_seed = seed
+            self.run_engine = SHARD_ENGINE
+            self.adaptive_status = {
+                "target_relative_error": self.target_relative_error,
+                "target_half_width": self.target_half_width,
+                "max_sessions": self.num_sessions,
+                "max_total_flips": self.max_total_flips,
+                "sessions_used": 0,
+                "flips_used": 0,
+                "batches": 0,
+                "confidence_half_width": None,
+                "relative_error": None,
+                "target_met": False
+            }
+            self.history.clear()
+            self.run_number += 1
+            self._publisher = SnapshotPublisher([], self.current_pattern.get_description(),
+                                                seed=seed, version=self.snapshot.version)
+            self._publish()
+        
+        try:
+            while self.is_running:
+                batch = self._next_adaptive_batch()
+                if batch <= 0:
+                    break
+                part = run_parallel(self.current_pattern, batch, self.max_flips_per_session,
+                                    workers=self.workers, seed=seed,
+                                    first_session_id=self.aggregate.total_sessions)
+                with self._writer_lock:
+                    self.aggregate.merge(part)
+                    self._update_adaptive_status()
+                    self._publish()
+                if on_batch is not None:
+                    on_batch(self.get_statistics())
+                if self.adaptive_status["target_met"]:
+                    break
+        finally:
+            with self._writer_lock:
+                self.is_running = False
+                self._publish()
+        
+        return self.get_statistics()
+    
+    def _update_adaptive_status(self):
+        """Refresh adaptive_status from the aggregate and check the target."""
+        aggregate = self.aggregate
+        status = self.adaptive_status
+        status["sessions_used"] = aggregate.total_sessions
+        status["flips_used"] = aggregate.completed_flips_sum
+        status["batches"] += 1
+        if aggregate.pattern_found_sessions < 2:
+            return
+        
+        half_width = aggregate.get_confidence_half_width()
+        mean = aggregate.pattern_flips_sum / aggregate.pattern_found_sessions
+        status["confidence_half_width"] = half_width
+        status["relative_error"] = half_width / mean
+        status["target_met"] = (
+            aggregate.pattern_found_sessions >= ADAPTIVE_MIN_FOUND
+            and half_width <= self._adaptive_target_width(mean)
+        )
+    
+    def _adaptive_target_width(self, mean: float) -> float:
+        """Largest acceptable CI half-width given the current actual_ev."""
+        widths = []
+        if self.target_half_width is not None:
+            widths.append(self.target_half_width)
+        if self.target_relative_error is not None:
+            widths.append(self.target_relative_error * mean)
+        return min(widths)
+    
+    def _next_adaptive_batch(self) -> int:
+        """Number of sessions to run in the next adaptive batch (0 to stop)."""
+        aggregate = self.aggregate
+        remaining = self.num_sessions - aggregate.total_sessions
+        if self.max_total_flips is not None:
+            # Expected flips per session come from the exact analysis
+            per_session = analyze(self.current_pattern, self.max_flips_per_session).mean_flips_all
+            flips_left = self.max_total_flips - aggregate.completed_flips_sum
+            remaining = min(remaining, int(flips_left // max(per_session, 1.0)))
+        if remaining <= 0:
+            return 0
+        
+        total = aggregate.total_sessions
+        found = aggregate.pattern_found_sessions
+        if found < ADAPTIVE_MIN_FOUND:
+            batch = max(ADAPTIVE_INITIAL_BATCH, total)
+        else:
+            # Sessions needed for the target: (z * sd / width)^2 found sessions
+            mean = aggregate.pattern_flips_sum / found
+            width = self._adaptive_target_width(mean)
+            needed_found = (Z_95 * math.sqrt(aggregate.get_variance()) / width) ** 2
+            needed = math.ceil(needed_found * total / found)
+            batch = max(1, min(needed - total, total))
+        return min(batch, remaining)
+    
+    def run_rare_event(self, pattern_name: str, num_sessions: int = 10000,
+                       max_flips_per_session: int = 10000, seed: Optional[int] = None,
+                       compare_naive: bool = True, workers: int = 1,
+                       timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Estimate a rare pattern by importance sampling without touching the live run.
+        
+        Args:
+            pattern_name: Name of pattern from PATTERN_CONFIGS, or a pattern expression
+            num_sessions: Sessions in the importance-sampling run
+            max_flips_per_session: Maximum flips per session
+            seed: Seed for reproducible results
+            compare_naive: Also run plain sessions with the same flip budget and
+                report their statistics under "naive"
+            workers: Worker processes for the naive comparison
+            timeout: Seconds after which both runs stop early (see
+                estimate_rare_event; unfinished naive sessions are abandoned)
+            
+        Returns:
+            Estimates with standard errors and variance-reduction factors (see
+            src.rare_events), or None if the pattern is unknown or invalid
+        """
+        try:
+            pattern = resolve_pattern(pattern_name)
+        except ValueError:
+            return None
+        
+        started = time.time()
+        deadline = started + timeout if timeout is not None else None
+        result = estimate_rare_event(pattern, num_sessions, max_flips_per_session, seed,
+                                     deadline=deadline)
+        result["pattern_description"] = pattern.get_description()
+        
+        if compare_naive:
+            flips_per_session = analyze(pattern, max_flips_per_session).mean_flips_all
+            naive_sessions = max(1, int(result["flips_used"] / flips_per_session))
+            aggregate = run_parallel(pattern, naive_sessions, max_flips_per_session,
+                                     workers=workers, seed=seed, deadline=deadline)
+            result["naive"] = aggregate.to_statistics(pattern, False, max_flips_per_session)
+            result["naive"]["timed_out"] = aggregate.completed_sessions < aggregate.total_sessions
+        
+        result["elapsed_seconds"] = time.time() - started
+        return result
+    
+    def run_batch(self, pattern_name: str, num_sessions: int = 1000,
+                  max_flips_per_session: int = 10000, workers: int = 1,
+                  seed: Optional[int] = None, timeout: Optional[float] = None,
+                  bins: int = 50,
+                  on_complete: Optional[Callable[[Pattern, RunAggregate], None]] = None
+                  ) -> Optional[Dict[str, Any]]:
+        """
+        Run a headless simulation to completion without touching the live run.
+        
+        Args:
+            pattern_name: Name of pattern from PATTERN_CONFIGS, or a pattern expression
+            num_sessions: Number of sessions
+            max_flips_per_session: Maximum flips per session
+            workers: Worker processes (1 runs in-process)
+            seed: Root seed for reproducible results
+            timeout: Seconds after which unfinished sessions are abandoned
+            bins: Maximum number of waiting-time histogram buckets
+            on_complete: Called with the pattern and final aggregate (e.g. to
+                store the run), once the statistics were built
+            
+        Returns:
+            Final statistics with a waiting-time histogram, or None if the
+            pattern is unknown or invalid
+        """
+        try:
+            pattern = resolve_pattern(pattern_name)
+        except ValueError:
+            return None
+        
+        started = time.time()
+        deadline = started + timeout if timeout is not None else None
+        aggregate = run_parallel(pattern, num_sessions, max_flips_per_session,
+                                 workers=workers, seed=seed, deadline=deadline)
+        
+        stats = aggregate.to_statistics(pattern, False, max_flips_per_session)
+        stats["histogram"] = aggregate.get_histogram(bins)
+        stats["timed_out"] = aggregate.completed_sessions < aggregate.total_sessions
+        
+        if on_complete is not None:
+            on_complete(pattern, aggregate)
+        
+        stats["elapsed_seconds"] = time.time() - started
+        return stats
+    
+    def step_simulation(self, blocking: bool = True) -> Dict[str, Any]:
         """
         Perform one step of simulation (one flip per active session).
         
+        Only one thread steps at a time, and a new snapshot is published once
+        the whole tick has been applied.
+        
+        Args:
+            blocking: Wait for a step in progress on another thread; if False,
+                return status "busy" instead
+        
         Returns:
             Dictionary with simulation status and updates
         """
-        if not self.is_running:
-            return {"status": "not_running", "updates": []}
-        
+        if not self._writer_lock.acquire(blocking):
+            return {"status": "busy", "updates": []}
+        try:
+            if not self.is_running:
+                return {"status": "not_running", "updates": []}
+            
+            self.tick += 1
+            if self.batch_engine is not None:
+                result = self._step_batch_engine()
+            else:
+                result = self._step_sessions()
+            self._publish()
+            return result
+        finally:
+            self._writer_lock.release()
+    
+    def _step_sessions(self) -> Dict[str, Any]:
+        """Perform one step on the per-session objects."""
+        publisher = self._publisher
         updates = []
-        active_sessions = 0
-        
-        for session in self.sessions.values():
-            if not session.completed:
-                active_sessions += 1
-                flip_result = session.flip_coin()
-                should_continue = session.add_flip(flip_result)
-                
-                updates.append({
-                    "session_id": session.session_id,
-                    "flip_result": flip_result,
-                    "flips_count": len(session.flips),
-                    "completed": session.completed,
-                    "pattern_found": session.pattern_found
-                })
+        active_sessions = len(self.active_sessions)
+        completed_ids = []
+        
+        # Only live sessions are visited; completed ones leave the index
+        for session_id in self.active_sessions:
+            session = self.sessions[session_id]
+            flip_result = session.flip_coin()
+            should_continue = session.add_flip(flip_result)
+            flips_count = session.flips_count
+            if not should_continue:
+                self.aggregate.record_completion(session.pattern_found, flips_count,
+                                                 session.first_hits)
+                self.completion_log.record(self.tick, session_id, flips_count)
+                completed_ids.append(session_id)
+            
+            publisher.update(session_id, (flips_count, session.completed, session.pattern_found,
+                                          session.pattern_position, session.stopped_reason))
+            updates.append({
+                "session_id": session.session_id,
+                "flip_result": flip_result,
+                "flips_count": flips_count,
+                "completed": session.completed,
+                "pattern_found": session.pattern_found
+            })
+        
+        for session_id in completed_ids:
+            self.active_sessions.discard(session_id)
         
         # Stop simulation if no active sessions
         if active_sessions == 0:
             self.is_running = False
         
         return {
+            "tick": self.tick,
             "status": "running" if self.is_running else "completed",
             "active_sessions": active_sessions,
             "updates": updates
         }
     
-    def get_statistics(self) -> Dict[str, Any]:
-        """Calculate and return simulation statistics."""
-        if not self.sessions:
-            return {}
+    def _step_batch_engine(self) -> Dict[str, Any]:
+        """Perform one step on the vectorized engine."""
+        step = self.batch_engine.step()
+        active_sessions = int(step["session_ids"].size)
+        newly_completed = step["completed"]
+        first_hits = step.get("first_hits")
+        self.aggregate.record_completions(step["pattern_found"][newly_completed],
+                                          step["flips_count"][newly_completed],
+                                          first_hits[newly_completed] if first_hits is not None else None)
+        for session_id, flips_count in zip(step["session_ids"][newly_completed].tolist(),
+                                           step["flips_count"][newly_completed].tolist()):
+            self.completion_log.record(self.tick, session_id, flips_count)
         
-        total_sessions = len(self.sessions)
-        completed_sessions = sum(1 for s in self.sessions.values() if s.completed)
-        pattern_found_sessions = sum(1 for s in self.sessions.values() if s.pattern_found)
+        # Whole chunks are staged from the engine arrays; no per-session records
+        engine = self.batch_engine
+        session_ids = step["session_ids"]
+        self._publisher.update_arrays(session_ids, engine.flips_count, engine.completed,
+                                      engine.pattern_found, engine.pattern_position)
+        updates = UpdateBatch(session_ids, step["flip_results"], step["flips_count"],
+                              step["completed"], step["pattern_found"],
+                              engine.pattern_position[session_ids])
         
-        # Calculate average flips for completed sessions
-        completed_flips = [len(s.flips) for s in self.sessions.values() if s.completed]
-        avg_flips = sum(completed_flips) / len(completed_flips) if completed_flips else 0
+        if active_sessions == 0:
+            self.is_running = False
         
-        # Calculate average flips for pattern-found sessions
-        pattern_flips = [len(s.flips) for s in self.sessions.values() if s.pattern_found]
-        avg_pattern_flips = sum(pattern_flips) / len(pattern_flips) if pattern_flips else 0
+        return {
+            "tick": self.tick,
+            "status": "running" if self.is_running else "completed",
+            "active_sessions": active_sessions,
+            "updates": updates
+        }
+    
+    def encode_step_frame(self, step_result: Dict[str, Any]) -> bytes:
+        """
+        Encode a step_simulation result as a compact binary frame.
         
-        # Theoretical expected value
-        theoretical_ev = self.current_pattern.get_theoretical_ev() if self.current_pattern else 0
+        Reads only the step result and the latest snapshot, so it is safe to call
+        from a broadcaster thread while the run is being stepped.
         
-        return {
-            "total_sessions": total_sessions,
-            "completed_sessions": completed_sessions,
-            "pattern_found_sessions": pattern_found_sessions,
-            "completion_rate": completed_sessions / total_sessions if total_sessions > 0 else 0,
-            "pattern_success_rate": pattern_found_sessions / completed_sessions if completed_sessions > 0 else 0,
-            "average_flips_all": avg_flips,
-            "average_flips_pattern_found": avg_pattern_flips,
-            "theoretical_ev": theoretical_ev,
-            "actual_ev": avg_pattern_flips,
-            "pattern_description": self.current_pattern.get_description() if self.current_pattern else "",
-            "is_running": self.is_running
+        Args:
+            step_result: Result of step_simulation, or several coalesced results
+            
+        Returns:
+            Frame bytes (see src.frames for the layout)
+        """
+        snapshot = self.snapshot
+        updates = step_result["updates"]
+        tick = step_result.get("tick", snapshot.tick)
+        finished = step_result["status"] == "completed"
+        if isinstance(updates, UpdateBatch):
+            return encode_update_frame(
+                tick=tick,
+                num_sessions=snapshot.num_sessions,
+                session_ids=updates.session_ids,
+                flip_results=updates.flip_results,
+                completed=updates.completed,
+                flips_counts=updates.flips_count,
+                positions=updates.pattern_position,
+                finished=finished
+            )
+        
+        session_ids = [update["session_id"] for update in updates]
+        completed = [update["completed"] for update in updates]
+        # A completed session's record never changes, so any later snapshot has its position
+        positions = [snapshot.get_record(session_id)[3] if done else None
+                     for session_id, done in zip(session_ids, completed)]
+        
+        return encode_update_frame(
+            tick=tick,
+            num_sessions=snapshot.num_sessions,
+            session_ids=session_ids,
+            flip_results=[update["flip_result"] for update in updates],
+            completed=completed,
+            flips_counts=[update["flips_count"] for update in updates],
+            positions=positions,
+            finished=finished
+        )
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        """
+        Return simulation statistics.
+        
+        Read from the latest snapshot, which is computed from O(1) aggregates
+        at every tick boundary.
+        """
+        return dict(self.snapshot.statistics)
+    
+    def get_statistics_history(self, points: int = 500, method: str = "lttb",
+                               fields: Optional[List[str]] = None,
+                               bins: int = 50) -> Dict[str, Any]:
+        """
+        Chart data for the current run, downsampled to a bounded size.
+        
+        Args:
+            points: Target number of points per series and for the survival curve
+            method: Downsampling method, "lttb" or "minmax"
+            fields: History series to return (default: completed, actual_ev,
+                success_rate)
+            bins: Maximum number of waiting-time histogram buckets
+            
+        Returns:
+            Dictionary with the sampled "series" (see src.timeseries.downsample),
+            the empirical "survival" curve P(no pattern within x flips) and the
+            waiting-time "histogram"
+            
+        Raises:
+            ValueError: If the method or a field is unknown, or points < 3
+        """
+        samples = self.history.to_array()
+        result = {
+            "samples": len(samples),
+            "dropped": self.history.dropped,
+            "series": downsample(samples, points, method, fields),
+            "survival": {"x": [], "y": []},
+            "histogram": {"bin_edges": [], "counts": []}
         }
+        aggregate = self.aggregate
+        if aggregate is not None:
+            flips, survival = aggregate.get_survival_curve()
+            result["survival"] = downsample_curve(flips, survival, points, method)
+            result["histogram"] = aggregate.get_histogram(bins)
+        return result
+    
+    def get_active_session_ids(self) -> List[int]:
+        """Get the IDs of sessions that have not completed, in ascending order."""
+        return self.snapshot.active_session_ids()
+    
+    def get_session_status(self, session_id: int, include_flips: bool = True) -> Dict[str, Any]:
+        """Get the status of one session as of the latest snapshot."""
+        return self.snapshot.get_session_status(session_id, include_flips)
+    
+    def iter_sessions(self, fields: Optional[Iterable[str]] = None,
+                      start_after: Optional[int] = None, completed: Optional[bool] = None,
+                      pattern_found: Optional[bool] = None, min_flips: Optional[int] = None,
+                      max_flips: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Lazily yield session statuses in ascending session ID order.
+        
+        Every status comes from the snapshot current when iteration started,
+        so a listing never mixes sessions from different ticks.
+        
+        Args:
+            fields: Keys to include (session_id is always included); all if None
+            start_after: Only yield sessions with a larger ID (pagination cursor)
+            completed: Filter on the completed flag
+            pattern_found: Filter on the pattern_found flag
+            min_flips: Minimum flips_count (inclusive)
+            max_flips: Maximum flips_count (inclusive)
+            
+        Yields:
+            Session status dictionaries
+        """
+        if fields is not None:
+            fields = {"session_id", *fields}
+        include_flips = fields is None or "flips" in fields
+        
+        def project(status: Dict[str, Any]) -> Dict[str, Any]:
+            if fields is None:
+                return status
+            return {key: status[key] for key in SESSION_FIELDS if key in fields}
+        
+        snapshot = self.snapshot
+        # Session IDs are 0..num_sessions-1, so a cursor maps directly to a start ID
+        start = 0 if start_after is None else start_after + 1
+        for session_id, record in snapshot.iter_records(start):
+            flips_count = record[0]
+            if completed is not None and record[1] != completed:
+                continue
+            if pattern_found is not None and record[2] != pattern_found:
+                continue
+            if min_flips is not None and flips_count < min_flips:
+                continue
+            if max_flips is not None and flips_count > max_flips:
+                continue
+            yield project(snapshot.record_status(session_id, record, include_flips))
     
     def get_all_sessions(self) -> List[Dict[str, Any]]:
-        """Get status of all sessions."""
-        return [session.get_status() for session in self.sessions.values()]
+        """Get status of all sessions as of the latest snapshot."""
+        snapshot = self.snapshot
+        return [snapshot.record_status(session_id, record)
+                for session_id, record in snapshot.iter_records()]
+    
+    def estimate_memory_bytes(self) -> int:
+        """Rough O(1) estimate of the memory held by this simulator's sessions."""
+        if self.batch_engine is not None:
+            engine = self.batch_engine
+            return int(engine.flips_count.nbytes + engine.states.nbytes + engine.completed.nbytes +
+                       engine.pattern_found.nbytes + engine.pattern_position.nbytes +
+                       engine.words.nbytes + engine.active_ids.nbytes)
+        return len(self.sessions) * SESSION_OVERHEAD_BYTES
+    
+    def get_theoretical_statistics(self, pattern_name: str, max_flips_per_session: int = 10000,
+                                   include_cdf: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Exact statistics of a pattern, computed without running a simulation.
+        
+        Args:
+            pattern_name: Name of pattern from PATTERN_CONFIGS, or a pattern expression
+            max_flips_per_session: Flip limit per session
+            include_cdf: Add the waiting-time CDF for 0..max_flips_per_session flips
+            
+        Returns:
+            Theoretical statistics, or None if the pattern is unknown or invalid
+        """
+        if max_flips_per_session < 1:
+            return None
+        try:
+            pattern = resolve_pattern(pattern_name)
+        except ValueError:
+            return None
+        
+        stats = analyze(pattern, max_flips_per_session).to_statistics(include_cdf)
+        stats["pattern_description"] = pattern.get_description()
+        stats["max_flips_per_session"] = max_flips_per_session
+        return stats
     
     def get_available_patterns(self) -> Dict[str, str]:
         """Get all available pattern configurations."""
         return {name: pattern.get_description() for name, pattern in PATTERN_CONFIGS.items()}
+    
+    def describe_pattern(self, expression: str) -> Optional[Dict[str, Any]]:
+        """
+        Compile an ad-hoc pattern expression and describe the result.
+        
+        Args:
+            expression: Pattern expression (see src.pattern_dsl)
+            
+        Returns:
+            Normalized expression, description, matched sequences, automaton
+            size and theoretical EV, or None if the expression is invalid
+        """
+        try:
+            pattern = compile_pattern(expression)
+        except ValueError:
+            return None
+        
+        return {
+            "expression": pattern.expression,
+            "description": pattern.get_description(),
+            "sequences": ["".join("TH"[flip] for flip in sequence)
+                          for sequence in pattern.get_sequences()],
+            "num_states": pattern.automaton.num_states,
+            "theoretical_ev": pattern.get_theoretical_ev()
+        }
 
 
 # Global simulator instance
@@ -0,0 +1,226 @@
+"""
+Immutable simulator snapshots for concurrent readers.
+The stepping thread publishes a new snapshot at every tick boundary; request
+threads only ever read the latest published one, so they never block a tick
+and never see one half applied.
+"""
+
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+import numpy as np
+from src.rng import FlipStream
+
+# Sessions per copy-on-write chunk
+CHUNK_SIZE = 1024
+
+# (flips_count, completed, pattern_found, pattern_position, stopped_reason)
+SessionRecord = Tuple[int, bool, bool, Optional[int], str]
+
+# Record of a session that has not flipped yet
+EMPTY_RECORD: SessionRecord = (0, False, False, None, "")
+
+
+class ArrayChunk:
+    """
+    Chunk of session records held as private copies of engine arrays.
+
+    Records are built on access, so publishing a chunk stepped by the
+    vectorized engine costs four array copies instead of a tuple per session.
+    """
+
+    __slots__ = ("flips_count", "completed", "pattern_found", "pattern_position")
+
+    def __init__(self, flips_count: np.ndarray, completed: np.ndarray,
+                 pattern_found: np.ndarray, pattern_position: np.ndarray):
+        """
+        Initialize chunk.
+
+        Args:
+            flips_count: flips_count per session (not shared with the writer)
+            completed: Completed flag per session
+            pattern_found: Pattern-found flag per session
+            pattern_position: pattern_position per session (-1 if not found)
+        """
+        self.flips_count = flips_count
+        self.completed = completed
+        self.pattern_found = pattern_found
+        self.pattern_position = pattern_position
+
+    def __len__(self) -> int:
+        return int(self.flips_count.size)
+
+    def __getitem__(self, offset: int) -> SessionRecord:
+        flips_count = int(self.flips_count[offset])
+        if self.pattern_found[offset]:
+            return (flips_count, True, True, int(self.pattern_position[offset]), "pattern_found")
+        if self.completed[offset]:
+            return (flips_count, True, False, None, "max_flips_reached")
+        return (flips_count, False, False, None, "")
+
+    def __iter__(self) -> Iterator[SessionRecord]:
+        return (self[offset] for offset in range(len(self)))
+
+
+Chunk = Union[Tuple[SessionRecord, ...], ArrayChunk]
+
+
+class SimulationSnapshot:
+    """State of a simulator as of one tick; never modified after publication."""
+
+    __slots__ = ("version", "tick", "is_running", "statistics", "pattern_description",
+                 "seed", "num_sessions", "_chunks", "_active_ids")
+
+    def __init__(self, version: int, tick: int, is_running: bool, statistics: Dict[str, Any],
+                 pattern_description: str = "", seed: Optional[int] = None,
+                 num_sessions: int = 0, chunks: Tuple[Chunk, ...] = (),
+                 active_ids: Union[Sequence[int], np.ndarray] = ()):
+        """
+        Initialize snapshot.
+
+        Args:
+            version: Publication counter, increases with every snapshot
+            tick: Simulator tick the snapshot was taken at
+            is_running: Whether the simulation was running
+            statistics: Statistics dictionary (treated as read-only)
+            pattern_description: Description of the simulated pattern
+            seed: Run seed the session flips are replayed from
+            num_sessions: Number of sessions with records
+            chunks: Session records, CHUNK_SIZE per chunk
+            active_ids: IDs of the sessions still running, a tuple in any order
+                or an ascending array (neither is modified afterwards)
+        """
+        self.version = version
+        self.tick = tick
+        self.is_running = is_running
+        self.statistics = statistics
+        self.pattern_description = pattern_description
+        self.seed = seed
+        self.num_sessions = num_sessions
+        self._chunks = chunks
+        self._active_ids = active_ids
+
+    def get_record(self, session_id: int) -> SessionRecord:
+        """Get the raw record of one session."""
+        if not 0 <= session_id < self.num_sessions:
+            raise KeyError(session_id)
+        return self._chunks[session_id // CHUNK_SIZE][session_id % CHUNK_SIZE]
+
+    def iter_records(self, start: int = 0) -> Iterator[Tuple[int, SessionRecord]]:
+        """Yield (session_id, record) pairs in ascending ID order from start."""
+        start = max(0, start)
+        for chunk_index in range(start // CHUNK_SIZE, len(self._chunks)):
+            base = chunk_index * CHUNK_SIZE
+            chunk = self._chunks[chunk_index]
+            for offset in range(max(0, start - base), len(chunk)):
+                yield base + offset, chunk[offset]
+
+    def active_session_ids(self) -> List[int]:
+        """IDs of sessions that had not completed, in ascending order."""
+        if isinstance(self._active_ids, np.ndarray):
+            return self._active_ids.tolist()
+        return sorted(self._active_ids)
+
+    def get_session_status(self, session_id: int, include_flips: bool = True) -> Dict[str, Any]:
+        """Get the status of one session, in the shape of CoinFlipSession.get_status."""
+        return self.record_status(session_id, self.get_record(session_id), include_flips)
+
+    def record_status(self, session_id: int, record: SessionRecord,
+                      include_flips: bool = True) -> Dict[str, Any]:
+        """Build a status dictionary from a record of this snapshot."""
+        flips_count, completed, pattern_found, position, stopped_reason = record
+        if not include_flips:
+            flips = None
+        else:
+            flips = FlipStream(self.seed, session_id).to_string(flips_count)
+
+        return {
+            "session_id": session_id,
+            "flips": flips,
+            "flips_count": flips_count,
+            "completed": completed,
+            "pattern_found": pattern_found,
+            "pattern_position": position,
+            "stopped_reason": stopped_reason,
+            "pattern_description": self.pattern_description
+        }
+
+
+class SnapshotPublisher:
+    """
+    Builds snapshots by copy-on-write over chunks of session records.
+
+    Only chunks containing a session updated since the last publication are
+    copied, so publishing costs O(updated sessions + num_sessions / CHUNK_SIZE).
+    The vectorized engine stages whole chunks from its arrays (update_arrays)
+    instead of one record at a time. Must be driven by a single writer thread.
+    """
+
+    def __init__(self, records: List[SessionRecord], pattern_description: str = "",
+                 seed: Optional[int] = None, version: int = 0):
+        """
+        Initialize publisher.
+
+        Args:
+            records: Initial record of every session, indexed by session ID
+            pattern_description: Description of the simulated pattern
+            seed: Run seed the session flips are replayed from
+            version: Version of the last snapshot published before this one
+        """
+        self.pattern_description = pattern_description
+        self.seed = seed
+        self.num_sessions = len(records)
+        self._chunks = tuple(tuple(records[start:start + CHUNK_SIZE])
+                             for start in range(0, len(records), CHUNK_SIZE))
+        self._dirty: Dict[int, Union[List[SessionRecord], ArrayChunk]] = {}
+        self._version = version
+
+    def update(self, session_id: int, record: SessionRecord):
+        """Stage a new record for one session (visible after the next publish)."""
+        chunk_index = session_id // CHUNK_SIZE
+        chunk = self._dirty.get(chunk_index)
+        if chunk is None:
+            chunk = self._chunks[chunk_index]
+        if not isinstance(chunk, list):
+            chunk = self._dirty[chunk_index] = list(chunk)
+        chunk[session_id % CHUNK_SIZE] = record
+
+    def update_arrays(self, session_ids: np.ndarray, flips_count: np.ndarray,
+                      completed: np.ndarray, pattern_found: np.ndarray,
+                      pattern_position: np.ndarray):
+        """
+        Stage the chunks containing session_ids from full per-session arrays.
+
+        Args:
+            session_ids: Ascending IDs of the sessions that changed
+            flips_count: flips_count of every session, indexed by session ID
+            completed: Completed flag of every session
+            pattern_found: Pattern-found flag of every session
+            pattern_position: pattern_position of every session (-1 if not found)
+        """
+        if not session_ids.size:
+            return
+        chunk_ids = session_ids // CHUNK_SIZE
+        changed = np.empty(chunk_ids.size, dtype=bool)
+        changed[0] = True
+        np.not_equal(chunk_ids[1:], chunk_ids[:-1], out=changed[1:])
+        for chunk_index in chunk_ids[changed].tolist():
+            start = chunk_index * CHUNK_SIZE
+            end = min(start + CHUNK_SIZE, self.num_sessions)
+            self._dirty[chunk_index] = ArrayChunk(flips_count[start:end].copy(),
+                                                  completed[start:end].copy(),
+                                                  pattern_found[start:end].copy(),
+                                                  pattern_position[start:end].copy())
+
+    def publish(self, tick: int, is_running: bool, statistics: Dict[str, Any],
+                active_ids: Union[Sequence[int], np.ndarray] = ()) -> SimulationSnapshot:
+        """Freeze the staged records and the active IDs into a new snapshot."""
+        if self._dirty:
+            chunks = list(self._chunks)
+            for chunk_index, chunk in self._dirty.items():
+                chunks[chunk_index] = tuple(chunk) if isinstance(chunk, list) else chunk
+            self._chunks = tuple(chunks)
+            self._dirty = {}
+
+        self._version += 1
+        return SimulationSnapshot(self._version, tick, is_running, statistics,
+                                  self.pattern_description, self.seed, self.num_sessions,
+                                  self._chunks, active_ids)
@@ -0,0 +1,209 @@
+"""
+Per-client viewport subscriptions for session updates.
+Clients subscribe to a session-ID range or a completion filter and share a
+Socket.IO room with every client that asked for the same view, so each
+payload is built and serialized once per view rather than once per client.
+"""
+
+from collections import deque
+from typing import Any, Dict, List, Optional, Set, Tuple
+import heapq
+import threading
+from src.broadcast import UpdateBatch
+
+# Bounds on what completion-based subscriptions can ask for
+MAX_RECENT_TICKS = 1000
+MAX_TOP_K = 100
+
+SUBSCRIPTION_TYPES = ("range", "recent_completions", "top_longest")
+
+
+class CompletionLog:
+    """Recent completions by tick and the longest completed sessions."""
+    
+    def __init__(self, max_ticks: int = MAX_RECENT_TICKS, max_top: int = MAX_TOP_K):
+        """
+        Initialize log.
+        
+        Args:
+            max_ticks: How many ticks of completions to keep
+            max_top: How many of the longest sessions to keep
+        """
+        self.max_ticks = max_ticks
+        self.max_top = max_top
+        self._recent = deque()  # (tick, session_id) in completion order
+        self._longest: List[Tuple[int, int]] = []  # min-heap of (flips_count, -session_id)
+        self.version = 0
+    
+    def record(self, tick: int, session_id: int, flips_count: int):
+        """Record that a session completed at the given tick."""
+        self._recent.append((tick, session_id))
+        while self._recent and self._recent[0][0] <= tick - self.max_ticks:
+            self._recent.popleft()
+        
+        entry = (flips_count, -session_id)
+        if len(self._longest) < self.max_top:
+            heapq.heappush(self._longest, entry)
+        elif entry > self._longest[0]:
+            heapq.heapreplace(self._longest, entry)
+        self.version += 1
+    
+    def recent(self, current_tick: int, ticks: int) -> List[int]:
+        """IDs of sessions completed in the last ticks ticks, newest first."""
+        session_ids = []
+        # list() copies atomically, so a concurrent record() cannot break iteration
+        for tick, session_id in reversed(list(self._recent)):
+            if tick > current_tick:
+                continue
+            if tick <= current_tick - ticks:
+                break
+            session_ids.append(session_id)
+        return session_ids
+    
+    def longest(self, k: int) -> List[int]:
+        """IDs of the k completed sessions with the most flips, longest first."""
+        return [-negated_id for _, negated_id in heapq.nlargest(k, list(self._longest))]
+
+
+def parse_subscription(data: Dict[str, Any]) -> Optional[Tuple]:
+    """
+    Normalize a subscribe request.
+    
+    Accepted forms:
+        {"type": "range", "start": 0, "end": 100}          session IDs [start, end)
+        {"type": "recent_completions", "ticks": 10}        completed in the last N ticks
+        {"type": "top_longest", "k": 10}                   k longest completed sessions
+    
+    Returns:
+        Hashable subscription spec, or None if the request is invalid
+    """
+    try:
+        kind = data.get("type")
+        if kind == "range":
+            start, end = int(data["start"]), int(data["end"])
+            return ("range", start, end) if 0 <= start < end else None
+        if kind == "recent_completions":
+            ticks = int(data.get("ticks", 10))
+            return ("recent_completions", ticks) if 0 < ticks <= MAX_RECENT_TICKS else None
+        if kind == "top_longest":
+            k = int(data.get("k", 10))
+            return ("top_longest", k) if 0 < k <= MAX_TOP_K else None
+    except (AttributeError, KeyError, TypeError, ValueError):
+        pass
+    return None
+
+
+def subscription_room(spec: Tuple) -> str:
+    """Socket.IO room name shared by every client with this subscription."""
+    return "sub:" + ":".join(str(part) for part in spec)
+
+
+class SubscriptionRegistry:
+    """Tracks which client is in which subscription room."""
+    
+    def __init__(self, prefix: str = ""):
+        """
+        Initialize an empty registry.
+        
+        Args:
+            prefix: Prepended to room names (scopes rooms to one run)
+        """
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._client_rooms: Dict[str, str] = {}
+        self._members: Dict[str, Set[str]] = {}
+        self._specs: Dict[str, Tuple] = {}
+        self._sent_versions: Dict[str, int] = {}
+    
+    def subscribe(self, sid: str, spec: Tuple) -> Tuple[Optional[str], str]:
+        """
+        Move a client to the room for spec.
+        
+        Returns:
+            Tuple of (previous_room, new_room)
+        """
+        room = self.prefix + subscription_room(spec)
+        with self._lock:
+            previous = self._remove(sid)
+            self._client_rooms[sid] = room
+            self._members.setdefault(room, set()).add(sid)
+            self._specs[room] = spec
+            # Newly joined clients get the current view on the next frame
+            self._sent_versions.pop(room, None)
+        return previous, room
+    
+    def unsubscribe(self, sid: str) -> Optional[str]:
+        """Remove a client's subscription; returns the room it left."""
+        with self._lock:
+            return self._remove(sid)
+    
+    def _remove(self, sid: str) -> Optional[str]:
+        room = self._client_rooms.pop(sid, None)
+        if room is not None:
+            members = self._members.get(room)
+            members.discard(sid)
+            if not members:
+                del self._members[room]
+                del self._specs[room]
+                self._sent_versions.pop(room, None)
+        return room
+    
+    def is_subscribed(self, sid: str) -> bool:
+        """Whether a client has a subscription."""
+        return sid in self._client_rooms
+    
+    def active(self) -> List[Tuple[str, Tuple]]:
+        """Rooms that currently have members, with their specs."""
+        with self._lock:
+            return list(self._specs.items())
+    
+    def build_payload(self, room: str, spec: Tuple, step_result: Optional[Dict[str, Any]],
+                      simulator) -> Optional[Dict[str, Any]]:
+        """
+        Build the update for one subscription room, or None if nothing changed.
+        
+        Args:
+            room: Room name
+            spec: Subscription spec
+            step_result: Coalesced step result for this frame (may be None)
+            simulator: CoinFlipSimulator providing the completion log and snapshot
+        """
+        kind = spec[0]
+        if kind == "range":
+            if not step_result:
+                return None
+            start, end = spec[1], spec[2]
+            updates = step_result["updates"]
+            if isinstance(updates, UpdateBatch):
+                # Only the sessions in range become dictionaries
+                updates = list(updates.select(start, end))
+            else:
+                updates = [update for update in updates if start <= update["session_id"] < end]
+            if not updates:
+                return None
+            return {"subscription": room, "tick": step_result.get("tick"), "updates": updates}
+        
+        log = simulator.completion_log
+        snapshot = simulator.snapshot
+        if kind == "recent_completions":
+            # The window slides every tick, so resend whenever the run advanced
+            version = (log.version, snapshot.tick)
+        else:
+            version = log.version
+        if self._sent_versions.get(room) == version:
+            return None
+        self._sent_versions[room] = version
+        
+        if kind == "recent_completions":
+            session_ids = log.recent(snapshot.tick, spec[1])
+        else:
+            session_ids = log.longest(spec[1])
+        
+        # The log can run ahead of the snapshot; skip completions not yet published
+        statuses = [snapshot.get_session_status(session_id, include_flips=False)
+                    for session_id in session_ids]
+        return {
+            "subscription": room,
+            "tick": snapshot.tick,
+            "sessions": [status for status in statuses if status["completed"]]
+        }
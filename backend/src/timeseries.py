@@ -0,0 +1,169 @@
+"""
+Statistics history for convergence charts.
+A fixed-capacity ring buffer of per-publication statistics samples, and
+downsampling (LTTB or min/max buckets) so chart payloads stay small however
+long a run is.
+"""
+
+from typing import Dict, List, Optional
+import threading
+import numpy as np
+
+# Samples kept per run (the oldest are overwritten once full)
+HISTORY_CAPACITY = 10000
+
+# Recorded series, in column order
+HISTORY_FIELDS = ("tick", "completed", "actual_ev", "success_rate")
+
+# Downsampling methods accepted by downsample()
+DOWNSAMPLING_METHODS = ("lttb", "minmax")
+
+
+class StatisticsHistory:
+    """Ring buffer of (tick, completed, actual_ev, success_rate) samples."""
+
+    def __init__(self, capacity: int = HISTORY_CAPACITY):
+        """
+        Initialize an empty history.
+
+        Args:
+            capacity: Number of samples kept
+        """
+        self.capacity = capacity
+        self._samples = np.zeros((capacity, len(HISTORY_FIELDS)))
+        self._count = 0  # samples recorded in total
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return min(self._count, self.capacity)
+
+    def record(self, tick: int, completed: int, actual_ev: float, success_rate: float):
+        """Append one sample, overwriting the oldest when full."""
+        with self._lock:
+            self._samples[self._count % self.capacity] = (tick, completed, actual_ev, success_rate)
+            self._count += 1
+
+    def clear(self):
+        """Drop every sample."""
+        with self._lock:
+            self._count = 0
+
+    def to_array(self) -> np.ndarray:
+        """Copy of the kept samples, oldest first (one row per sample)."""
+        with self._lock:
+            if self._count <= self.capacity:
+                return self._samples[:self._count].copy()
+            start = self._count % self.capacity
+            return np.concatenate((self._samples[start:], self._samples[:start]))
+
+    @property
+    def dropped(self) -> int:
+        """Number of samples overwritten so far."""
+        return max(0, self._count - self.capacity)
+
+
+def lttb(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Keeps the first and last points, and from each of points - 2 equal buckets
+    in between the point forming the largest triangle with the point kept
+    from the previous bucket and the mean of the next bucket.
+
+    Args:
+        x: Ascending x values
+        y: y values
+        points: Number of points to keep
+
+    Returns:
+        Indices of the kept points, ascending
+    """
+    size = len(x)
+    if points >= size:
+        return np.arange(size)
+    if points < 3:
+        raise ValueError("LTTB needs at least 3 points")
+
+    every = (size - 2) / (points - 2)
+    selected = np.empty(points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = size - 1
+    previous = 0
+    for bucket in range(points - 2):
+        start = int(bucket * every) + 1
+        end = int((bucket + 1) * every) + 1
+        following_end = min(int((bucket + 2) * every) + 1, size)
+        following_start = end if end < following_end else size - 1
+        mean_x = x[following_start:following_end].mean()
+        mean_y = y[following_start:following_end].mean()
+        # Twice the triangle areas (previous point, candidate, next bucket mean)
+        areas = np.abs((x[previous] - mean_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (mean_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def min_max(y: np.ndarray, points: int) -> np.ndarray:
+    """
+    Min/max bucket downsampling: the lowest and highest point of each of
+    points // 2 equal buckets, plus the first and last points.
+
+    Returns:
+        Indices of the kept points, ascending and unique
+    """
+    size = len(y)
+    if points >= size:
+        return np.arange(size)
+
+    buckets = max(1, points // 2 - 1)
+    edges = np.linspace(0, size, buckets + 1).astype(np.int64)
+    selected = [0, size - 1]
+    for start, end in zip(edges[:-1], edges[1:]):
+        if end > start:
+            segment = y[start:end]
+            selected.append(start + int(np.argmin(segment)))
+            selected.append(start + int(np.argmax(segment)))
+    return np.unique(np.asarray(selected, dtype=np.int64))
+
+
+def downsample(samples: np.ndarray, points: int, method: str = "lttb",
+               fields: Optional[List[str]] = None) -> Dict[str, Dict[str, list]]:
+    """
+    Downsample each series of a history to at most about points samples.
+
+    Every series is reduced on its own (against sample order), and returned
+    with the tick and completed count of the samples kept for it.
+
+    Args:
+        samples: Rows of HISTORY_FIELDS values (StatisticsHistory.to_array)
+        points: Target number of points per series
+        method: One of DOWNSAMPLING_METHODS
+        fields: Series to return (default: completed, actual_ev, success_rate)
+
+    Returns:
+        Dictionary of series name -> {"tick", "completed", "value"} lists
+    """
+    if method not in DOWNSAMPLING_METHODS:
+        raise ValueError(f"Unknown downsampling method: {method}")
+    fields = list(fields or HISTORY_FIELDS[1:])
+    x = np.arange(len(samples), dtype=float)
+    series = {}
+    for field in fields:
+        column = samples[:, HISTORY_FIELDS.index(field)]
+        indices = lttb(x, column, points) if method == "lttb" else min_max(column, points)
+        series[field] = {
+            "tick": samples[indices, 0].astype(np.int64).tolist(),
+            "completed": samples[indices, 1].astype(np.int64).tolist(),
+            "value": column[indices].tolist(),
+        }
+    return series
+
+
+def downsample_curve(x: np.ndarray, y: np.ndarray, points: int,
+                     method: str = "lttb") -> Dict[str, list]:
+    """Downsample one curve given as x/y arrays (e.g. the survival curve)."""
+    if method not in DOWNSAMPLING_METHODS:
+        raise ValueError(f"Unknown downsampling method: {method}")
+    indices = lttb(x.astype(float), y, points) if method == "lttb" else min_max(y, points)
+    return {"x": x[indices].tolist(), "y": y[indices].tolist()}
@@ -0,0 +1,190 @@
+"""
+Vectorized simulation engine.
+Keeps every session as a slot in NumPy arrays and advances all of them per tick.
+"""
+
+from typing import Any, Dict, Optional
+import time
+import numpy as np
+from src.patterns import Pattern
+from src.rng import FlipStream, flip_blocks, random_seed, session_keys
+
+
+class VectorizedEngine:
+    """Array-backed engine that steps all active sessions with vectorized operations."""
+
+    def __init__(self, pattern: Pattern, num_sessions: int, max_flips: int = 10000,
+                 seed: Optional[int] = None, first_session_id: int = 0):
+        """
+        Initialize the engine.
+
+        Args:
+            pattern: Pattern to detect
+            num_sessions: Number of sessions
+            max_flips: Maximum number of flips before a session stops
+            seed: Run seed for the counter-based flip streams (random if omitted)
+            first_session_id: Global ID of this engine's session 0, so a shard
+                draws the same flips as the same sessions in a whole run
+        """
+        automaton = pattern.automaton
+        self.pattern = pattern
+        self.num_sessions = num_sessions
+        self.max_flips = max_flips
+        self.match_lengths = np.asarray(automaton.match_lengths, dtype=np.int64)
+        self.seed = seed if seed is not None else random_seed()
+        self.first_session_id = first_session_id
+
+        # Flattened transition table: next_state = transitions[2 * state + flip]
+        self.transitions = np.asarray(automaton.transitions, dtype=np.int32).reshape(-1)
+        self.accepting = np.asarray(automaton.accepting, dtype=bool)
+
+        self.flips_count = np.zeros(num_sessions, dtype=np.int64)
+        self.states = np.zeros(num_sessions, dtype=np.int32)
+        self.completed = np.zeros(num_sessions, dtype=bool)
+        self.pattern_found = np.zeros(num_sessions, dtype=bool)
+        self.pattern_position = np.full(num_sessions, -1, dtype=np.int64)
+        # Current 64-flip block of every session's stream
+        self.words = np.zeros(num_sessions, dtype=np.uint64)
+        # IDs of sessions still running, compacted after every tick
+        self.active_ids = np.arange(num_sessions, dtype=np.int64)
+
+        # Pattern sets: targets matching per state, and each target's first-hit flip (0 = none)
+        if pattern.hit_masks is not None:
+            self.hit_masks = np.asarray(pattern.hit_masks, dtype=np.int64)
+            self.first_hits = np.zeros((num_sessions, len(pattern.target_names)), dtype=np.int64)
+        else:
+            self.hit_masks = None
+            self.first_hits = None
+
+    def step(self) -> Dict[str, np.ndarray]:
+        """
+        Perform one flip for every active session.
+
+        Returns:
+            Dictionary of arrays describing the sessions stepped this tick
+            (session_ids, flip_results, flips_count, completed, pattern_found,
+            and first_hits for pattern sets)
+        """
+        session_ids = self.active_ids
+        index = self.flips_count[session_ids]
+
+        # Generate the next block for sessions that used up their current one
+        refill = (index & 63) == 0
+        if refill.any():
+            refill_ids = session_ids[refill]
+            keys = session_keys(self.seed, refill_ids + self.first_session_id)
+            self.words[refill_ids] = flip_blocks(keys, index[refill] >> 6)
+        bit = (index & 63).astype(np.uint64)
+        flip_results = ((self.words[session_ids] >> bit) & np.uint64(1)).astype(np.int32)
+
+        states = self.transitions[2 * self.states[session_ids] + flip_results]
+        flips_count = index + 1
+        found = self.accepting[states]
+        completed = found | (flips_count >= self.max_flips)
+
+        self.states[session_ids] = states
+        self.flips_count[session_ids] = flips_count
+        self.completed[session_ids] = completed
+        self.pattern_found[session_ids] = found
+
+        hits = session_ids[found]
+        self.pattern_position[hits] = flips_count[found] - self.match_lengths[states[found]]
+        self.active_ids = session_ids[~completed]
+
+        result = {
+            "session_ids": session_ids,
+            "flip_results": flip_results,
+            "flips_count": flips_count,
+            "completed": completed,
+            "pattern_found": found,
+        }
+        if self.hit_masks is not None:
+            self._record_first_hits(session_ids, states, flips_count)
+            result["first_hits"] = self.first_hits[session_ids]
+        return result
+
+    def _record_first_hits(self, session_ids: np.ndarray, states: np.ndarray,
+                           flips_count: np.ndarray):
+        """Store the flip count for targets matching for the first time this tick."""
+        masks = self.hit_masks[states]
+        rows = np.flatnonzero(masks)
+        if not rows.size:
+            return
+        targets = np.arange(self.first_hits.shape[1], dtype=np.int64)
+        matched = ((masks[rows, None] >> targets) & 1).astype(bool)
+        ids = session_ids[rows]
+        current = self.first_hits[ids]
+        self.first_hits[ids] = np.where(matched & (current == 0), flips_count[rows, None], current)
+
+    def load_state(self, flips_count: np.ndarray, states: np.ndarray, completed: np.ndarray,
+                   pattern_found: np.ndarray, first_hits: Optional[np.ndarray] = None):
+        """
+        Continue from saved per-session arrays (e.g. a checkpoint).
+
+        Args:
+            flips_count: Flips made by every session
+            states: Automaton state of every session
+            completed: Completed flag of every session
+            pattern_found: Pattern-found flag of every session
+            first_hits: First-hit flip counts (pattern sets only)
+        """
+        self.flips_count[:] = flips_count
+        self.states[:] = states
+        self.completed[:] = completed
+        self.pattern_found[:] = pattern_found
+        self.pattern_position[:] = np.where(self.pattern_found,
+                                            self.flips_count - self.match_lengths[self.states], -1)
+        if first_hits is not None and self.first_hits is not None:
+            self.first_hits[:] = first_hits
+        self.active_ids = np.flatnonzero(~self.completed).astype(np.int64)
+
+        # Sessions stopped mid-block need their current block back
+        index = self.flips_count[self.active_ids]
+        partial = (index & 63) != 0
+        if partial.any():
+            ids = self.active_ids[partial]
+            keys = session_keys(self.seed, ids + self.first_session_id)
+            self.words[ids] = flip_blocks(keys, index[partial] >> 6)
+
+    def run_until_completion(self, deadline: Optional[float] = None) -> bool:
+        """
+        Step until every session has completed.
+
+        Args:
+            deadline: Optional time.time() value after which to stop early
+
+        Returns:
+            True if every session completed, False if the deadline was hit
+        """
+        while self.active_ids.size:
+            if deadline is not None and time.time() >= deadline:
+                return False
+            self.step()
+        return True
+
+    def get_session_status(self, session_id: int) -> Dict[str, Any]:
+        """
+        Get the status of one session.
+
+        Flip histories are not stored; "flips" is regenerated from the seed.
+        """
+        completed = bool(self.completed[session_id])
+        found = bool(self.pattern_found[session_id])
+        if found:
+            stopped_reason = "pattern_found"
+        elif completed:
+            stopped_reason = "max_flips_reached"
+        else:
+            stopped_reason = ""
+
+        return {
+            "session_id": session_id,
+            "flips": FlipStream(self.seed, self.first_session_id + session_id).to_string(
+                int(self.flips_count[session_id])),
+            "flips_count": int(self.flips_count[session_id]),
+            "completed": completed,
+            "pattern_found": found,
+            "pattern_position": int(self.pattern_position[session_id]) if found else None,
+            "stopped_reason": stopped_reason,
+            "pattern_description": self.pattern.get_description()
+        }
@@ -8,6 +8,7 @@ import { Separator } from '@/components/ui/separator.jsx'
 import { Play, Pause, RotateCcw, Settings, TrendingUp, Activity } from 'lucide-react'
 import { LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer, BarChart, Bar } from 'recharts'
 import io from 'socket.io-client'
+import { decodeUpdateFrame } from '@/lib/frames.js'
 import './App.css'
 
 function App() {
@@ -49,8 +50,30 @@ function App() {
     }
   }, [])
 
+  const applySimulationUpdate = (data) => {
+    // Update sessions with new data
+    if (data.updates && data.updates.length > 0) {
+      setSessions(prev => {
+        const updated = [...prev]
+        data.updates.forEach(update => {
+          const index = updated.findIndex(s => s.session_id === update.session_id)
+          if (index !== -1) {
+            updated[index] = {
+              ...updated[index],
+              flips_count: update.flips_count,
+              completed: update.completed,
+              pattern_found: update.pattern_found
+            }
+          }
+        })
+        return updated
+      })
+    }
+  }
+
   const initializeWebSocket = () => {
-    socketRef.current = io(SOCKET_URL)
+    // Ask for compact binary update frames instead of JSON
+    socketRef.current = io(SOCKET_URL, { query: { format: 'binary' } })
     
     socketRef.current.on('connect', () => {
       console.log('Connected to server')
@@ -77,25 +100,10 @@ function App() {
       })
     })
     
-    socketRef.current.on('simulation_update', (data) => {
-      // Update sessions with new data
-      if (data.updates && data.updates.length > 0) {
-        setSessions(prev => {
-          const updated = [...prev]
-          data.updates.forEach(update => {
-            const index = updated.findIndex(s => s.session_id === update.session_id)
-            if (index !== -1) {
-              updated[index] = {
-                ...updated[index],
-                flips_count: update.flips_count,
-                completed: update.completed,
-                pattern_found: update.pattern_found
-              }
-            }
-          })
-          return updated
-        })
-      }
+    socketRef.current.on('simulation_update', applySimulationUpdate)
+
+    socketRef.current.on('simulation_frame', (frame) => {
+      applySimulationUpdate(decodeUpdateFrame(frame))
     })
     
     socketRef.current.on('simulation_completed', (data) => {
@@ -0,0 +1,75 @@
+// Decoder for the binary `simulation_frame` messages sent to clients that
+// connect with `?format=binary`. Mirrors backend/src/frames.py.
+
+const FRAME_VERSION = 2
+const FLAG_COMPLETED = 0x01
+const HEADER_SIZE = 10
+
+function readVarint(bytes, offset) {
+  let value = 0
+  let multiplier = 1
+  for (;;) {
+    const byte = bytes[offset++]
+    value += (byte & 0x7f) * multiplier
+    if (byte < 0x80) {
+      return [value, offset]
+    }
+    multiplier *= 128
+  }
+}
+
+function bitAt(bytes, start, index) {
+  return (bytes[start + (index >> 3)] >> (index & 7)) & 1
+}
+
+// Decode a frame into the same shape as a JSON `simulation_update` payload.
+export function decodeUpdateFrame(buffer) {
+  const bytes = buffer instanceof Uint8Array ? buffer : new Uint8Array(buffer)
+  const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength)
+
+  const version = view.getUint8(0)
+  if (version !== FRAME_VERSION) {
+    throw new Error(`Unsupported frame version ${version}`)
+  }
+  const flags = view.getUint8(1)
+  const tick = view.getUint32(2, true)
+  const numSessions = view.getUint32(6, true)
+
+  let [steppedCount, offset] = readVarint(bytes, HEADER_SIZE)
+  const steppedStart = offset
+  const flipsStart = steppedStart + ((numSessions + 7) >> 3)
+  const completedStart = flipsStart + ((steppedCount + 7) >> 3)
+  offset = completedStart + ((steppedCount + 7) >> 3)
+
+  const updates = []
+  let index = 0
+  for (let sessionId = 0; sessionId < numSessions && index < steppedCount; sessionId++) {
+    if (!bitAt(bytes, steppedStart, sessionId)) {
+      continue
+    }
+    const update = {
+      session_id: sessionId,
+      flip_result: bitAt(bytes, flipsStart, index),
+      flips_count: tick,
+      completed: bitAt(bytes, completedStart, index) === 1,
+      pattern_found: false
+    }
+    if (update.completed) {
+      let encoded
+      ;[update.flips_count, offset] = readVarint(bytes, offset)
+      ;[encoded, offset] = readVarint(bytes, offset)
+      update.pattern_found = encoded > 0
+      update.pattern_position = encoded > 0 ? encoded - 1 : null
+    }
+    updates.push(update)
+    index++
+  }
+
+  const finished = (flags & FLAG_COMPLETED) !== 0
+  return {
+    tick,
+    status: finished ? 'completed' : 'running',
+    active_sessions: steppedCount,
+    updates
+  }
+}